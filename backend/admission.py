@@ -0,0 +1,275 @@
+"""
+准入控制
+
+- ConcurrencyLimiter：限制同时进行的模型调用数，超出的请求按先后排队，
+  队列已满或等待超过 max_wait 秒时抛出 Overloaded，由调用方立即降级到演示
+  模式或返回 429，而不是让所有请求的延迟一起无限增长
+- RateLimiter：按键（会话 ID、客户端 IP）的令牌桶，防止单个客户端占满上游容量
+
+两者都同时支持多线程（Flask）与事件循环（ASGI）中的调用方。
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, Optional, Tuple
+
+from metrics import ADMISSION_REJECTED, LLM_SLOTS, STAGE_SECONDS
+
+
+class Overloaded(Exception):
+    """模型调用排队已满或等待超时"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _ThreadWaiter:
+    __slots__ = ('granted', '_event')
+
+    def __init__(self):
+        self.granted = False
+        self._event = threading.Event()
+
+    def grant(self) -> bool:
+        self.granted = True
+        self._event.set()
+        return True
+
+    def wait(self, timeout: float) -> None:
+        self._event.wait(timeout)
+
+
+class _AsyncWaiter:
+    __slots__ = ('granted', 'loop', 'future')
+
+    def __init__(self, loop):
+        self.granted = False
+        self.loop = loop
+        self.future = loop.create_future()
+
+    def grant(self) -> bool:
+        if self.loop.is_closed():
+            return False
+        self.granted = True
+        self.loop.call_soon_threadsafe(self._resolve)
+        return True
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class ConcurrencyLimiter:
+    """有界并发 + 有界 FIFO 队列，空出的名额直接交给队首的等待者"""
+
+    def __init__(self, max_concurrent: int = 32, max_queue: int = 64, max_wait: float = 10.0):
+        """
+        Args:
+            max_concurrent: 同时进行的模型调用数上限
+            max_queue: 排队等待的调用数上限，超出时立即拒绝
+            max_wait: 排队的最长等待（秒），超时拒绝
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._stats = {'admitted': 0, 'queue_full': 0, 'queue_timeout': 0}
+        self._active_gauge = LLM_SLOTS.labels('active')
+        self._queued_gauge = LLM_SLOTS.labels('queued')
+
+    def _enter(self, waiter) -> bool:
+        """加锁后调用：有空闲名额时占用并返回 True，否则排队返回 False"""
+        if self._active < self.max_concurrent and not self._waiters:
+            self._active += 1
+            self._stats['admitted'] += 1
+            self._active_gauge.set(self._active)
+            return True
+        if len(self._waiters) >= self.max_queue:
+            self._reject('queue_full')
+            raise Overloaded("模型调用排队已满", self.max_wait)
+        self._waiters.append(waiter)
+        self._queued_gauge.set(len(self._waiters))
+        return False
+
+    def _give_up(self, waiter) -> bool:
+        """等待者放弃排队，返回放弃前是否已经拿到名额"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+            self._queued_gauge.set(len(self._waiters))
+            return False
+
+    def _reject(self, reason):
+        self._stats[reason] += 1
+        ADMISSION_REJECTED.labels(reason).inc()
+
+    def acquire(self) -> None:
+        """占用一个名额，必要时排队；失败时抛出 Overloaded"""
+        start = time.perf_counter()
+        waiter = _ThreadWaiter()
+        with self._lock:
+            if self._enter(waiter):
+                return
+        waiter.wait(self.max_wait)
+        if not waiter.granted and not self._give_up(waiter):
+            with self._lock:
+                self._reject('queue_timeout')
+            raise Overloaded(f"模型调用排队超过 {self.max_wait:g} 秒", self.max_wait)
+        STAGE_SECONDS.labels('llm_queue').observe(time.perf_counter() - start)
+
+    async def aacquire(self) -> None:
+        """占用一个名额（异步版本），排队时不阻塞事件循环"""
+        start = time.perf_counter()
+        waiter = _AsyncWaiter(asyncio.get_running_loop())
+        with self._lock:
+            if self._enter(waiter):
+                return
+        try:
+            await asyncio.wait_for(waiter.future, self.max_wait)
+        except asyncio.TimeoutError:
+            if not self._give_up(waiter):
+                with self._lock:
+                    self._reject('queue_timeout')
+                raise Overloaded(f"模型调用排队超过 {self.max_wait:g} 秒", self.max_wait)
+        except asyncio.CancelledError:
+            # 请求被取消时，已经交到手上的名额要还回去
+            if self._give_up(waiter):
+                self.release()
+            raise
+        STAGE_SECONDS.labels('llm_queue').observe(time.perf_counter() - start)
+
+    def release(self) -> None:
+        """归还名额；有人排队时直接交给队首"""
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                self._queued_gauge.set(len(self._waiters))
+                if waiter.grant():
+                    self._stats['admitted'] += 1
+                    return
+            self._active -= 1
+            self._active_gauge.set(self._active)
+
+    @contextmanager
+    def slot(self):
+        """with limiter.slot(): 调用模型"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """async with limiter.aslot(): 调用模型"""
+        await self.aacquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(
+                self._stats,
+                active=self._active,
+                queued=len(self._waiters),
+                max_concurrent=self.max_concurrent,
+                max_queue=self.max_queue
+            )
+
+
+@asynccontextmanager
+async def unlimited():
+    """未配置并发限制时的 async with（Python 3.10 之前 nullcontext 不支持 async with）"""
+    yield
+
+
+class RateLimiter:
+    """按键的令牌桶：每秒补充 rate 个令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100000, name: str = 'rate'):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量（允许的突发请求数）
+            max_keys: 最多跟踪的键数，超出时淘汰最久未出现的键
+            name: 拒绝时记入指标的原因标签
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self._rejected = 0
+        self._rejected_counter = ADMISSION_REJECTED.labels(name)
+
+    def check(self, key: str) -> Optional[float]:
+        """消耗一个令牌；允许时返回 None，否则返回需要等待的秒数"""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                tokens = float(self.burst)
+                if len(self._buckets) >= self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                tokens, last = bucket
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                self._buckets.move_to_end(key)
+
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                return None
+            self._buckets[key] = (tokens, now)
+            self._rejected += 1
+        self._rejected_counter.inc()
+        return (1 - tokens) / self.rate
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'keys': len(self._buckets),
+                'rejected': self._rejected,
+                'rate': self.rate,
+                'burst': self.burst
+            }
+
+
+def create_llm_limiter() -> Optional[ConcurrencyLimiter]:
+    """根据环境变量创建模型调用并发限制，LLM_MAX_CONCURRENCY=0 时关闭"""
+    max_concurrent = int(os.getenv('LLM_MAX_CONCURRENCY', 32))
+    if max_concurrent <= 0:
+        return None
+    return ConcurrencyLimiter(
+        max_concurrent=max_concurrent,
+        max_queue=int(os.getenv('LLM_MAX_QUEUE', 64)),
+        max_wait=float(os.getenv('LLM_MAX_QUEUE_WAIT', 10))
+    )
+
+
+def create_rate_limiters() -> Tuple[Optional[RateLimiter], Optional[RateLimiter]]:
+    """
+    根据环境变量创建按会话与按 IP 的令牌桶，速率设为 0 的一项不限制
+
+    Returns:
+        tuple: (会话限流, IP 限流)
+    """
+    limiters = []
+    for prefix, name, rate, burst in (('SESSION', 'session_rate', 1, 5),
+                                      ('IP', 'ip_rate', 10, 50)):
+        rate = float(os.getenv(f'{prefix}_RATE_LIMIT', rate))
+        limiters.append(RateLimiter(
+            rate=rate,
+            burst=int(os.getenv(f'{prefix}_RATE_BURST', burst)),
+            name=name
+        ) if rate > 0 else None)
+    return tuple(limiters)
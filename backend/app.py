@@ -1,29 +1,214 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
-from counselor import EmotionalCounselor
-from utils import validate_message, sanitize_input
-from translator import TranslationService
+from utils import validate_message, sanitize_input, check_admin_token, lazy
+from session_store import create_session_store
+from metrics import REGISTRY, CONTENT_TYPE, observe_request, stage
+from admission import Overloaded, create_rate_limiters
+from idempotency import IdempotencyConflict, create_idempotency_store, request_fingerprint
+from profiling import ProfilerBusy, create_profiler, create_slow_request_log, format_folded
+from logger import (configure_logging, get_request_id, new_request_id, request_context,
+                    reset_request_id, set_request_id)
+import gc
 import os
+import json
+import math
+import re
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# 结构化日志（LOG_LEVEL / LOG_QUEUE_SIZE / LOG_SAMPLE_RATES）
+log = configure_logging()
+
 app = Flask(__name__)
 CORS(app)
 
-# 初始化咨询师
-counselor = EmotionalCounselor(api_key=os.getenv('OPENAI_API_KEY'))
+# 咨询师与翻译服务在第一次使用时才创建（openai、deep_translator 与知识库索引
+# 也随之加载），导入本模块不再承担这部分开销；gunicorn 预加载时由 warmup() 提前创建
+
+@lazy
+def get_counselor():
+    """咨询师（首次调用时创建，并启动知识库热加载）"""
+    from counselor import EmotionalCounselor
+    from response_cache import create_response_cache
+    from prompt_builder import create_prompt_builder
+    from llm_client import create_llm_client
+    from admission import create_llm_limiter
+    
+    counselor = EmotionalCounselor(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        model=os.getenv('OPENAI_MODEL', 'deepseek-chat'),
+        api_base=os.getenv('OPENAI_BASE_URL', 'https://api.deepseek.com/v1'),
+        response_cache=create_response_cache(),
+        prompt_builder=create_prompt_builder(),
+        llm_client=create_llm_client(),
+        limiter=create_llm_limiter(),
+        # 模型调用排队失败时：demo 降级到演示模式回复，reject 返回 429
+        overload_fallback=os.getenv('LLM_OVERLOAD_MODE', 'demo') != 'reject'
+    )
+    
+    # 知识库热加载：每隔 KB_WATCH_INTERVAL 秒检查文件是否修改（0 表示关闭）
+    global kb_watcher
+    kb_watch_interval = float(os.getenv('KB_WATCH_INTERVAL', 0))
+    if kb_watch_interval > 0:
+        from rag_system import KnowledgeBaseWatcher
+        kb_watcher = KnowledgeBaseWatcher(counselor.rag, interval=kb_watch_interval).start()
+    return counselor
+
+kb_watcher = None
+
+@lazy
+def get_translation_service():
+    """翻译服务（带 LRU 缓存，批量翻译时并发请求上游）"""
+    from translator import TranslationService
+    
+    return TranslationService(
+        cache_size=int(os.getenv('TRANSLATION_CACHE_SIZE', 5000)),
+        max_workers=int(os.getenv('TRANSLATE_CONCURRENCY', 8)),
+        base_url=os.getenv('GOOGLE_TRANSLATE_URL') or None
+    )
+
+@lazy
+def get_summarizer():
+    """后台对话摘要（演示模式下不需要，返回 None）"""
+    from summarizer import create_summarizer
+    
+    counselor = get_counselor()
+    if counselor.demo_mode:
+        return None
+    return create_summarizer(session_store, counselor.summarize)
+
+# 按会话与按 IP 的令牌桶（SESSION_RATE_LIMIT / IP_RATE_LIMIT 为 0 时不限制）
+session_rate_limiter, ip_rate_limiter = create_rate_limiters()
+
+# 未提供 session_id 的请求（前端页面首次加载时也使用它）共用的会话
+DEFAULT_SESSION_ID = 'default'
+
+# 单次批量翻译 / 批量语言检测最多包含的文本条数
+TRANSLATE_BATCH_MAX = int(os.getenv('TRANSLATE_BATCH_MAX', 100))
+DETECT_BATCH_MAX = int(os.getenv('DETECT_BATCH_MAX', 10000))
+
+# 会话存储（SESSION_BACKEND=memory 或 sqlite）
+session_store = create_session_store()
+
+# 聊天请求的幂等键结果与进行中请求的合并
+idempotency_store = create_idempotency_store()
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+# 按需采样剖析（管理接口）与慢请求记录（SLOW_REQUEST_THRESHOLD 为 0 时关闭）
+profiler = create_profiler()
+slow_requests = create_slow_request_log()
+# 不记入慢请求的接口：剖析本身要运行数秒
+UNTRACKED_ENDPOINTS = {'profile'}
+
+# 沿用客户端或网关传入的请求 ID（X-Request-ID），格式不符时重新生成
+REQUEST_ID_RE = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+
+def warmup():
+    """
+    创建全部服务并构建索引
+    
+    gunicorn 以 preload_app 启动时在主进程中调用（见 gunicorn.conf.py），fork 出的
+    工作进程以写时复制方式共享这些对象。之后冻结 GC，避免垃圾回收改写对象头
+    导致共享的内存页被复制。后台线程不会随 fork 复制，工作进程中需调用
+    start_background_tasks()。
+    """
+    counselor = get_counselor()
+    get_summarizer()
+    translation_service = get_translation_service()
+    counselor.classify('')
+    counselor.rag.search('预热')
+    translation_service.detect_languages(['预热'])
+    gc.freeze()
+
+def start_background_tasks():
+    """（重新）启动后台线程：日志写出、慢请求采样，以及已创建服务的摘要、模型健康探测、知识库热加载"""
+    log.start()
+    if slow_requests:
+        slow_requests.start()
+    if not get_counselor.initialized():
+        return
+    counselor = get_counselor()
+    counselor.llm.start_prober()
+    if kb_watcher:
+        kb_watcher.start()
+    summarizer = get_summarizer()
+    if summarizer:
+        summarizer.start()
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    g.request_id_token = set_request_id(_parse_request_id(request.headers))
+    if slow_requests and request.endpoint not in UNTRACKED_ENDPOINTS:
+        g.slow_request = slow_requests.begin()
+
+@app.after_request
+def record_request(response):
+    """记录接口请求数与耗时"""
+    start = g.get('request_start')
+    if start is not None:
+        seconds = time.perf_counter() - start
+        observe_request(request.endpoint, response.status_code, seconds)
+        log.info('request', method=request.method, path=request.path,
+                 status=response.status_code, duration_ms=round(seconds * 1e3, 1))
+    request_id = get_request_id()
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    _end_slow_request(response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request(error):
+    """未经 after_request 结束的请求（处理中抛出异常）"""
+    _end_slow_request(500)
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        reset_request_id(token)
 
-# 初始化翻译服务
-translation_service = TranslationService()
+def _parse_request_id(headers):
+    """请求头中的请求 ID，没有或格式不符时生成新的"""
+    request_id = headers.get('X-Request-ID', '')
+    return request_id if REQUEST_ID_RE.match(request_id) else new_request_id()
 
-# 存储会话（生产环境建议使用 Redis）
-sessions = {}
+def _end_slow_request(status):
+    slow_request = g.pop('slow_request', None)
+    if slow_request is not None:
+        slow_requests.end(slow_request, request.endpoint, request.method, status)
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """健康检查"""
-    return jsonify({'status': 'ok', 'message': 'Emotional Counseling AI is running'})
+    counselor = get_counselor()
+    summarizer = get_summarizer()
+    return jsonify({
+        'status': 'ok',
+        'message': 'Emotional Counseling AI is running',
+        'sessions': session_store.stats(),
+        'response_cache': counselor.response_cache.stats() if counselor.response_cache else None,
+        'translation_cache': get_translation_service().cache.stats(),
+        'summarizer': summarizer.stats() if summarizer else None,
+        'admission': _admission_stats(),
+        'idempotency': idempotency_store.stats(),
+        'slow_requests': slow_requests.stats() if slow_requests else None,
+        'logging': log.stats(),
+        'llm': None if counselor.demo_mode else counselor.llm.stats()
+    })
+
+def _admission_stats():
+    """模型调用排队与限流统计"""
+    limiter = get_counselor().limiter
+    return {
+        'llm': limiter.stats() if limiter else None,
+        'session_rate': session_rate_limiter.stats() if session_rate_limiter else None,
+        'ip_rate': ip_rate_limiter.stats() if ip_rate_limiter else None
+    }
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """以 Prometheus 文本格式导出指标"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
@@ -32,63 +217,276 @@ def chat():
         data = request.json
         
         # 验证输入
-        if not validate_message(data):
-            return jsonify({'error': '无效的请求格式'}), 400
-        
-        user_message = sanitize_input(data.get('message', ''))
-        session_id = data.get('session_id', 'default')
+        with stage('validate'):
+            if not validate_message(data):
+                return jsonify({'error': '无效的请求格式'}), 400
+            
+            user_message = sanitize_input(data.get('message', ''))
+            session_id = data.get('session_id', DEFAULT_SESSION_ID)
+            translate_reply, target_lang = _parse_reply_translation(data)
         
         if not user_message:
             return jsonify({'error': '消息不能为空'}), 400
         
-        # 获取或创建会话历史
-        if session_id not in sessions:
-            sessions[session_id] = []
-        
-        conversation_history = sessions[session_id]
+        # 按会话与 IP 限流
+        retry_after = _rate_limited(session_id, request.remote_addr)
+        if retry_after is not None:
+            body, headers = _too_many_requests('请求过于频繁，请稍后重试', retry_after)
+            return jsonify(body), 429, headers
         
-        # 获取 AI 回复
-        response = counselor.get_response(
-            user_message=user_message,
-            conversation_history=conversation_history
-        )
-        
-        # 更新会话历史
-        conversation_history.append({'role': 'user', 'content': user_message})
-        conversation_history.append({'role': 'assistant', 'content': response['message']})
+        idempotency_key, error = _parse_idempotency_key(request.headers)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # 限制历史记录长度
-        if len(conversation_history) > 20:
-            conversation_history = conversation_history[-20:]
+        def handle():
+            counselor = get_counselor()
+            
+            # 只读取本轮需要的历史窗口
+            with stage('session_read'):
+                summary, conversation_history = session_store.get_context(
+                    session_id, limit=counselor.HISTORY_MESSAGES
+                )
+                retrieval = _load_retrieval(session_id)
+            
+            # 获取 AI 回复
+            response = counselor.get_response(
+                user_message=user_message,
+                conversation_history=conversation_history,
+                summary=summary,
+                retrieval=retrieval
+            )
+            
+            # 更新会话历史
+            with stage('session_write'):
+                _record_turn(session_id, user_message, response['message'], retrieval)
+            
+            result = {
+                'message': response['message'],
+                'emotion': response.get('emotion', 'neutral'),
+                'session_id': session_id,
+                'cached': response.get('cached', False),
+                'prompt_tokens': response.get('prompt_tokens', 0),
+                'tokens_used': response.get('tokens_used', 0)
+            }
+            
+            # 同一请求内按句并行翻译回复，省去前端再请求一次 /api/translate
+            if translate_reply:
+                with stage('translate_reply'):
+                    result['translation'] = get_translation_service().translate_sentences(
+                        response['message'], target_lang=target_lang
+                    )
+            return result
         
-        sessions[session_id] = conversation_history
-        
-        return jsonify({
-            'message': response['message'],
-            'emotion': response.get('emotion', 'neutral'),
-            'session_id': session_id
-        })
+        # 重试请求重放已完成的结果；与进行中的相同请求合并，只调用一次模型、只写一次历史
+        result, replayed = idempotency_store.run(
+            idempotency_key, request_fingerprint(session_id, user_message, target_lang), handle
+        )
+        return jsonify(result), 200, _replay_headers(replayed)
         
+    except IdempotencyConflict as e:
+        return jsonify({'error': str(e)}), 422
+    except Overloaded as e:
+        body, headers = _too_many_requests('当前咨询人数较多，请稍后重试', e.retry_after)
+        return jsonify(body), 429, headers
     except Exception as e:
-        print(f"Error: {str(e)}")
+        log.error('chat_failed', error=str(e))
         return jsonify({'error': '服务暂时不可用，请稍后重试'}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """以 SSE 流式返回聊天回复"""
+    data = request.json
+    
+    # 验证输入
+    if not validate_message(data):
+        return jsonify({'error': '无效的请求格式'}), 400
+    
+    user_message = sanitize_input(data.get('message', ''))
+    session_id = data.get('session_id', DEFAULT_SESSION_ID)
+    translate_reply, target_lang = _parse_reply_translation(data)
+    
+    if not user_message:
+        return jsonify({'error': '消息不能为空'}), 400
+    
+    # 按会话与 IP 限流
+    retry_after = _rate_limited(session_id, request.remote_addr)
+    if retry_after is not None:
+        body, headers = _too_many_requests('请求过于频繁，请稍后重试', retry_after)
+        return jsonify(body), 429, headers
+    
+    counselor = get_counselor()
+    summary, conversation_history = session_store.get_context(
+        session_id, limit=counselor.HISTORY_MESSAGES
+    )
+    retrieval = _load_retrieval(session_id)
+    
+    # 流式响应在视图函数返回后才生成，需要带上本请求的 ID
+    request_id = get_request_id()
+    
+    def generate():
+        with request_context(request_id):
+            yield from _generate()
+    
+    def _generate():
+        try:
+            events = counselor.stream_response(
+                user_message=user_message,
+                conversation_history=conversation_history,
+                summary=summary,
+                retrieval=retrieval
+            )
+            if translate_reply:
+                # 每生成完一句就送去翻译，译文以 translation 事件按句推送
+                events = get_translation_service().translate_stream(events, target_lang=target_lang)
+            
+            for event, payload in events:
+                if event == 'done':
+                    # 回复完整生成后再写入会话历史
+                    _record_turn(session_id, user_message, payload['message'], retrieval)
+                    payload = _done_payload(payload, session_id)
+                yield _format_sse(event, payload)
+        except Overloaded as e:
+            body, _ = _too_many_requests('当前咨询人数较多，请稍后重试', e.retry_after)
+            yield _format_sse('error', body)
+        except Exception as e:
+            log.error('chat_stream_failed', error=str(e))
+            yield _format_sse('error', {'error': '服务暂时不可用，请稍后重试'})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _rate_limited(session_id, client_ip):
+    """按 IP 与会话各消耗一个令牌，超出速率时返回需要等待的秒数"""
+    # 默认会话由所有未提供 session_id 的客户端共用，按会话限流会变成全局限流，只按 IP 限流
+    session_limiter = session_rate_limiter if session_id and session_id != DEFAULT_SESSION_ID else None
+    for limiter, key in ((ip_rate_limiter, client_ip), (session_limiter, session_id)):
+        if limiter:
+            retry_after = limiter.check(key)
+            if retry_after is not None:
+                return retry_after
+    return None
+
+def _too_many_requests(message, retry_after):
+    """429 响应体与 Retry-After 头"""
+    return (
+        {'error': message, 'retry_after': round(retry_after, 1)},
+        {'Retry-After': str(math.ceil(retry_after))}
+    )
+
+def _load_retrieval(session_id):
+    """会话的检索上下文（此前几轮命中的知识主题），由本轮检索原地更新"""
+    from rag_system import RetrievalContext
+    return RetrievalContext.from_state(session_store.get_retrieval(session_id))
+
+def _record_turn(session_id, user_message, reply, retrieval=None):
+    """写入一轮对话与更新后的检索上下文，并通知后台检查是否需要生成摘要"""
+    session_store.append_turn(session_id, user_message, reply,
+                              retrieval.to_state() if retrieval is not None else None)
+    summarizer = get_summarizer()
+    if summarizer:
+        summarizer.notify(session_id)
+
+def _parse_idempotency_key(headers):
+    """读取 Idempotency-Key 请求头，返回 (幂等键, 错误信息)"""
+    key = headers.get('Idempotency-Key')
+    if key is not None and not 0 < len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None, f'Idempotency-Key 长度应为 1 到 {IDEMPOTENCY_KEY_MAX_LENGTH} 个字符'
+    return key, None
+
+def _replay_headers(replayed):
+    """结果来自重放或与其他请求共享时附带的响应头"""
+    return {'Idempotent-Replayed': 'true'} if replayed else {}
+
+def _parse_reply_translation(data):
+    """
+    聊天请求中的 target_lang 选项，返回 (是否翻译回复, 目标语言)
+    
+    未提供时不翻译；'auto' 表示自动检测回复语言并译为另一种语言。
+    """
+    target_lang = data.get('target_lang')
+    if not target_lang:
+        return False, None
+    return True, None if target_lang == 'auto' else target_lang
+
+def _done_payload(payload, session_id):
+    """流式回复结束时 done 事件的数据"""
+    done = {
+        'message': payload['message'],
+        'emotion': payload.get('emotion', 'neutral'),
+        'session_id': session_id,
+        'cached': payload.get('cached', False),
+        'prompt_tokens': payload.get('prompt_tokens', 0),
+        'tokens_used': payload.get('tokens_used', 0)
+    }
+    if 'translation' in payload:
+        done['translation'] = payload['translation']
+    return done
+
+def _format_sse(event, payload):
+    """格式化为 server-sent events 消息"""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
 @app.route('/api/session/new', methods=['POST'])
 def new_session():
     """创建新会话"""
     import uuid
     session_id = str(uuid.uuid4())
-    sessions[session_id] = []
+    session_store.create(session_id)
     return jsonify({'session_id': session_id})
 
 @app.route('/api/session/<session_id>', methods=['DELETE'])
 def delete_session(session_id):
     """删除会话"""
-    if session_id in sessions:
-        del sessions[session_id]
+    if session_store.delete(session_id):
         return jsonify({'message': '会话已删除'})
     return jsonify({'error': '会话不存在'}), 404
 
+@app.route('/api/admin/knowledge/reload', methods=['POST'])
+def reload_knowledge_base():
+    """重新加载知识库，只更新有变化的主题"""
+    if not check_admin_token(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': '无权访问'}), 403
+    
+    try:
+        summary = get_counselor().rag.reload()
+        return jsonify(summary)
+    except Exception as e:
+        log.error('knowledge_base_reload_failed', error=str(e))
+        return jsonify({'error': '知识库重新加载失败'}), 500
+
+@app.route('/api/admin/profile', methods=['POST'])
+def profile():
+    """采样全部线程的调用栈 seconds 秒，返回折叠格式（可直接绘制火焰图）"""
+    if not check_admin_token(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': '无权访问'}), 403
+    
+    try:
+        stacks = profiler.profile(
+            seconds=request.args.get('seconds', 10, type=float),
+            interval=request.args.get('interval', 0.01, type=float)
+        )
+    except ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    return Response(format_folded(stacks), content_type='text/plain; charset=utf-8')
+
+@app.route('/api/admin/slow-requests', methods=['GET'])
+def slow_request_log():
+    """最近的慢请求：耗时、阶段明细与调用栈采样；format=folded 时合并为折叠格式"""
+    if not check_admin_token(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': '无权访问'}), 403
+    if not slow_requests:
+        return jsonify({'error': '慢请求记录未开启（SLOW_REQUEST_THRESHOLD）'}), 404
+    
+    if request.args.get('format') == 'folded':
+        return Response(format_folded(slow_requests.folded()), content_type='text/plain; charset=utf-8')
+    return jsonify({
+        'threshold': slow_requests.threshold,
+        'requests': slow_requests.recent(request.args.get('limit', type=int))
+    })
+
 @app.route('/api/translate', methods=['POST'])
 def translate():
     """翻译文本"""
@@ -107,7 +505,7 @@ def translate():
             return jsonify({'error': '文本不能为空'}), 400
         
         # 执行翻译
-        result = translation_service.translate(
+        result = get_translation_service().translate(
             text=text,
             target_lang=target_lang,
             source_lang=source_lang
@@ -116,9 +514,44 @@ def translate():
         return jsonify(result)
         
     except Exception as e:
-        print(f"Translation API error: {str(e)}")
+        log.error('translate_failed', error=str(e))
+        return jsonify({'error': '翻译服务暂时不可用'}), 500
+
+@app.route('/api/translate/batch', methods=['POST'])
+def translate_batch():
+    """批量翻译文本，结果顺序与输入一致"""
+    try:
+        data = request.json
+        
+        texts, error = _parse_batch_texts(data)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        results = get_translation_service().batch_translate(
+            texts,
+            target_lang=data.get('target_lang'),
+            source_lang=data.get('source_lang')
+        )
+        
+        return jsonify({'results': results})
+        
+    except Exception as e:
+        log.error('batch_translate_failed', error=str(e))
         return jsonify({'error': '翻译服务暂时不可用'}), 500
 
+def _parse_batch_texts(data, max_items=TRANSLATE_BATCH_MAX):
+    """校验批量翻译 / 检测请求，返回 (文本列表, 错误信息)"""
+    if not data or not isinstance(data.get('texts'), list):
+        return None, '缺少文本列表参数'
+    texts = data['texts']
+    if not texts:
+        return None, '文本列表不能为空'
+    if len(texts) > max_items:
+        return None, f'单次最多处理 {max_items} 条文本'
+    if not all(isinstance(text, str) and text.strip() for text in texts):
+        return None, '文本不能为空'
+    return [text.strip() for text in texts], None
+
 @app.route('/api/translate/detect', methods=['POST'])
 def detect_language():
     """检测文本语言"""
@@ -133,7 +566,7 @@ def detect_language():
         if not text:
             return jsonify({'error': '文本不能为空'}), 400
         
-        detected_lang = translation_service.detect_language(text)
+        detected_lang = get_translation_service().detect_language(text)
         
         return jsonify({
             'detected_language': detected_lang,
@@ -141,7 +574,25 @@ def detect_language():
         })
         
     except Exception as e:
-        print(f"Language detection API error: {str(e)}")
+        log.error('detect_language_failed', error=str(e))
+        return jsonify({'error': '语言检测服务暂时不可用'}), 500
+
+@app.route('/api/translate/detect/batch', methods=['POST'])
+def detect_language_batch():
+    """批量检测文本语言，结果顺序与输入一致"""
+    try:
+        data = request.json
+        
+        texts, error = _parse_batch_texts(data, max_items=DETECT_BATCH_MAX)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        return jsonify({
+            'detected_languages': get_translation_service().detect_languages(texts)
+        })
+        
+    except Exception as e:
+        log.error('batch_detect_language_failed', error=str(e))
         return jsonify({'error': '语言检测服务暂时不可用'}), 500
 
 if __name__ == '__main__':
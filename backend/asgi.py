@@ -0,0 +1,450 @@
+"""
+异步（ASGI）服务入口
+
+与 app.py 提供相同的接口，但请求处理全部基于 asyncio：等待 DeepSeek 或
+Google 翻译返回时不占用工作线程，单个进程即可承载大量进行中的对话。
+
+启动方式：
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+
+同步的 Flask 服务（python app.py）仍然可用。
+"""
+
+from quart import Quart, request, jsonify, Response, g
+from quart_cors import cors
+from app import (get_counselor, get_translation_service, get_summarizer, session_store,
+                 idempotency_store, _format_sse, _record_turn, _load_retrieval,
+                 _parse_reply_translation, _done_payload, _parse_batch_texts,
+                 _parse_idempotency_key, _replay_headers, _rate_limited, _too_many_requests,
+                 _admission_stats, _parse_request_id, warmup, profiler, slow_requests, log,
+                 DEFAULT_SESSION_ID, DETECT_BATCH_MAX, UNTRACKED_ENDPOINTS)
+from admission import Overloaded
+from session_store import MemorySessionStore
+from idempotency import IdempotencyConflict, request_fingerprint
+from profiling import ProfilerBusy, format_folded
+from logger import get_request_id, request_context, reset_request_id, set_request_id
+from utils import validate_message, sanitize_input, check_admin_token
+from metrics import REGISTRY, CONTENT_TYPE, observe_request, stage
+import http_pool
+import asyncio
+import os
+import time
+import uuid
+
+app = cors(Quart(__name__))
+
+# 内存会话存储的操作只是几次字典访问，直接在事件循环中执行；SQLite 存储可能要等
+# 其他进程或摘要线程释放写锁（最长 5 秒），放到线程中执行以免阻塞事件循环
+_SESSION_STORE_BLOCKS = not isinstance(session_store, MemorySessionStore)
+
+
+async def _session_call(fn, *args, **kwargs):
+    """调用会话存储（或读写会话存储的函数），SQLite 存储时在线程中执行"""
+    if not _SESSION_STORE_BLOCKS:
+        return fn(*args, **kwargs)
+    return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+def _read_session(session_id, limit):
+    """本轮需要的会话内容：(摘要, 最近的历史消息, 检索上下文)"""
+    summary, history = session_store.get_context(session_id, limit=limit)
+    return summary, history, _load_retrieval(session_id)
+
+
+@app.before_serving
+async def startup():
+    """启动时在线程中创建服务并构建索引，避免第一个请求阻塞事件循环"""
+    await asyncio.to_thread(warmup)
+
+
+@app.after_serving
+async def shutdown():
+    """服务退出时关闭共享连接池"""
+    await http_pool.close_session()
+
+
+@app.before_request
+async def start_timer():
+    g.request_start = time.perf_counter()
+    g.request_id_token = set_request_id(_parse_request_id(request.headers))
+    if slow_requests and request.endpoint not in UNTRACKED_ENDPOINTS:
+        # 采样本请求所在任务的 await 链（事件循环线程的调用栈反映不了单个请求）
+        g.slow_request = slow_requests.begin(asyncio.current_task())
+
+
+@app.after_request
+async def record_request(response):
+    """记录接口请求数与耗时"""
+    start = g.get('request_start')
+    if start is not None:
+        seconds = time.perf_counter() - start
+        observe_request(request.endpoint, response.status_code, seconds)
+        log.info('request', method=request.method, path=request.path,
+                 status=response.status_code, duration_ms=round(seconds * 1e3, 1))
+    request_id = get_request_id()
+    if request_id:
+        response.headers['X-Request-ID'] = request_id
+    _end_slow_request(response.status_code)
+    return response
+
+
+@app.teardown_request
+async def finish_request(error):
+    """未经 after_request 结束的请求（处理中抛出异常）"""
+    _end_slow_request(500)
+    token = g.pop('request_id_token', None)
+    if token is not None:
+        reset_request_id(token)
+
+
+def _end_slow_request(status):
+    slow_request = g.pop('slow_request', None)
+    if slow_request is not None:
+        slow_requests.end(slow_request, request.endpoint, request.method, status)
+
+
+@app.route('/api/metrics', methods=['GET'])
+async def metrics():
+    """以 Prometheus 文本格式导出指标"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@app.route('/api/health', methods=['GET'])
+async def health_check():
+    """健康检查"""
+    counselor = get_counselor()
+    summarizer = get_summarizer()
+    return jsonify({
+        'status': 'ok',
+        'message': 'Emotional Counseling AI is running',
+        'sessions': await _session_call(session_store.stats),
+        'response_cache': counselor.response_cache.stats() if counselor.response_cache else None,
+        'translation_cache': get_translation_service().cache.stats(),
+        'summarizer': summarizer.stats() if summarizer else None,
+        'admission': _admission_stats(),
+        'idempotency': idempotency_store.stats(),
+        'slow_requests': slow_requests.stats() if slow_requests else None,
+        'logging': log.stats(),
+        'llm': None if counselor.demo_mode else counselor.llm.stats()
+    })
+
+
+@app.route('/api/chat', methods=['POST'])
+async def chat():
+    """处理聊天请求"""
+    try:
+        data = await request.get_json()
+
+        # 验证输入
+        with stage('validate'):
+            if not validate_message(data):
+                return jsonify({'error': '无效的请求格式'}), 400
+
+            user_message = sanitize_input(data.get('message', ''))
+            session_id = data.get('session_id', DEFAULT_SESSION_ID)
+            translate_reply, target_lang = _parse_reply_translation(data)
+
+        if not user_message:
+            return jsonify({'error': '消息不能为空'}), 400
+
+        # 按会话与 IP 限流
+        retry_after = _rate_limited(session_id, request.remote_addr)
+        if retry_after is not None:
+            body, headers = _too_many_requests('请求过于频繁，请稍后重试', retry_after)
+            return jsonify(body), 429, headers
+
+        idempotency_key, error = _parse_idempotency_key(request.headers)
+        if error:
+            return jsonify({'error': error}), 400
+
+        async def handle():
+            counselor = get_counselor()
+            with stage('session_read'):
+                summary, conversation_history, retrieval = await _session_call(
+                    _read_session, session_id, counselor.HISTORY_MESSAGES
+                )
+
+            # 获取 AI 回复
+            response = await counselor.aget_response(
+                user_message=user_message,
+                conversation_history=conversation_history,
+                summary=summary,
+                retrieval=retrieval
+            )
+
+            # 更新会话历史
+            with stage('session_write'):
+                await _session_call(_record_turn, session_id, user_message, response['message'],
+                                    retrieval)
+
+            result = {
+                'message': response['message'],
+                'emotion': response.get('emotion', 'neutral'),
+                'session_id': session_id,
+                'cached': response.get('cached', False),
+                'prompt_tokens': response.get('prompt_tokens', 0),
+                'tokens_used': response.get('tokens_used', 0)
+            }
+
+            # 同一请求内按句并行翻译回复
+            if translate_reply:
+                with stage('translate_reply'):
+                    result['translation'] = await get_translation_service().atranslate_sentences(
+                        response['message'], target_lang=target_lang
+                    )
+            return result
+
+        # 重试请求重放已完成的结果；与进行中的相同请求合并。客户端断开后本轮
+        # 仍会完成并保存，重试即可拿到结果
+        result, replayed = await idempotency_store.arun(
+            idempotency_key, request_fingerprint(session_id, user_message, target_lang), handle
+        )
+        return jsonify(result), 200, _replay_headers(replayed)
+
+    except IdempotencyConflict as e:
+        return jsonify({'error': str(e)}), 422
+    except Overloaded as e:
+        body, headers = _too_many_requests('当前咨询人数较多，请稍后重试', e.retry_after)
+        return jsonify(body), 429, headers
+    except Exception as e:
+        log.error('chat_failed', error=str(e))
+        return jsonify({'error': '服务暂时不可用，请稍后重试'}), 500
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+async def chat_stream():
+    """以 SSE 流式返回聊天回复"""
+    data = await request.get_json()
+
+    # 验证输入
+    if not validate_message(data):
+        return jsonify({'error': '无效的请求格式'}), 400
+
+    user_message = sanitize_input(data.get('message', ''))
+    session_id = data.get('session_id', DEFAULT_SESSION_ID)
+    translate_reply, target_lang = _parse_reply_translation(data)
+
+    if not user_message:
+        return jsonify({'error': '消息不能为空'}), 400
+
+    # 按会话与 IP 限流
+    retry_after = _rate_limited(session_id, request.remote_addr)
+    if retry_after is not None:
+        body, headers = _too_many_requests('请求过于频繁，请稍后重试', retry_after)
+        return jsonify(body), 429, headers
+
+    counselor = get_counselor()
+    summary, conversation_history, retrieval = await _session_call(
+        _read_session, session_id, counselor.HISTORY_MESSAGES
+    )
+
+    # 流式响应在视图函数返回后才生成，需要带上本请求的 ID
+    request_id = get_request_id()
+
+    async def generate():
+        with request_context(request_id):
+            async for message in _generate():
+                yield message
+
+    async def _generate():
+        try:
+            events = counselor.astream_response(
+                user_message=user_message,
+                conversation_history=conversation_history,
+                summary=summary,
+                retrieval=retrieval
+            )
+            if translate_reply:
+                # 每生成完一句就送去翻译，译文以 translation 事件按句推送
+                events = get_translation_service().atranslate_stream(events, target_lang=target_lang)
+
+            async for event, payload in events:
+                if event == 'done':
+                    # 回复完整生成后再写入会话历史
+                    await _session_call(_record_turn, session_id, user_message, payload['message'],
+                                        retrieval)
+                    payload = _done_payload(payload, session_id)
+                yield _format_sse(event, payload)
+        except Overloaded as e:
+            body, _ = _too_many_requests('当前咨询人数较多，请稍后重试', e.retry_after)
+            yield _format_sse('error', body)
+        except Exception as e:
+            log.error('chat_stream_failed', error=str(e))
+            yield _format_sse('error', {'error': '服务暂时不可用，请稍后重试'})
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.timeout = None
+    return response
+
+
+@app.route('/api/session/new', methods=['POST'])
+async def new_session():
+    """创建新会话"""
+    session_id = str(uuid.uuid4())
+    await _session_call(session_store.create, session_id)
+    return jsonify({'session_id': session_id})
+
+
+@app.route('/api/session/<session_id>', methods=['DELETE'])
+async def delete_session(session_id):
+    """删除会话"""
+    if await _session_call(session_store.delete, session_id):
+        return jsonify({'message': '会话已删除'})
+    return jsonify({'error': '会话不存在'}), 404
+
+
+@app.route('/api/admin/knowledge/reload', methods=['POST'])
+async def reload_knowledge_base():
+    """重新加载知识库，只更新有变化的主题"""
+    if not check_admin_token(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': '无权访问'}), 403
+
+    try:
+        # 重建索引是 CPU 工作，放到线程中避免阻塞事件循环
+        summary = await asyncio.to_thread(get_counselor().rag.reload)
+        return jsonify(summary)
+    except Exception as e:
+        log.error('knowledge_base_reload_failed', error=str(e))
+        return jsonify({'error': '知识库重新加载失败'}), 500
+
+
+@app.route('/api/admin/profile', methods=['POST'])
+async def profile():
+    """采样全部线程的调用栈 seconds 秒，返回折叠格式（可直接绘制火焰图）"""
+    if not check_admin_token(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': '无权访问'}), 403
+
+    try:
+        # 在线程中采样，事件循环照常处理请求（其调用栈也会被采到）
+        stacks = await asyncio.to_thread(
+            profiler.profile,
+            seconds=request.args.get('seconds', 10, type=float),
+            interval=request.args.get('interval', 0.01, type=float)
+        )
+    except ProfilerBusy as e:
+        return jsonify({'error': str(e)}), 409
+    return Response(format_folded(stacks), content_type='text/plain; charset=utf-8')
+
+
+@app.route('/api/admin/slow-requests', methods=['GET'])
+async def slow_request_log():
+    """最近的慢请求：耗时、阶段明细与调用栈采样；format=folded 时合并为折叠格式"""
+    if not check_admin_token(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': '无权访问'}), 403
+    if not slow_requests:
+        return jsonify({'error': '慢请求记录未开启（SLOW_REQUEST_THRESHOLD）'}), 404
+
+    if request.args.get('format') == 'folded':
+        return Response(format_folded(slow_requests.folded()), content_type='text/plain; charset=utf-8')
+    return jsonify({
+        'threshold': slow_requests.threshold,
+        'requests': slow_requests.recent(request.args.get('limit', type=int))
+    })
+
+
+@app.route('/api/translate', methods=['POST'])
+async def translate():
+    """翻译文本"""
+    try:
+        data = await request.get_json()
+
+        # 验证输入
+        if not data or 'text' not in data:
+            return jsonify({'error': '缺少文本参数'}), 400
+
+        text = data.get('text', '').strip()
+        target_lang = data.get('target_lang')  # 可选：'zh-cn' 或 'en'
+        source_lang = data.get('source_lang')  # 可选：源语言
+
+        if not text:
+            return jsonify({'error': '文本不能为空'}), 400
+
+        # 执行翻译
+        result = await get_translation_service().atranslate(
+            text=text,
+            target_lang=target_lang,
+            source_lang=source_lang
+        )
+
+        return jsonify(result)
+
+    except Exception as e:
+        log.error('translate_failed', error=str(e))
+        return jsonify({'error': '翻译服务暂时不可用'}), 500
+
+
+@app.route('/api/translate/batch', methods=['POST'])
+async def translate_batch():
+    """批量翻译文本，结果顺序与输入一致"""
+    try:
+        data = await request.get_json()
+
+        texts, error = _parse_batch_texts(data)
+        if error:
+            return jsonify({'error': error}), 400
+
+        results = await get_translation_service().abatch_translate(
+            texts,
+            target_lang=data.get('target_lang'),
+            source_lang=data.get('source_lang')
+        )
+
+        return jsonify({'results': results})
+
+    except Exception as e:
+        log.error('batch_translate_failed', error=str(e))
+        return jsonify({'error': '翻译服务暂时不可用'}), 500
+
+
+@app.route('/api/translate/detect', methods=['POST'])
+async def detect_language():
+    """检测文本语言"""
+    try:
+        data = await request.get_json()
+
+        if not data or 'text' not in data:
+            return jsonify({'error': '缺少文本参数'}), 400
+
+        text = data.get('text', '').strip()
+
+        if not text:
+            return jsonify({'error': '文本不能为空'}), 400
+
+        detected_lang = get_translation_service().detect_language(text)
+
+        return jsonify({
+            'detected_language': detected_lang,
+            'text': text
+        })
+
+    except Exception as e:
+        log.error('detect_language_failed', error=str(e))
+        return jsonify({'error': '语言检测服务暂时不可用'}), 500
+
+
+@app.route('/api/translate/detect/batch', methods=['POST'])
+async def detect_language_batch():
+    """批量检测文本语言，结果顺序与输入一致"""
+    try:
+        data = await request.get_json()
+
+        texts, error = _parse_batch_texts(data, max_items=DETECT_BATCH_MAX)
+        if error:
+            return jsonify({'error': error}), 400
+
+        return jsonify({
+            'detected_languages': get_translation_service().detect_languages(texts)
+        })
+
+    except Exception as e:
+        log.error('batch_detect_language_failed', error=str(e))
+        return jsonify({'error': '语言检测服务暂时不可用'}), 500
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    port = int(os.getenv('PORT', 5000))
+    uvicorn.run('asgi:app', host='0.0.0.0', port=port)
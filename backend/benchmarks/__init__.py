@@ -0,0 +1,6 @@
+"""
+性能基准测试
+
+在 backend 目录下运行，例如：
+    python -m benchmarks.bench_rag_search
+"""
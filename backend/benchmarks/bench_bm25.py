@@ -0,0 +1,53 @@
+"""
+BM25 检索基准测试
+
+用法：
+    python -m benchmarks.bench_bm25 [--sizes 1000 100000] [--queries 200]
+"""
+
+import argparse
+import time
+
+from rag_system import RAGSystem
+from benchmarks.synthetic import make_knowledge_base, make_queries
+
+
+def bench(n_passages, n_queries, top_k=2, content_words=20):
+    """返回单个规模下的建索引耗时与单次查询耗时"""
+    knowledge_base = make_knowledge_base(n_passages, content_words=content_words)
+    queries = make_queries(knowledge_base, n_queries)
+
+    start = time.perf_counter()
+    rag = RAGSystem(knowledge_base=knowledge_base, engine='bm25')
+    build_s = time.perf_counter() - start
+
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        rag.search(q, top_k)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    return {
+        'passages': n_passages,
+        'postings': int(rag._index.bm25._post_docs.size),
+        'build_s': round(build_s, 2),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'passages':>9} {'postings':>10} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for n_passages in args.sizes:
+        r = bench(n_passages, args.queries)
+        print(f"{r['passages']:>9} {r['postings']:>10} {r['build_s']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8}")
+
+
+if __name__ == '__main__':
+    main()
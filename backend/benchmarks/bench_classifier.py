@@ -0,0 +1,93 @@
+"""
+消息分类基准测试：逐表扫描 vs. 单次扫描的 MessageClassifier
+
+--extra-keywords 为每张表追加合成关键词，观察关键词表变大时两者的差异。
+
+用法：
+    python -m benchmarks.bench_classifier [--messages 20000] [--extra-keywords 0 200 2000]
+"""
+
+import argparse
+import random
+import time
+
+from classifier import MessageClassifier
+from prompts import EMOTION_KEYWORDS, CRISIS_KEYWORDS, DEMO_INTENT_KEYWORDS
+from benchmarks.synthetic import random_word, make_messages
+
+
+def legacy_classify(message, emotion_keywords=EMOTION_KEYWORDS, crisis_keywords=CRISIS_KEYWORDS,
+                    intent_keywords=DEMO_INTENT_KEYWORDS):
+    """原先的做法：情绪、危机、演示意图各扫描一遍"""
+    message_lower = message.lower()
+
+    emotion = 'neutral'
+    for name, keywords in emotion_keywords.items():
+        if any(keyword in message_lower for keyword in keywords):
+            emotion = name
+            break
+
+    crisis = any(keyword in message_lower for keyword in crisis_keywords)
+
+    intent = None
+    for name, keywords in intent_keywords.items():
+        if any(word in message_lower for word in keywords):
+            intent = name
+            break
+
+    return emotion, crisis, intent
+
+
+def extend_tables(extra, seed=4):
+    """为每张关键词表追加 extra 个合成关键词（按比例分配到各类别）"""
+    rng = random.Random(seed)
+    per_emotion = extra // len(EMOTION_KEYWORDS)
+    per_intent = extra // len(DEMO_INTENT_KEYWORDS)
+    emotions = {name: ks + [random_word(rng, 3, 4) for _ in range(per_emotion)]
+                for name, ks in EMOTION_KEYWORDS.items()}
+    crisis = CRISIS_KEYWORDS + [random_word(rng, 3, 4) for _ in range(extra)]
+    intents = {name: ks + [random_word(rng, 3, 4) for _ in range(per_intent)]
+               for name, ks in DEMO_INTENT_KEYWORDS.items()}
+    return emotions, crisis, intents
+
+
+def bench(messages, extra):
+    """返回某一关键词规模下两种做法的单条消息耗时（微秒）"""
+    tables = extend_tables(extra)
+    classifier = MessageClassifier(*tables)
+
+    # 结果与逐表扫描一致
+    for message in messages:
+        c = classifier.classify(message)
+        assert (c.emotion, c.crisis, c.intent) == legacy_classify(message, *tables), message
+
+    start = time.perf_counter()
+    for message in messages:
+        legacy_classify(message, *tables)
+    legacy_us = (time.perf_counter() - start) / len(messages) * 1e6
+
+    start = time.perf_counter()
+    for message in messages:
+        classifier.classify(message)
+    single_us = (time.perf_counter() - start) / len(messages) * 1e6
+
+    return len(classifier._automaton), legacy_us, single_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--extra-keywords', type=int, nargs='+', default=[0, 200, 2000])
+    args = parser.parse_args()
+
+    messages = make_messages(args.messages)
+    avg_len = sum(len(m) for m in messages) / len(messages)
+    print(f"messages={len(messages)} avg_len={avg_len:.0f} chars")
+    print(f"{'keywords':>9} {'3 scans µs':>11} {'single pass µs':>15}")
+    for extra in args.extra_keywords:
+        n_keywords, legacy_us, single_us = bench(messages, extra)
+        print(f"{n_keywords:>9} {legacy_us:>11.2f} {single_us:>15.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+FTS5 知识库基准测试：进程内存与查询耗时随知识库规模的变化
+
+每个规模生成一份合成知识库，导入 SQLite 数据库，然后分别在新的子进程中用
+bm25（整体载入内存）与 fts（SQLite FTS5）两种引擎执行同一批查询，记录进程
+常驻内存与单次查询耗时。常驻内存分为进程私有的匿名内存（Python 对象、NumPy
+数组等）与映射文件的页面（fts 引擎经 mmap 读取的数据库页面，属于操作系统页缓存，
+可被其他进程共享、内存紧张时可回收）；fts 引擎的匿名内存应基本不随规模变化。
+需要 Linux（读取 /proc/self/status）。
+
+用法：
+    python -m benchmarks.bench_kb_fts [--sizes 10000 100000] [--queries 500]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import make_knowledge_base, make_queries
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def memory_mb():
+    """当前进程常驻内存中的 (匿名内存, 映射文件) MB"""
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            fields[name] = value
+    return tuple(round(int(fields[name].split()[0]) / 1024, 1) for name in ('RssAnon', 'RssFile'))
+
+
+def run_queries(engine, kb_path, db_path, queries_path):
+    """（子进程中）打开知识库并执行查询，输出 JSON 结果"""
+    with open(queries_path, 'r', encoding='utf-8') as f:
+        queries = json.load(f)
+    if engine == 'fts':
+        from kb_store import FTSKnowledgeBase
+        rag = FTSKnowledgeBase(db_path)
+    else:
+        from rag_system import RAGSystem
+        rag = RAGSystem(knowledge_base_path=kb_path, engine=engine)
+
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        rag.search(q, 2)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    anon_mb, file_mb = memory_mb()
+    print(json.dumps({
+        'anon_mb': anon_mb,
+        'file_mb': file_mb,
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 3),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99)] * 1000, 3)
+    }))
+
+
+def bench(n_topics, n_queries, workdir):
+    """返回单个规模下两种引擎的内存与耗时"""
+    from kb_store import import_topics
+
+    knowledge_base = make_knowledge_base(n_topics, content_words=60)
+    kb_path = os.path.join(workdir, f'kb_{n_topics}.json')
+    db_path = os.path.join(workdir, f'kb_{n_topics}.db')
+    queries_path = os.path.join(workdir, f'queries_{n_topics}.json')
+    with open(kb_path, 'w', encoding='utf-8') as f:
+        json.dump(knowledge_base, f, ensure_ascii=False)
+    with open(queries_path, 'w', encoding='utf-8') as f:
+        json.dump(make_queries(knowledge_base, n_queries), f, ensure_ascii=False)
+    summary = import_topics(db_path, knowledge_base.items())
+    del knowledge_base
+
+    results = {'topics': n_topics, 'import_s': summary['seconds'],
+               'db_mb': round(os.path.getsize(db_path) / 2**20, 1)}
+    for engine in ('bm25', 'fts'):
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_kb_fts', '--child', engine, kb_path, db_path,
+             queries_path],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+            env=dict(os.environ, LOG_LEVEL='error')
+        ).stdout
+        results[engine] = json.loads(output.strip().splitlines()[-1])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--child', nargs=4, metavar=('ENGINE', 'KB', 'DB', 'QUERIES'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_queries(*args.child)
+        return
+
+    print(f"{'topics':>8} {'db MB':>7} {'import s':>9} {'engine':>7} {'anon MB':>8} {'file MB':>8} "
+          f"{'p50 ms':>8} {'p99 ms':>8}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_topics in args.sizes:
+            r = bench(n_topics, args.queries, workdir)
+            for engine in ('bm25', 'fts'):
+                e = r[engine]
+                print(f"{r['topics']:>8} {r['db_mb']:>7} {r['import_s']:>9} {engine:>7} "
+                      f"{e['anon_mb']:>8} {e['file_mb']:>8} {e['p50_ms']:>8} {e['p99_ms']:>8}")
+
+
+if __name__ == '__main__':
+    main()
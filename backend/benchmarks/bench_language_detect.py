@@ -0,0 +1,82 @@
+"""
+语言检测基准测试：逐字符扫描 vs. 正则按段计数 + 长文本抽样（单条）/ NumPy 批量分类
+
+两者对全角标点的处理不同（新做法不计入分母），因此混合文本的结果并非完全一致。
+
+用法：
+    python -m benchmarks.bench_language_detect [--size-mb 1] [--batch 10000]
+"""
+
+import argparse
+import random
+import time
+
+from translator import TranslationService, CHINESE_THRESHOLD
+from benchmarks.synthetic import random_word
+
+_ENGLISH_WORDS = ['love', 'feel', 'really', 'missing', 'you', 'today', 'why', 'hello', 'sorry', 'we']
+
+
+def legacy_detect(text):
+    """原先的做法：逐字符比较 CJK 基本区，空格之外的字符都计入分母"""
+    text = text.strip()
+    if not text:
+        return 'en'
+    chinese_chars = sum(1 for char in text if '一' <= char <= '鿿')
+    total_chars = len(text.replace(' ', ''))
+    if total_chars > 0 and (chinese_chars / total_chars) > CHINESE_THRESHOLD:
+        return 'zh-CN'
+    return 'en'
+
+
+def make_text(rng, n_chars, chinese_ratio):
+    """生成中英混合文本，中文词约占 chinese_ratio"""
+    parts = []
+    length = 0
+    while length < n_chars:
+        if rng.random() < chinese_ratio:
+            word = random_word(rng) + rng.choice(['', '，', '。'])
+        else:
+            word = ' ' + rng.choice(_ENGLISH_WORDS)
+        parts.append(word)
+        length += len(word)
+    return ''.join(parts)[:n_chars]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size-mb', type=float, default=1.0)
+    parser.add_argument('--batch', type=int, default=10000)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    service = TranslationService()
+    # 预先构建字符类别表，不计入计时
+    service.detect_languages([''])
+
+    print(f"{'input':<28} {'legacy ms':>10} {'new ms':>10} {'agree':>8}")
+
+    n_chars = int(args.size_mb * 1024 * 1024)
+    for ratio in (0.9, 0.1):
+        text = make_text(rng, n_chars, ratio)
+        legacy, legacy_s = timed(legacy_detect, text)
+        new, new_s = timed(service.detect_language, text)
+        label = f"{args.size_mb:g}MB text zh={ratio:.0%}"
+        print(f"{label:<28} {legacy_s * 1e3:>10.2f} {new_s * 1e3:>10.3f} {str(legacy == new):>8}")
+
+    texts = [make_text(rng, rng.randint(5, 200), rng.random()) for _ in range(args.batch)]
+    legacy, legacy_s = timed(lambda: [legacy_detect(t) for t in texts])
+    new, new_s = timed(service.detect_languages, texts)
+    agree = sum(a == b for a, b in zip(legacy, new)) / len(texts)
+    label = f"batch of {args.batch} messages"
+    print(f"{label:<28} {legacy_s * 1e3:>10.2f} {new_s * 1e3:>10.3f} {agree:>8.1%}")
+
+
+if __name__ == '__main__':
+    main()
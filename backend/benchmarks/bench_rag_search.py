@@ -0,0 +1,75 @@
+"""
+RAGSystem.search 基准测试：逐关键词扫描 vs. Aho–Corasick 自动机
+
+用法：
+    python -m benchmarks.bench_rag_search [--sizes 10 1000 100000] [--queries 200]
+"""
+
+import argparse
+import time
+
+from rag_system import RAGSystem
+from benchmarks.synthetic import make_knowledge_base, make_queries
+
+
+def linear_search(knowledge_base, query, top_k=2):
+    """原先的实现：对每个主题的每个关键词执行一次子串查找"""
+    results = []
+    query_lower = query.lower()
+    for topic, data in knowledge_base.items():
+        score = sum(1 for keyword in data['keywords'] if keyword in query_lower)
+        if score > 0:
+            results.append({'topic': topic, 'score': score})
+    results.sort(key=lambda x: x['score'], reverse=True)
+    return results[:top_k]
+
+
+def bench(n_topics, n_queries, top_k=2):
+    """返回单个知识库规模下两种实现的耗时（微秒/查询）"""
+    knowledge_base = make_knowledge_base(n_topics)
+    queries = make_queries(knowledge_base, n_queries)
+
+    start = time.perf_counter()
+    rag = RAGSystem(knowledge_base=knowledge_base)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    # 线性扫描在大知识库上很慢，只测一部分查询
+    linear_queries = queries[:max(10, n_queries * 10 // max(n_topics, 10))]
+    start = time.perf_counter()
+    expected = [linear_search(knowledge_base, q, top_k) for q in linear_queries]
+    linear_us = (time.perf_counter() - start) / len(linear_queries) * 1e6
+
+    start = time.perf_counter()
+    for q in queries:
+        rag.search(q, top_k)
+    indexed_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+    # 排名必须与原实现完全一致
+    for q, want in zip(linear_queries, expected):
+        got = [(r['topic'], r['score']) for r in rag.search(q, top_k)]
+        assert got == [(r['topic'], r['score']) for r in want], q
+
+    return {
+        'topics': n_topics,
+        'build_ms': round(build_ms, 2),
+        'linear_us_per_query': round(linear_us, 1),
+        'automaton_us_per_query': round(indexed_us, 1),
+        'speedup': round(linear_us / indexed_us, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'topics':>8} {'build ms':>10} {'linear µs':>12} {'automaton µs':>14} {'speedup':>8}")
+    for n_topics in args.sizes:
+        r = bench(n_topics, args.queries)
+        print(f"{r['topics']:>8} {r['build_ms']:>10} {r['linear_us_per_query']:>12} "
+              f"{r['automaton_us_per_query']:>14} {r['speedup']:>8}")
+
+
+if __name__ == '__main__':
+    main()
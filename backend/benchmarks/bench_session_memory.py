@@ -0,0 +1,108 @@
+"""
+会话内存基准测试：每 10 万个会话占用的内存
+
+对比原先的布局（每个会话一个 deque，每条消息一个 {'role', 'content'} 字典）
+与 MemorySessionStore 的紧凑布局（定长环形数组 + 固定回复编号），分别统计
+回复全部为演示模式固定回复、全部为模型生成两种情况。内存由 tracemalloc
+统计，同时列出会话存储自身的估算值（用于 SESSION_MAX_BYTES 淘汰）。
+
+用法：
+    python -m benchmarks.bench_session_memory [--sessions 100000] [--turns 5] [--window 20]
+"""
+
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict, deque
+
+from prompts import DEMO_RESPONSES
+from session_store import MemorySessionStore
+from benchmarks.synthetic import make_messages, random_word
+
+
+class LegacySession:
+    __slots__ = ('messages', 'size', 'touched', 'seq', 'summary', 'summary_seq')
+
+    def __init__(self, window):
+        self.messages = deque(maxlen=window)
+        self.size = 0
+        self.touched = time.monotonic()
+        self.seq = 0
+        self.summary = ''
+        self.summary_seq = 0
+
+
+class LegacyStore:
+    """原先的内存布局与内存估算方式"""
+
+    def __init__(self, window):
+        self.window = window
+        self.sessions = OrderedDict()
+        self.bytes = 0
+
+    def append_turn(self, session_id, user_message, reply):
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = LegacySession(self.window)
+        for message in ({'role': 'user', 'content': user_message},
+                        {'role': 'assistant', 'content': reply}):
+            if len(session.messages) == session.messages.maxlen:
+                dropped = session.messages[0]
+                self.bytes -= sys.getsizeof(dropped['content']) + sys.getsizeof(dropped)
+            session.messages.append(message)
+            session.seq += 1
+            self.bytes += sys.getsizeof(message['content']) + sys.getsizeof(message)
+
+
+def measure(store, n_sessions, turns, user_messages, replies, seed=7):
+    """填充 n_sessions 个会话，返回 (实际占用字节, 存储估算字节)"""
+    rng = random.Random(seed)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for i in range(n_sessions):
+        session_id = f'session-{i}'
+        for _ in range(turns):
+            # 用户消息每次都是新的字符串对象，与真实请求一致
+            store.append_turn(session_id, rng.choice(user_messages) + ' ', rng.choice(replies)())
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    estimated = store.bytes if isinstance(store, LegacyStore) else store.stats()['bytes']
+    return used, estimated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=100000)
+    parser.add_argument('--turns', type=int, default=5)
+    parser.add_argument('--window', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(9)
+    user_messages = make_messages(500, seed=8)
+    generated = [''.join(random_word(rng) for _ in range(60)) for _ in range(200)]
+    scenarios = {
+        # 演示模式直接返回模板字符串本身
+        'demo replies': [lambda reply=reply: reply for reply in DEMO_RESPONSES.values()],
+        # 模型生成的回复每次都是新的字符串对象
+        'llm replies': [lambda reply=reply: reply + ' ' for reply in generated],
+    }
+
+    scale = 100000 / args.sessions
+    print(f"sessions={args.sessions} turns={args.turns} window={args.window} (MB per 100k sessions)")
+    print(f"{'scenario':<14} {'layout':<8} {'actual MB':>10} {'estimated MB':>13}")
+    for name, replies in scenarios.items():
+        for layout, store in (
+            ('legacy', LegacyStore(args.window)),
+            ('compact', MemorySessionStore(window=args.window, max_sessions=args.sessions * 2,
+                                           max_bytes=1 << 40)),
+        ):
+            used, estimated = measure(store, args.sessions, args.turns, user_messages, replies)
+            print(f"{name:<14} {layout:<8} {used * scale / 2**20:>10.1f} "
+                  f"{estimated * scale / 2**20:>13.1f}")
+            del store
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+启动耗时检查：导入服务入口模块的耗时与加载的重量级依赖
+
+在子进程中以 python -X importtime 导入 app（或 --module 指定的模块），取多次
+运行中最快的一次作为导入耗时。超过预算，或在导入时就加载了应当推迟到第一次
+使用时才加载的模块（openai、deep_translator、numpy、aiohttp 等），以非零状态
+退出，可放在 CI 中防止启动时间回退。
+
+用法：
+    python -m benchmarks.check_startup [--budget 0.4] [--runs 5] [--module app]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只应在创建咨询师 / 翻译服务时才加载的模块
+DEFERRED_MODULES = ('openai', 'deep_translator', 'numpy', 'aiohttp', 'counselor', 'rag_system',
+                    'translator', 'llm_client')
+
+
+def import_profile(module):
+    """
+    在新的解释器中导入 module
+
+    Returns:
+        tuple: (总耗时秒数, {顶层模块名: 累计耗时秒数}, 最慢的若干模块 [(累计秒数, 模块名)])
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    loaded = {}
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        seconds = int(cumulative) / 1e6
+        name = name.rstrip()
+        # 缩进表示被谁导入，只有顶层（相对 site 之后）的条目计入总耗时
+        depth = (len(name) - len(name.lstrip())) // 2
+        name = name.strip()
+        loaded.setdefault(name.split('.')[0], seconds)
+        rows.append((seconds, name, depth))
+    total = next(seconds for seconds, name, _ in reversed(rows) if name == module)
+    slowest = sorted(((seconds, name) for seconds, name, depth in rows if depth <= 1), reverse=True)
+    return total, loaded, slowest[:10]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--budget', type=float, default=0.4, help='导入耗时预算（秒）')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    profiles = [import_profile(args.module) for _ in range(args.runs)]
+    total, loaded, slowest = min(profiles, key=lambda profile: profile[0])
+
+    print(f"import {args.module}: {total * 1e3:.0f} ms (best of {args.runs}, budget {args.budget * 1e3:.0f} ms)")
+    for seconds, name in slowest:
+        print(f"  {seconds * 1e3:8.1f} ms  {name}")
+
+    failures = []
+    if total > args.budget:
+        failures.append(f"导入耗时 {total * 1e3:.0f} ms 超过预算 {args.budget * 1e3:.0f} ms")
+    eager = [name for name in DEFERRED_MODULES if name in loaded and name != args.module]
+    if eager:
+        failures.append(f"导入时加载了应推迟加载的模块: {', '.join(eager)}")
+
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        sys.exit(1)
+    print("✅ 启动耗时检查通过")
+
+
+if __name__ == '__main__':
+    main()
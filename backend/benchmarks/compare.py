@@ -0,0 +1,59 @@
+"""
+对比两次基准测试结果（micro 或 load 生成的 JSON）
+
+用法：
+    python -m benchmarks.compare benchmarks/results/micro-abc123.json benchmarks/results/micro-def456.json
+"""
+
+import argparse
+import json
+
+
+def flatten(results, prefix=''):
+    """把嵌套结果展开为 {'chat.p99_ms': 123.4, ...}，只保留数值"""
+    flat = {}
+    for key, value in results.items():
+        name = f'{prefix}{key}'
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+
+    print(f"baseline:  {baseline.get('commit')} {baseline.get('timestamp')}")
+    print(f"candidate: {candidate.get('commit')} {candidate.get('timestamp')}")
+
+    old = flatten(baseline['results'])
+    new = flatten(candidate['results'])
+    print(f"{'metric':<44} {'baseline':>14} {'candidate':>14} {'change':>9}")
+    for name in sorted(set(old) | set(new)):
+        before, after = old.get(name), new.get(name)
+        if before is None or after is None:
+            change = 'n/a'
+        elif before == 0:
+            change = '0' if after == 0 else 'new'
+        else:
+            change = f'{(after - before) / before:+.1%}'
+        print(f"{name:<44} {_format(before):>14} {_format(after):>14} {change:>9}")
+
+
+def _format(value):
+    if value is None:
+        return '-'
+    return f'{value:.4g}' if isinstance(value, float) else str(value)
+
+
+if __name__ == '__main__':
+    main()
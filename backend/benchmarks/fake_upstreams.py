@@ -0,0 +1,114 @@
+"""
+本地模拟的 DeepSeek 与 Google 翻译服务，用于压力测试
+
+- POST /v1/chat/completions：兼容 OpenAI 接口，支持 stream=true（SSE），
+  先等待 llm_latency 秒，流式时每个分片之间再等待 chunk_interval 秒
+- GET  /v1/models：模型列表（熔断器的健康探测）
+- GET  /m：与 Google 翻译移动版页面结构相同，等待 translate_latency 秒后
+  返回 <div class="result-container">
+
+用法（单独运行）：
+    python -m benchmarks.fake_upstreams [--port 8900] [--llm-latency 0.5] [--translate-latency 0.1]
+"""
+
+import argparse
+import asyncio
+import html
+import json
+import time
+
+from aiohttp import web
+
+REPLY = "我理解你现在的心情💙 感情里的不确定最让人煎熬。先照顾好自己的情绪，再试着和对方坦诚地聊一聊你的感受。"
+
+
+def create_app(llm_latency=0.5, chunk_interval=0.01, chunk_chars=8, translate_latency=0.1):
+    """创建模拟服务的 aiohttp 应用"""
+    stats = {'chat': 0, 'translate': 0}
+
+    async def chat_completions(request):
+        body = await request.json()
+        stats['chat'] += 1
+        await asyncio.sleep(llm_latency)
+
+        prompt_chars = sum(len(m.get('content', '')) for m in body.get('messages', []))
+        usage = {
+            'prompt_tokens': prompt_chars // 2,
+            'completion_tokens': len(REPLY) // 2,
+            'total_tokens': prompt_chars // 2 + len(REPLY) // 2
+        }
+        created = int(time.time())
+
+        if not body.get('stream'):
+            return web.json_response({
+                'id': 'chatcmpl-bench',
+                'object': 'chat.completion',
+                'created': created,
+                'model': body.get('model'),
+                'choices': [{
+                    'index': 0,
+                    'message': {'role': 'assistant', 'content': REPLY},
+                    'finish_reason': 'stop'
+                }],
+                'usage': usage
+            })
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+
+        async def send(payload):
+            await response.write(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode())
+
+        for i in range(0, len(REPLY), chunk_chars):
+            await send({
+                'id': 'chatcmpl-bench',
+                'object': 'chat.completion.chunk',
+                'created': created,
+                'choices': [{'index': 0, 'delta': {'content': REPLY[i:i + chunk_chars]}}]
+            })
+            await asyncio.sleep(chunk_interval)
+        await send({'id': 'chatcmpl-bench', 'object': 'chat.completion.chunk',
+                    'created': created, 'choices': [], 'usage': usage})
+        await response.write(b"data: [DONE]\n\n")
+        return response
+
+    async def translate(request):
+        stats['translate'] += 1
+        await asyncio.sleep(translate_latency)
+        text = request.query.get('q', '')
+        target = request.query.get('tl', '')
+        return web.Response(
+            text=f'<html><body><div class="result-container">[{target}] {html.escape(text)}</div></body></html>',
+            content_type='text/html'
+        )
+
+    async def list_models(request):
+        return web.json_response({'object': 'list', 'data': [{'id': 'deepseek-chat', 'object': 'model'}]})
+
+    async def get_stats(request):
+        return web.json_response(stats)
+
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', chat_completions)
+    app.router.add_get('/v1/models', list_models)
+    app.router.add_get('/m', translate)
+    app.router.add_get('/stats', get_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--chunk-interval', type=float, default=0.01)
+    parser.add_argument('--translate-latency', type=float, default=0.1)
+    args = parser.parse_args()
+
+    web.run_app(
+        create_app(args.llm_latency, args.chunk_interval, translate_latency=args.translate_latency),
+        host='127.0.0.1', port=args.port, print=None, access_log=None
+    )
+
+
+if __name__ == '__main__':
+    main()
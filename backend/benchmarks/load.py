@@ -0,0 +1,235 @@
+"""
+端到端压力测试：以指定并发驱动 /api/chat 与 /api/translate
+
+测试时启动三个进程：
+- benchmarks.fake_upstreams：本地模拟的 DeepSeek 与 Google 翻译，延迟可配置
+- 被测服务：Flask（werkzeug 多线程）或 ASGI（uvicorn asgi:app）
+- 本进程：aiohttp 客户端，按并发数发送请求并记录每个请求的耗时
+
+报告各接口的吞吐量、p50/p95/p99 延迟、错误数、上游调用次数，以及每个会话
+占用的内存（服务进程 RSS 增量与会话存储估算值），结果保存为 JSON
+（默认 benchmarks/results/load-<commit>.json）。
+
+用法：
+    python -m benchmarks.load [--server flask|asgi] [--requests 500] [--concurrency 32]
+                              [--llm-latency 0.5] [--translate-latency 0.1] [--stream]
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import aiohttp
+
+from benchmarks.report import latency_summary, print_table, write_report
+from benchmarks.synthetic import make_messages
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def serve_flask(port):
+    """在子进程中以多线程 werkzeug 服务器运行 Flask 应用"""
+    from werkzeug.serving import make_server
+    from app import app
+
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+def start_process(command, env=None):
+    return subprocess.Popen(command, cwd=BACKEND_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_ready(url, process, timeout=60):
+    """轮询直到服务可以访问"""
+    import urllib.request
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务进程已退出（返回码 {process.returncode}）：{url}")
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"服务启动超时：{url}")
+
+
+def rss_bytes(pid):
+    """进程常驻内存（仅 Linux），无法读取时返回 None"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+async def drive(session, url, payloads, concurrency, stream=False):
+    """按并发数发送全部请求，返回 (耗时样本, 首字节耗时样本, 错误数, 墙钟时间)"""
+    samples = []
+    first_byte = []
+    errors = 0
+    queue = asyncio.Queue()
+    for payload in payloads:
+        queue.put_nowait(payload)
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            payload = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as response:
+                    if stream:
+                        # 第一段 SSE 数据到达的时间
+                        await response.content.readany()
+                        first_byte.append(time.perf_counter() - start)
+                    await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            samples.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, first_byte, errors, time.perf_counter() - start
+
+
+async def run_load(base_url, upstream_url, args, server_pid):
+    messages = make_messages(args.requests * 2, seed=11)
+    chat_payloads = [
+        {'message': messages[i], 'session_id': f'load-{i % args.sessions}'}
+        for i in range(args.requests)
+    ]
+    translate_payloads = [
+        {'text': messages[args.requests + i], 'target_lang': 'en'}
+        for i in range(args.requests)
+    ]
+
+    results = {}
+    timeout = aiohttp.ClientTimeout(total=300)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        rss_before = rss_bytes(server_pid)
+
+        endpoint = '/api/chat/stream' if args.stream else '/api/chat'
+        samples, first_byte, errors, elapsed = await drive(
+            session, base_url + endpoint, chat_payloads, args.concurrency, stream=args.stream
+        )
+        results['chat'] = dict(latency_summary(samples, elapsed), errors=errors)
+        if first_byte:
+            results['chat_first_byte'] = latency_summary(first_byte, elapsed)
+
+        rss_after = rss_bytes(server_pid)
+        async with session.get(base_url + '/api/health') as response:
+            health = await response.json()
+
+        samples, _, errors, elapsed = await drive(
+            session, base_url + '/api/translate', translate_payloads, args.concurrency
+        )
+        results['translate'] = dict(latency_summary(samples, elapsed), errors=errors)
+
+        async with session.get(upstream_url + '/stats') as response:
+            results['upstream_calls'] = await response.json()
+
+    sessions = health.get('sessions', {})
+    n_sessions = sessions.get('sessions') or args.sessions
+    results['session_memory'] = {
+        'sessions': n_sessions,
+        'rss_bytes_per_session': (
+            round((rss_after - rss_before) / n_sessions)
+            if rss_before is not None and rss_after is not None else None
+        ),
+        'estimated_bytes_per_session': (
+            round(sessions['bytes'] / n_sessions) if 'bytes' in sessions else None
+        )
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--server', choices=['flask', 'asgi'], default='flask')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--sessions', type=int, default=100)
+    parser.add_argument('--stream', action='store_true', help='使用 /api/chat/stream')
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--chunk-interval', type=float, default=0.01)
+    parser.add_argument('--translate-latency', type=float, default=0.1)
+    parser.add_argument('--response-cache', action='store_true', help='开启回复缓存')
+    parser.add_argument('--output', help='结果 JSON 路径')
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    server_port = free_port()
+    upstream_url = f'http://127.0.0.1:{upstream_port}'
+    base_url = f'http://127.0.0.1:{server_port}'
+
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY='sk-benchmark',
+        OPENAI_BASE_URL=f'{upstream_url}/v1',
+        GOOGLE_TRANSLATE_URL=f'{upstream_url}/m',
+        RESPONSE_CACHE_SIZE=os.getenv('RESPONSE_CACHE_SIZE', '10000') if args.response_cache else '0',
+        KB_WATCH_INTERVAL='0',
+        # 所有请求来自同一 IP，且每个会话连续发送，不做限流
+        SESSION_RATE_LIMIT='0',
+        IP_RATE_LIMIT='0',
+        NO_PROXY='127.0.0.1,localhost',
+        no_proxy='127.0.0.1,localhost'
+    )
+
+    upstream = start_process([
+        sys.executable, '-m', 'benchmarks.fake_upstreams', '--port', str(upstream_port),
+        '--llm-latency', str(args.llm_latency), '--chunk-interval', str(args.chunk_interval),
+        '--translate-latency', str(args.translate_latency)
+    ], env)
+    if args.server == 'asgi':
+        command = [sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(server_port),
+                   '--log-level', 'warning']
+    else:
+        command = [sys.executable, '-c',
+                   f'from benchmarks.load import serve_flask; serve_flask({server_port})']
+    server = start_process(command, env)
+
+    try:
+        wait_ready(upstream_url + '/stats', upstream)
+        wait_ready(base_url + '/api/health', server)
+        results = asyncio.run(run_load(base_url, upstream_url, args, server.pid))
+    finally:
+        for process in (server, upstream):
+            process.terminate()
+            process.wait(timeout=10)
+
+    memory = results['session_memory']
+    print_table({name: results[name] for name in ('chat', 'chat_first_byte', 'translate')
+                 if name in results})
+    print(f"errors: chat={results['chat']['errors']} translate={results['translate']['errors']}")
+    print(f"upstream calls: {results['upstream_calls']}")
+    print(f"session memory: rss {memory['rss_bytes_per_session']} bytes/session, "
+          f"store estimate {memory['estimated_bytes_per_session']} bytes/session")
+
+    path = write_report('load', vars(args), results, args.output)
+    print(f"saved {path}")
+
+
+if __name__ == '__main__':
+    main()
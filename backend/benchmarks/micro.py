@@ -0,0 +1,131 @@
+"""
+微基准测试：请求路径上各个纯 CPU 环节的单次耗时
+
+- RAGSystem.search（keyword / bm25，多个知识库规模）
+- EmotionalCounselor.detect_emotion
+- sanitize_input
+- TranslationService.detect_language（短消息与长文本）
+- 每个会话占用的内存（tracemalloc 统计 MemorySessionStore）
+
+结果打印为表格，并保存为 JSON（默认 benchmarks/results/micro-<commit>.json），
+可用 benchmarks.compare 对比两次提交。
+
+用法：
+    python -m benchmarks.micro [--sizes 100 10000] [--queries 2000] [--output PATH]
+"""
+
+import argparse
+import random
+import time
+import tracemalloc
+
+from counselor import EmotionalCounselor
+from rag_system import RAGSystem
+from session_store import MemorySessionStore
+from translator import TranslationService
+from utils import sanitize_input
+from benchmarks.report import latency_summary, print_table, write_report
+from benchmarks.synthetic import make_knowledge_base, make_messages, make_queries, random_word
+
+
+def measure(fn, inputs, repeat=1):
+    """对每个输入调用 fn，返回每次调用的耗时（秒）"""
+    samples = []
+    perf_counter = time.perf_counter
+    for _ in range(repeat):
+        for item in inputs:
+            start = perf_counter()
+            fn(item)
+            samples.append(perf_counter() - start)
+    return samples
+
+
+def bench_rag(sizes, n_queries, results):
+    for n_topics in sizes:
+        knowledge_base = make_knowledge_base(n_topics)
+        queries = make_queries(knowledge_base, n_queries)
+        for engine in RAGSystem.ENGINES:
+            rag = RAGSystem(knowledge_base=knowledge_base, engine=engine)
+            rag.search(queries[0])
+            results[f'rag_search/{engine}/{n_topics}'] = latency_summary(
+                measure(rag.search, queries)
+            )
+
+
+def bench_messages(n_messages, results):
+    messages = make_messages(n_messages)
+    counselor = EmotionalCounselor(api_key=None)
+    results['detect_emotion'] = latency_summary(measure(counselor.detect_emotion, messages))
+
+    # 用户输入中常见的 HTML 特殊字符与多余空白
+    rng = random.Random(6)
+    raw = []
+    for message in messages:
+        cut = rng.randrange(len(message) + 1)
+        raw.append(message[:cut] + '  <b>&\n  ' + message[cut:])
+    results['sanitize_input'] = latency_summary(measure(sanitize_input, raw))
+
+    service = TranslationService()
+    results['detect_language/message'] = latency_summary(
+        measure(service.detect_language, messages)
+    )
+    long_texts = [''.join(messages[i:i + 2000]) for i in range(0, 20000, 2000)]
+    results['detect_language/long_text'] = latency_summary(
+        measure(service.detect_language, long_texts, repeat=10)
+    )
+
+
+def bench_session_memory(n_sessions, turns, results):
+    """每个会话保存 turns 轮对话时的实际内存占用"""
+    rng = random.Random(7)
+    user_messages = make_messages(200, seed=8)
+    replies = [''.join(random_word(rng) for _ in range(60)) for _ in range(50)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = MemorySessionStore(window=20, max_sessions=n_sessions * 2, max_bytes=1 << 40)
+    for i in range(n_sessions):
+        session_id = f'session-{i}'
+        for _ in range(turns):
+            # 每轮消息都是新的字符串对象，与真实请求一致
+            store.append_turn(session_id, rng.choice(user_messages) + ' ',
+                              rng.choice(replies) + ' ')
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    results['session_memory'] = {
+        'sessions': n_sessions,
+        'turns_per_session': turns,
+        'bytes_per_session': round(used / n_sessions),
+        'estimated_bytes_per_session': round(store.stats()['bytes'] / n_sessions)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000])
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--turns', type=int, default=10)
+    parser.add_argument('--output', help='结果 JSON 路径')
+    args = parser.parse_args()
+
+    results = {}
+    bench_rag(args.sizes, args.queries, results)
+    bench_messages(args.messages, results)
+    bench_session_memory(args.sessions, args.turns, results)
+
+    memory = results.pop('session_memory')
+    print_table(results)
+    print(f"session memory: {memory['bytes_per_session']} bytes/session "
+          f"({memory['turns_per_session']} turns, store estimate "
+          f"{memory['estimated_bytes_per_session']})")
+    results['session_memory'] = memory
+
+    path = write_report('micro', vars(args), results, args.output)
+    print(f"saved {path}")
+
+
+if __name__ == '__main__':
+    main()
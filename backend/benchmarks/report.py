@@ -0,0 +1,90 @@
+"""基准测试结果的统计与保存"""
+
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from typing import Dict, List, Optional
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    """最近秩百分位数，sorted_samples 需已排序"""
+    if not sorted_samples:
+        return 0.0
+    rank = max(math.ceil(q / 100 * len(sorted_samples)) - 1, 0)
+    return sorted_samples[rank]
+
+
+def latency_summary(samples: List[float], elapsed: Optional[float] = None) -> Dict:
+    """
+    汇总单次耗时样本（秒）
+
+    Args:
+        samples: 每次操作的耗时
+        elapsed: 整体墙钟时间，提供时据此计算吞吐量，否则按耗时之和计算
+
+    Returns:
+        dict: 次数、吞吐量（次/秒）与 mean / p50 / p95 / p99 / max（毫秒）
+    """
+    ordered = sorted(samples)
+    total = elapsed if elapsed is not None else sum(ordered)
+    return {
+        'count': len(ordered),
+        'throughput': round(len(ordered) / total, 2) if total > 0 else 0.0,
+        'mean_ms': round(sum(ordered) / len(ordered) * 1e3, 4) if ordered else 0.0,
+        'p50_ms': round(percentile(ordered, 50) * 1e3, 4),
+        'p95_ms': round(percentile(ordered, 95) * 1e3, 4),
+        'p99_ms': round(percentile(ordered, 99) * 1e3, 4),
+        'max_ms': round(ordered[-1] * 1e3, 4) if ordered else 0.0
+    }
+
+
+def git_commit() -> str:
+    """当前提交的短哈希，不在 git 仓库中时返回 'unknown'"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            check=True, cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def run_metadata() -> Dict:
+    """记录结果时附带的运行环境"""
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count()
+    }
+
+
+def write_report(suite: str, config: Dict, results: Dict, output: Optional[str] = None) -> str:
+    """
+    以 JSON 格式保存结果，默认保存到 benchmarks/results/<suite>-<commit>.json
+
+    Returns:
+        str: 结果文件路径
+    """
+    metadata = run_metadata()
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{suite}-{metadata['commit']}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'suite': suite, **metadata, 'config': config, 'results': results},
+                  f, ensure_ascii=False, indent=2)
+    return output
+
+
+def print_table(rows: Dict[str, Dict]) -> None:
+    """按名称打印吞吐量与延迟百分位"""
+    print(f"{'name':<32} {'count':>8} {'ops/s':>12} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}")
+    for name, row in rows.items():
+        print(f"{name:<32} {row['count']:>8} {row['throughput']:>12.1f} "
+              f"{row['p50_ms']:>10.3f} {row['p95_ms']:>10.3f} {row['p99_ms']:>10.3f}")
@@ -0,0 +1,62 @@
+"""合成的知识库与用户消息，用于基准测试"""
+
+import random
+
+from prompts import EMOTION_KEYWORDS, CRISIS_KEYWORDS, DEMO_INTENT_KEYWORDS
+
+# 常用汉字，用于拼出关键词和正文
+_CHARS = (
+    '的一是不了人我在有他这中大来上个国到说们为子和你地出道也时年得就那要下以生会自着去之过家学对可她里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老从动两长知民样现分将外但身些与高意进把法此实回二理美点月明其种声全工己话儿者向情部正名定女问力机给等几很业最间新什打便位因重被走电四第门相次东政海口使教西再平真听世气信北少关并内加化由却代军产入先山五太水万市眼体别处总才场师书比住员九笑性通目华报立马命张活难神数件安表原车白应路期叫死常提感金何更反合放做系计或司利受光王果亲界及今京务制解各任至清物台象记边共风战干接它许八特觉望直服毛林题建南度统色字请交爱让认算论百吃义科怎元社术结六功指思非流每青管夫连远资队跟带花快条院变联言权往展该领传近留红治决周保达办运武半候七必城父强步完革深区即求品士转量空甚众技轻程告江语英基派满式李息写呢识极令黄德收脸钱党倒未持取设始版双历越史商千片容研像找友孩站广改议形委早房音火际则首单亮'
+)
+
+
+def random_word(rng, min_len=2, max_len=4):
+    """随机生成一个由常用汉字组成的词"""
+    return ''.join(rng.choice(_CHARS) for _ in range(rng.randint(min_len, max_len)))
+
+
+def make_knowledge_base(n_topics, keywords_per_topic=5, content_words=60, seed=0):
+    """生成与 knowledge_base.json 结构相同的合成知识库"""
+    rng = random.Random(seed)
+    knowledge_base = {}
+    for i in range(n_topics):
+        keywords = [random_word(rng) for _ in range(keywords_per_topic)]
+        content = ''.join(random_word(rng) for _ in range(content_words))
+        knowledge_base[f'主题{i}'] = {
+            'keywords': keywords,
+            'content': content,
+            'examples': [
+                '问：' + ''.join(random_word(rng) for _ in range(8)),
+                '答：' + ''.join(random_word(rng) for _ in range(16))
+            ]
+        }
+    return knowledge_base
+
+
+def make_queries(knowledge_base, n_queries, words_per_query=12, hit_rate=0.5, seed=1):
+    """生成用户消息：部分消息嵌入知识库中的关键词"""
+    rng = random.Random(seed)
+    all_keywords = [k for data in knowledge_base.values() for k in data['keywords']]
+    queries = []
+    for _ in range(n_queries):
+        words = [random_word(rng) for _ in range(words_per_query)]
+        if all_keywords and rng.random() < hit_rate:
+            for _ in range(rng.randint(1, 3)):
+                words.insert(rng.randrange(len(words) + 1), rng.choice(all_keywords))
+        queries.append(''.join(words))
+    return queries
+
+
+def make_messages(n, seed=3):
+    """生成夹杂各类关键词的用户消息"""
+    rng = random.Random(seed)
+    vocabulary = [k for ks in EMOTION_KEYWORDS.values() for k in ks]
+    vocabulary += CRISIS_KEYWORDS
+    vocabulary += [k for ks in DEMO_INTENT_KEYWORDS.values() for k in ks]
+    messages = []
+    for _ in range(n):
+        words = [random_word(rng) for _ in range(rng.randint(5, 40))]
+        for _ in range(rng.randint(0, 3)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(vocabulary))
+        messages.append(''.join(words))
+    return messages
@@ -0,0 +1,264 @@
+"""
+基于中文字符二元组（bigram）的 BM25 检索
+
+中文没有空格分词，这里把连续的汉字切成重叠的二元组作为检索词，
+英文和数字则按整词处理。词项统计在建索引时预先计算为 NumPy 数组，
+查询时只需对命中词项的倒排表做向量化累加，再用 argpartition 取 top_k。
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 汉字（含扩展 A 区）连续片段，或英文/数字单词
+_TOKEN_RE = re.compile(r'[㐀-䶿一-鿿]+|[a-z0-9]+')
+_CJK_RE = re.compile(r'[㐀-䶿一-鿿]')
+
+_EMPTY_POSTINGS = (np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+
+
+def tokenize(text: str) -> List[str]:
+    """把文本切分为检索词：汉字取二元组，单个汉字保留为一元组，英文按整词"""
+    tokens = []
+    for run in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+class BM25Index:
+    """
+    BM25 倒排索引，倒排表按词项连续存储（CSR 格式）
+
+    增量更新时只重写变更文档所含词项的倒排表，放进一个覆盖层；删除的文档
+    留下空位，其余文档编号不变。覆盖层、空位或不再使用的词项过多时整体重建。
+    BM25 权重在第一次查询到某个词项时才计算并缓存，平均文档长度变化时不必重算全部权重。
+    每次更新都返回新的索引对象，旧对象保持不变，正在进行的查询不受影响。
+    """
+
+    # 覆盖层的倒排记录数、空位数或不再使用的词项数超过总量的这个比例时整体重建
+    COMPACT_RATIO = 0.125
+
+    def __init__(self, documents: Sequence[str] = (), k1: float = 1.5, b: float = 0.75):
+        """
+        Args:
+            documents: 待检索的文档文本，下标即文档编号
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        # 词项 -> 编号，增量更新时在多个版本的索引间共享，整体重建时去掉不再使用的词项
+        self.vocabulary: Dict[str, int] = {}
+        self._build([self._encode(text) for text in documents])
+
+    def _encode(self, text):
+        """把文档切分为 (词项编号数组, 词频数组)"""
+        counts = Counter(tokenize(text))
+        vocabulary = self.vocabulary
+        term_ids = np.fromiter(
+            (vocabulary.setdefault(term, len(vocabulary)) for term in counts),
+            dtype=np.int32, count=len(counts)
+        )
+        term_freqs = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return term_ids, term_freqs
+
+    def _build(self, doc_terms):
+        """由各文档的词项统计组装倒排数组（doc_terms 中没有空位）"""
+        self._doc_terms = doc_terms
+        self.n_slots = len(doc_terms)
+        # 之后新增的词项不属于本索引的 CSR 部分
+        self._n_terms = len(self.vocabulary)
+
+        if doc_terms:
+            term_ids = np.concatenate([ids for ids, _ in doc_terms])
+            term_freqs = np.concatenate([tfs for _, tfs in doc_terms])
+            doc_ids = np.repeat(
+                np.arange(self.n_slots, dtype=np.int32),
+                [len(ids) for ids, _ in doc_terms]
+            )
+        else:
+            term_ids = np.zeros(0, dtype=np.int32)
+            term_freqs = np.zeros(0, dtype=np.float32)
+            doc_ids = np.zeros(0, dtype=np.int32)
+        doc_lengths = np.bincount(doc_ids, weights=term_freqs, minlength=self.n_slots).astype(np.float32)
+
+        # 按词项排序，得到每个词项连续的倒排表
+        order = np.argsort(term_ids, kind='stable')
+        self._post_docs = doc_ids[order]
+        self._post_freqs = term_freqs[order]
+        doc_freqs = np.bincount(term_ids, minlength=self._n_terms)
+        self._term_ptr = np.zeros(self._n_terms + 1, dtype=np.int64)
+        np.cumsum(doc_freqs, out=self._term_ptr[1:])
+
+        # 词项编号 -> (文档编号数组, 词频数组)，覆盖 CSR 中的同一词项
+        self._overlay: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._overlay_size = 0
+        self._n_live_terms = int(np.count_nonzero(doc_freqs))
+        self._set_lengths(doc_lengths, self.n_slots)
+
+    def _set_lengths(self, doc_lengths, n_docs):
+        """记录文档长度并预先计算每个文档的长度归一化项"""
+        k1, b = self.k1, self.b
+        self._doc_lengths = doc_lengths
+        self.n_docs = n_docs
+        avg_length = float(doc_lengths.sum(dtype=np.float64)) / n_docs if n_docs else 0.0
+        self._norm = (k1 * (1 - b + b * doc_lengths / max(avg_length, 1e-9))).astype(np.float32)
+        # 词项编号 -> (文档编号数组, BM25 权重数组)，查询到该词项时计算，只属于本版本的索引
+        self._weights: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def _postings(self, term_id):
+        """词项的 (文档编号数组, 词频数组)"""
+        entry = self._overlay.get(term_id)
+        if entry is not None:
+            return entry
+        if term_id >= self._n_terms:
+            return _EMPTY_POSTINGS
+        start, end = self._term_ptr[term_id], self._term_ptr[term_id + 1]
+        return self._post_docs[start:end], self._post_freqs[start:end]
+
+    def updated(self, changes: Dict[int, Optional[str]]) -> 'BM25Index':
+        """
+        返回应用变更后的新索引，耗时与变更文档所含词项的倒排表长度成正比
+
+        Args:
+            changes: {文档编号: 新文本}，文本为 None 表示删除该文档；不小于 n_slots 的编号
+                是新增的文档，须从 n_slots 起连续编号
+
+        Returns:
+            新索引。整体重建时去掉空位，其余文档按原顺序重新连续编号，新索引的 n_slots
+            即为现存文档数
+        """
+        index = BM25Index.__new__(BM25Index)
+        index.k1 = self.k1
+        index.b = self.b
+        index.vocabulary = self.vocabulary
+
+        n_slots = max(self.n_slots, max(changes, default=-1) + 1)
+        doc_terms = self._doc_terms + [None] * (n_slots - self.n_slots)
+        doc_lengths = np.zeros(n_slots, dtype=np.float32)
+        doc_lengths[:self.n_slots] = self._doc_lengths
+        n_docs = self.n_docs
+
+        # 词项编号 -> 需要移除的文档编号 / 需要加入的 (文档编号, 词频)
+        removed: Dict[int, List[int]] = {}
+        added: Dict[int, List[Tuple[int, float]]] = {}
+        for doc_id, text in changes.items():
+            old_terms = doc_terms[doc_id]
+            if old_terms is not None:
+                n_docs -= 1
+                for term_id in old_terms[0].tolist():
+                    removed.setdefault(term_id, []).append(doc_id)
+            if text is None:
+                doc_terms[doc_id] = None
+                doc_lengths[doc_id] = 0
+                continue
+            term_ids, term_freqs = doc_terms[doc_id] = index._encode(text)
+            n_docs += 1
+            doc_lengths[doc_id] = term_freqs.sum()
+            for term_id, term_freq in zip(term_ids.tolist(), term_freqs.tolist()):
+                added.setdefault(term_id, []).append((doc_id, term_freq))
+
+        overlay = dict(self._overlay)
+        overlay_size = self._overlay_size
+        live_terms = self._n_live_terms
+        for term_id in removed.keys() | added.keys():
+            old_docs, old_freqs = docs, freqs = self._postings(term_id)
+            if term_id in removed:
+                keep = ~np.isin(docs, removed[term_id])
+                docs, freqs = docs[keep], freqs[keep]
+            if term_id in added:
+                new_docs, new_freqs = zip(*added[term_id])
+                docs = np.concatenate([docs, np.array(new_docs, dtype=np.int32)])
+                freqs = np.concatenate([freqs, np.array(new_freqs, dtype=np.float32)])
+            live_terms += bool(len(docs)) - bool(len(old_docs))
+            if term_id in self._overlay:
+                overlay_size -= len(old_docs)
+            overlay[term_id] = (docs, freqs)
+            overlay_size += len(docs)
+
+        index._doc_terms = doc_terms
+        index.n_slots = n_slots
+        if (overlay_size > len(self._post_docs) * self.COMPACT_RATIO
+                or n_slots - n_docs > n_slots * self.COMPACT_RATIO
+                or len(index.vocabulary) - live_terms > len(index.vocabulary) * self.COMPACT_RATIO):
+            index._compact()
+            return index
+
+        index._n_terms = self._n_terms
+        index._term_ptr = self._term_ptr
+        index._post_docs = self._post_docs
+        index._post_freqs = self._post_freqs
+        index._overlay = overlay
+        index._overlay_size = overlay_size
+        index._n_live_terms = live_terms
+        index._set_lengths(doc_lengths, n_docs)
+        return index
+
+    def _compact(self):
+        """整体重建：去掉空位与不再使用的词项，文档与词项按原顺序重新编号"""
+        doc_terms = [terms for terms in self._doc_terms if terms is not None]
+        used = np.zeros(len(self.vocabulary), dtype=bool)
+        if doc_terms:
+            used[np.concatenate([ids for ids, _ in doc_terms])] = True
+        new_ids = (np.cumsum(used) - 1).astype(np.int32)
+        # 使用新的词表对象，旧版本的索引仍使用原来的词表
+        self.vocabulary = {term: int(new_ids[term_id]) for term, term_id in self.vocabulary.items()
+                           if used[term_id]}
+        self._build([(new_ids[ids], tfs) for ids, tfs in doc_terms])
+
+    def search(self, query: str, top_k: int = 2) -> List[Tuple[int, float]]:
+        """
+        检索与查询最相关的文档
+
+        Args:
+            query: 查询文本
+            top_k: 返回前 k 个结果
+
+        Returns:
+            [(文档编号, 分数)]，按分数从高到低排列，同分按文档编号升序
+        """
+        if not self.n_docs or top_k <= 0:
+            return []
+
+        k1 = self.k1
+        n_docs = self.n_docs
+        scores = np.zeros(self.n_slots, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self.vocabulary.get(term)
+            if term_id is None:
+                continue
+            cached = self._weights.get(term_id)
+            if cached is None:
+                docs, freqs = self._postings(term_id)
+                idf = math.log1p((n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+                # idf * tf * (k1 + 1) / (tf + norm)，原地计算以减少临时数组
+                weights = self._norm[docs]
+                weights += freqs
+                np.divide(freqs, weights, out=weights)
+                weights *= idf * (k1 + 1)
+                cached = self._weights[term_id] = (docs, weights)
+            docs, weights = cached
+            # 同一词项的倒排表中文档编号互不相同，可以直接向量化累加
+            scores[docs] += weights
+
+        threshold = 0.0
+        if top_k < self.n_slots:
+            partitioned = np.argpartition(-scores, top_k - 1)[:top_k]
+            threshold = float(scores[partitioned].min())
+        # 取出所有不低于第 k 名分数的文档，保证同分时按文档顺序取舍
+        if threshold > 0:
+            candidates = np.flatnonzero(scores >= threshold)
+        else:
+            candidates = np.flatnonzero(scores > 0)
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))][:top_k]
+
+        return [(int(doc_id), float(scores[doc_id])) for doc_id in candidates]
@@ -0,0 +1,122 @@
+"""
+单次扫描的消息分类器
+
+把 prompts.py 中的情绪、危机、演示意图关键词编译进同一个 Aho–Corasick
+自动机，扫描一遍消息即可同时得到情绪、危机标记、演示意图和命中位置。
+优先级与逐表检查时一致：情绪与意图按字典中的先后顺序，先出现者优先。
+"""
+
+from typing import Dict, List, Optional, Tuple
+
+from keyword_index import KeywordAutomaton
+from prompts import EMOTION_KEYWORDS, CRISIS_KEYWORDS, DEMO_INTENT_KEYWORDS
+
+
+class Classification:
+    """一条消息的分类结果"""
+
+    __slots__ = ('emotion', 'crisis', 'intent', 'matches')
+
+    def __init__(self, emotion: str, crisis: bool, intent: Optional[str],
+                 matches: List[Tuple[int, int, str]]):
+        self.emotion = emotion
+        self.crisis = crisis
+        self.intent = intent
+        # [(起始位置, 结束位置, 关键词)]，按结束位置排列
+        self.matches = matches
+
+    def to_dict(self) -> Dict:
+        return {
+            'emotion': self.emotion,
+            'crisis': self.crisis,
+            'intent': self.intent,
+            'matches': self.matches
+        }
+
+
+class MessageClassifier:
+    """情绪 / 危机 / 演示意图分类器"""
+
+    def __init__(self, emotion_keywords: Dict[str, List[str]] = EMOTION_KEYWORDS,
+                 crisis_keywords: List[str] = CRISIS_KEYWORDS,
+                 intent_keywords: Dict[str, List[str]] = DEMO_INTENT_KEYWORDS):
+        """
+        Args:
+            emotion_keywords: {情绪: 关键词列表}，按优先级排列
+            crisis_keywords: 危机关键词列表
+            intent_keywords: {演示意图: 关键词列表}，按优先级排列
+        """
+        self._emotions = list(emotion_keywords)
+        self._intents = list(intent_keywords)
+
+        all_keywords = [k for keywords in emotion_keywords.values() for k in keywords]
+        all_keywords += list(crisis_keywords)
+        all_keywords += [k for keywords in intent_keywords.values() for k in keywords]
+        self._automaton = KeywordAutomaton(all_keywords)
+
+        # 每个关键词编号对应的情绪优先级、是否危机词、意图优先级
+        size = len(self._automaton)
+        self._emotion_rank: List[Optional[int]] = [None] * size
+        self._is_crisis = [False] * size
+        self._intent_rank: List[Optional[int]] = [None] * size
+
+        for rank, keywords in enumerate(emotion_keywords.values()):
+            for keyword in keywords:
+                self._set_rank(self._emotion_rank, keyword, rank)
+        for keyword in crisis_keywords:
+            keyword_id = self._automaton.keyword_id(keyword)
+            if keyword_id >= 0:
+                self._is_crisis[keyword_id] = True
+        for rank, keywords in enumerate(intent_keywords.values()):
+            for keyword in keywords:
+                self._set_rank(self._intent_rank, keyword, rank)
+
+    def _set_rank(self, ranks, keyword, rank):
+        """同一关键词出现在多个类别中时保留优先级最高的"""
+        keyword_id = self._automaton.keyword_id(keyword)
+        if keyword_id >= 0 and (ranks[keyword_id] is None or rank < ranks[keyword_id]):
+            ranks[keyword_id] = rank
+
+    def classify(self, message: str) -> Classification:
+        """
+        扫描一遍消息并分类
+
+        Args:
+            message: 用户消息
+
+        Returns:
+            Classification: 情绪（默认 'neutral'）、危机标记、演示意图（未命中为 None）和命中位置
+        """
+        text = message.lower()
+        keywords = self._automaton.keywords
+        emotion_ranks = self._emotion_rank
+        intent_ranks = self._intent_rank
+        is_crisis = self._is_crisis
+        emotion_rank = None
+        intent_rank = None
+        crisis = False
+        matches = []
+
+        for end, keyword_id in self._automaton.iter_matches(text):
+            keyword = keywords[keyword_id]
+            matches.append((end - len(keyword), end, keyword))
+
+            rank = emotion_ranks[keyword_id]
+            if rank is not None and (emotion_rank is None or rank < emotion_rank):
+                emotion_rank = rank
+            rank = intent_ranks[keyword_id]
+            if rank is not None and (intent_rank is None or rank < intent_rank):
+                intent_rank = rank
+            if is_crisis[keyword_id]:
+                crisis = True
+
+        return Classification(
+            emotion=self._emotions[emotion_rank] if emotion_rank is not None else 'neutral',
+            crisis=crisis,
+            intent=self._intents[intent_rank] if intent_rank is not None else None,
+            matches=matches
+        )
+
+
+# 启动时编译一次，供各模块共享
+default_classifier = MessageClassifier()
@@ -1,47 +1,162 @@
 import os
+import time
 import openai
-from prompts import SYSTEM_PROMPT, EMOTION_KEYWORDS
-from rag_system import RAGSystem
+import http_pool
+from llm_client import LLMClient, LLMTimeout, CircuitOpenError
+from admission import Overloaded, unlimited
+from contextlib import nullcontext
+from metrics import REPLIES, FALLBACKS, TOKENS, STAGE_SECONDS, stage
+from logger import log
+from prompts import DEMO_RESPONSES, SUMMARY_PROMPT
+from prompt_builder import PromptBuilder
+from classifier import default_classifier
+from rag_system import RetrievalContext, create_rag_system
 import re
 
 class EmotionalCounselor:
     """恋爱情绪咨询 AI 核心类"""
     
-    def __init__(self, api_key, model="deepseek-chat"):
+    # 采样参数（流式与非流式共用）
+    COMPLETION_PARAMS = {
+        'temperature': 0.7,
+        'max_tokens': 500,
+        'top_p': 0.9,
+        'frequency_penalty': 0.3,
+        'presence_penalty': 0.3,
+    }
+    
+    # 每次请求携带的历史消息条数
+    HISTORY_MESSAGES = 10
+    
+    # 演示模式流式输出时每个分片的字符数
+    DEMO_STREAM_CHUNK_SIZE = 8
+    
+    def __init__(self, api_key, model="deepseek-chat", api_base="https://api.deepseek.com/v1",
+                 response_cache=None, prompt_builder=None, llm_client=None,
+                 limiter=None, overload_fallback=True):
         self.api_key = api_key
         self.model = model
+        self.api_base = api_base
+        
+        # 首轮问题的回复缓存（None 表示不缓存）
+        self.response_cache = response_cache
+        
+        # 按 token 预算组装请求，系统提示词前缀保持不变
+        self.prompt_builder = prompt_builder or PromptBuilder()
+        
+        # 带截止时间与熔断器的模型调用层
+        self.llm = llm_client or LLMClient()
+        
+        # 模型调用并发限制（None 表示不限制）；排队失败时降级到演示模式，
+        # overload_fallback=False 时抛出 Overloaded 由接口返回 429
+        self.limiter = limiter
+        self.overload_fallback = overload_fallback
         openai.api_key = api_key
         
-        # 配置 DeepSeek API
-        openai.api_base = "https://api.deepseek.com/v1"
+        # 配置 DeepSeek API（可指向本地的模拟服务用于测试）
+        openai.api_base = api_base
         
         # 初始化 RAG 系统
-        self.rag = RAGSystem()
+        self.rag = create_rag_system()
+        
+        # 情绪 / 危机 / 演示意图分类器（单次扫描）
+        self.classifier = default_classifier
         
-        if api_key and api_key != "your_openai_api_key_here":
-            print(f"✅ API Key configured: {api_key[:20]}...")
-            print(f"✅ Using model: {model}")
+        if not self.demo_mode:
+            log.info('llm_configured', model=model, api_base=api_base)
         else:
-            print("⚠️ 未配置 API Key，将使用演示模式")
+            log.warning('demo_mode', reason='no_api_key')
+    
+    @property
+    def demo_mode(self):
+        """是否处于演示模式（未配置 API Key）"""
+        return not self.api_key or self.api_key == "your_openai_api_key_here"
+    
+    def classify(self, message):
+        """扫描一遍消息，得到情绪、危机标记与演示意图"""
+        with stage('classify'):
+            return self.classifier.classify(message)
     
     def detect_emotion(self, message):
         """检测用户情绪"""
-        message_lower = message.lower()
+        return self.classify(message).emotion
+    
+    def _build_prompt(self, user_message, conversation_history, summary='', retrieval=None):
+        """结合 RAG 检索结果、对话摘要与历史，按 token 预算组装请求"""
+        # 使用 RAG 检索相关知识（结合会话中此前几轮命中的主题）
+        rag_results = self.rag.search(user_message, top_k=2, context=retrieval)
         
-        for emotion, keywords in EMOTION_KEYWORDS.items():
-            for keyword in keywords:
-                if keyword in message_lower:
-                    return emotion
+        if rag_results:
+            log.debug('rag_hit', results=len(rag_results))
         
-        return 'neutral'
+        with stage('prompt_build'):
+            return self.prompt_builder.build(
+                user_message,
+                conversation_history[-self.HISTORY_MESSAGES:],
+                rag_results,
+                summary=summary
+            )
+    
+    def _cache_key(self, user_message, prompt):
+        """计算回复缓存键，不可缓存时返回 None"""
+        # 带摘要的长对话不缓存
+        if self.response_cache is None or prompt.summary:
+            return None
+        return self.response_cache.make_key(
+            user_message,
+            prompt.topics,
+            prompt.history,
+            self.model,
+            self.COMPLETION_PARAMS
+        )
+    
+    def _cached_response(self, cache_key, emotion, prompt):
+        """从缓存中取回复，未命中返回 None"""
+        if cache_key is None:
+            return None
+        return self._cache_hit(self.response_cache.get(cache_key), emotion, prompt)
+    
+    async def _acached_response(self, cache_key, emotion, prompt):
+        """从缓存中取回复（异步版本，磁盘层不阻塞事件循环），未命中返回 None"""
+        if cache_key is None:
+            return None
+        return self._cache_hit(await self.response_cache.aget(cache_key), emotion, prompt)
+    
+    def _cache_hit(self, cached, emotion, prompt):
+        """缓存中的回复转为返回格式"""
+        if cached is None:
+            return None
+        log.debug('response_cache_hit')
+        REPLIES.labels('cached').inc()
+        return {
+            'message': cached['message'],
+            'emotion': emotion,
+            'prompt_tokens': prompt.prompt_tokens,
+            'tokens_used': 0,
+            'topics': prompt.topics,
+            'cached': True
+        }
+    
+    def _store_response(self, cache_key, message):
+        """缓存模型生成的回复"""
+        if cache_key is not None and message:
+            self.response_cache.set(cache_key, {'message': message})
+    
+    async def _astore_response(self, cache_key, message):
+        """缓存模型生成的回复（异步版本）"""
+        if cache_key is not None and message:
+            await self.response_cache.aset(cache_key, {'message': message})
     
-    def get_response(self, user_message, conversation_history=None):
+    def get_response(self, user_message, conversation_history=None, summary='',
+                     retrieval=None):
         """
         获取 AI 回复
         
         Args:
             user_message: 用户消息
-            conversation_history: 对话历史
+            conversation_history: 对话历史（不含已折叠进摘要的消息）
+            summary: 此前对话的摘要
+            retrieval: 会话的检索上下文（RetrievalContext），检索后原地更新
             
         Returns:
             dict: 包含回复消息和情绪分析
@@ -50,198 +165,388 @@ class EmotionalCounselor:
             conversation_history = []
         
         # 检测情绪
-        detected_emotion = self.detect_emotion(user_message)
+        classification = self.classify(user_message)
+        detected_emotion = classification.emotion
         
         # 如果没有 API Key，使用演示模式
-        if not self.api_key or self.api_key == "your_openai_api_key_here":
-            print("💡 使用演示模式回复")
-            return self._get_demo_response(user_message, detected_emotion)
+        if self.demo_mode:
+            log.debug('demo_reply', reason='no_api_key')
+            return self._get_demo_response(classification, 'no_api_key')
         
-        # 使用 RAG 检索相关知识
-        rag_results = self.rag.search(user_message, top_k=2)
-        rag_context = self.rag.format_context(rag_results)
+        prompt = self._build_prompt(user_message, conversation_history, summary, retrieval)
         
-        if rag_context:
-            print(f"💡 找到 {len(rag_results)} 条相关知识")
+        cache_key = self._cache_key(user_message, prompt)
+        cached = self._cached_response(cache_key, detected_emotion, prompt)
+        if cached:
+            return cached
         
-        # 构建增强后的系统提示词
-        enhanced_prompt = SYSTEM_PROMPT
-        if rag_context:
-            enhanced_prompt += f"\n\n{rag_context}\n请基于以上专业知识，结合用户的具体情况给出建议。"
+        try:
+            # 调用 DeepSeek API，并发已满时排队
+            with self._llm_slot(), stage('llm'):
+                response = self.llm.complete(
+                    model=self.model,
+                    messages=prompt.messages,
+                    **self.COMPLETION_PARAMS
+                )
+            
+            ai_message = response.choices[0].message.content.strip()
+            self._store_response(cache_key, ai_message)
+            self._record_usage(response.usage)
+            
+            return {
+                'message': ai_message,
+                'emotion': detected_emotion,
+                'prompt_tokens': response.usage.prompt_tokens,
+                'tokens_used': response.usage.total_tokens,
+                'topics': prompt.topics
+            }
+            
+        except Exception as e:
+            # API 失败或熔断时自动降级到演示模式
+            return self._get_demo_response(classification, self._fallback_reason(e))
+    
+    def stream_response(self, user_message, conversation_history=None, summary='',
+                        retrieval=None):
+        """
+        以流式方式获取 AI 回复
         
-        # 构建消息
-        messages = [
-            {"role": "system", "content": enhanced_prompt}
-        ]
+        Args:
+            user_message: 用户消息
+            conversation_history: 对话历史（不含已折叠进摘要的消息）
+            summary: 此前对话的摘要
+            retrieval: 会话的检索上下文（RetrievalContext），检索后原地更新
+            
+        Yields:
+            tuple: (事件类型, 数据)，依次为 'meta'、若干 'delta' 和最终的 'done'
+        """
+        if conversation_history is None:
+            conversation_history = []
         
-        # 添加历史对话（最近10轮）
-        messages.extend(conversation_history[-10:])
+        # 检测情绪
+        classification = self.classify(user_message)
+        detected_emotion = classification.emotion
+        yield 'meta', {'emotion': detected_emotion}
         
-        # 添加当前用户消息
-        messages.append({"role": "user", "content": user_message})
+        if self.demo_mode:
+            log.debug('demo_reply', reason='no_api_key')
+            yield from self._stream_demo_response(classification, 'no_api_key')
+            return
         
+        prompt = self._build_prompt(user_message, conversation_history, summary, retrieval)
+        
+        cache_key = self._cache_key(user_message, prompt)
+        cached = self._cached_response(cache_key, detected_emotion, prompt)
+        if cached:
+            yield from self._stream_text(cached)
+            return
+        
+        parts = []
+        usage = None
+        failed_midway = False
         try:
-            # 调用 DeepSeek API
-            response = openai.ChatCompletion.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500,
-                top_p=0.9,
-                frequency_penalty=0.3,
-                presence_penalty=0.3
-            )
+            # 调用 DeepSeek API（流式），并发已满时排队
+            with self._llm_slot():
+                start = time.perf_counter()
+                chunks = self.llm.stream(
+                    model=self.model,
+                    messages=prompt.messages,
+                    stream_options={'include_usage': True},
+                    **self.COMPLETION_PARAMS
+                )
+                
+                for chunk in chunks:
+                    # 最后一个分片只携带本次请求的 token 用量
+                    if chunk.get('usage'):
+                        usage = chunk['usage']
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.get('content')
+                    if content:
+                        if not parts:
+                            STAGE_SECONDS.labels('llm_first_token').observe(time.perf_counter() - start)
+                        parts.append(content)
+                        yield 'delta', {'content': content}
+            
+        except Exception as e:
+            if not parts:
+                # 尚未输出任何内容时降级到演示模式
+                yield from self._stream_demo_response(classification, self._fallback_reason(e))
+                return
+            # 已输出部分内容，结束本次回复且不写入缓存
+            log.warning('llm_stream_interrupted', error=str(e))
+            failed_midway = True
+        
+        ai_message = ''.join(parts).strip()
+        if not failed_midway:
+            STAGE_SECONDS.labels('llm_stream').observe(time.perf_counter() - start)
+            self._store_response(cache_key, ai_message)
+        self._record_usage(usage)
+        
+        yield 'done', {
+            'message': ai_message,
+            'emotion': detected_emotion,
+            'prompt_tokens': usage['prompt_tokens'] if usage else prompt.prompt_tokens,
+            'tokens_used': usage['total_tokens'] if usage else 0,
+            'topics': prompt.topics
+        }
+    
+    async def aget_response(self, user_message, conversation_history=None, summary='',
+                            retrieval=None):
+        """
+        获取 AI 回复（异步版本，用于 ASGI 服务）
+        
+        等待模型返回期间不占用工作线程，HTTP 连接来自共享连接池。
+        
+        Args:
+            user_message: 用户消息
+            conversation_history: 对话历史（不含已折叠进摘要的消息）
+            summary: 此前对话的摘要
+            retrieval: 会话的检索上下文（RetrievalContext），检索后原地更新
+            
+        Returns:
+            dict: 包含回复消息和情绪分析
+        """
+        if conversation_history is None:
+            conversation_history = []
+        
+        # 检测情绪
+        classification = self.classify(user_message)
+        detected_emotion = classification.emotion
+        
+        # 如果没有 API Key，使用演示模式
+        if self.demo_mode:
+            log.debug('demo_reply', reason='no_api_key')
+            return self._get_demo_response(classification, 'no_api_key')
+        
+        prompt = self._build_prompt(user_message, conversation_history, summary, retrieval)
+        
+        cache_key = self._cache_key(user_message, prompt)
+        cached = await self._acached_response(cache_key, detected_emotion, prompt)
+        if cached:
+            return cached
+        
+        token = openai.aiosession.set(http_pool.get_session())
+        try:
+            # 调用 DeepSeek API，并发已满时排队
+            async with self._allm_slot():
+                with stage('llm'):
+                    response = await self.llm.acomplete(
+                        model=self.model,
+                        messages=prompt.messages,
+                        **self.COMPLETION_PARAMS
+                    )
             
             ai_message = response.choices[0].message.content.strip()
+            await self._astore_response(cache_key, ai_message)
+            self._record_usage(response.usage)
             
             return {
                 'message': ai_message,
                 'emotion': detected_emotion,
-                'tokens_used': response.usage.total_tokens
+                'prompt_tokens': response.usage.prompt_tokens,
+                'tokens_used': response.usage.total_tokens,
+                'topics': prompt.topics
             }
             
         except Exception as e:
-            print(f"⚠️ DeepSeek API Error: {str(e)}")
-            print("💡 自动降级到演示模式")
-            # API 失败时自动降级到演示模式
-            return self._get_demo_response(user_message, detected_emotion)
-    
-    def _get_demo_response(self, user_message, emotion):
-        """演示模式的智能回复"""
-        message_lower = user_message.lower()
-        
-        # 根据关键词匹配回复
-        if any(word in message_lower for word in ['表白', '喜欢', '告白', '追', '心动', '暗恋']):
-            response = """我理解你现在的心情 💙 喜欢一个人是美好的，同时也会让人感到紧张和不知所措。
-
-关于表白，我想给你一些建议：
-
-1️⃣ **了解对方的感受**：在表白前，可以先观察对方对你的态度，是否也对你有好感的信号。
-
-2️⃣ **选择合适的时机**：找一个轻松、私密的环境，让对方感到舒适和尊重。
-
-3️⃣ **真诚地表达**：不需要华丽的辞藻，真诚地说出你的感受就好，比如"我很喜欢和你在一起的时光，你愿意给我一个机会吗？"
-
-4️⃣ **做好心理准备**：无论结果如何，都要尊重对方的选择。如果对方暂时没有准备好，也不要气馁。
-
-记住，表白的勇气本身就很珍贵 🌸 你想聊聊具体的情况吗？"""
+            # API 失败或熔断时自动降级到演示模式
+            return self._get_demo_response(classification, self._fallback_reason(e))
+        finally:
+            openai.aiosession.reset(token)
+    
+    async def astream_response(self, user_message, conversation_history=None, summary='',
+                               retrieval=None):
+        """
+        以流式方式获取 AI 回复（异步版本）
         
-        elif any(word in message_lower for word in ['吵架', '争吵', '矛盾', '冷战', '不理我', '生气']):
-            response = """我能感受到你现在的难过和焦虑 💙 情侣之间的争执是很常见的，但确实会让人感到不安。
-
-让我们一起来分析和解决：
-
-1️⃣ **冷静下来**：给彼此一些时间和空间冷静，避免情绪化的进一步冲突。
-
-2️⃣ **主动沟通**：等情绪平复后，可以主动找她聊聊。可以说"我们能谈谈吗？我想解决我们之间的问题。"
-
-3️⃣ **倾听对方**：认真听她的感受和想法，不要急于辩解。让她知道你在意她的感受。
-
-4️⃣ **诚恳道歉**：如果确实是你的错，真诚地道歉。如果是误会，耐心解释。
-
-5️⃣ **寻找解决方案**：一起讨论如何避免类似的问题再次发生。
-
-关系中的冲突不可怕，关键是如何处理 🌸 你想聊聊具体发生了什么吗？"""
+        事件格式与 stream_response 相同。
+        """
+        if conversation_history is None:
+            conversation_history = []
         
-        elif any(word in message_lower for word in ['分手', '失恋', '分开', '走不出', '放不下', '忘不了']):
-            response = """我真的很理解你现在的痛苦 💙 失恋是人生中最难熬的经历之一，你的感受完全正常。
-
-请记住这些：
-
-1️⃣ **允许自己悲伤**：不要压抑情绪，哭出来、找朋友倾诉都可以。这是疗愈的必经过程。
-
-2️⃣ **给自己时间**：走出失恋需要时间，不要急于强迫自己"放下"，慢慢来就好。
-
-3️⃣ **照顾好自己**：保持规律作息，做一些让自己开心的事情，比如运动、旅行、学习新技能。
-
-4️⃣ **减少联系**：暂时不要频繁查看对方的社交媒体，给自己空间去疗愈。
-
-5️⃣ **成长和反思**：这段经历会让你更了解自己，也会让未来的你更成熟。
-
-你不是一个人在战斗，我陪着你 🌸 想聊聊你的感受吗？"""
+        # 检测情绪
+        classification = self.classify(user_message)
+        detected_emotion = classification.emotion
+        yield 'meta', {'emotion': detected_emotion}
         
-        elif any(word in message_lower for word in ['异地', '异地恋', '见不到', '距离', '想念']):
-            response = """异地恋确实不容易 💙 距离会带来很多挑战，但也能考验和加深感情。
-
-一些维持异地恋的建议：
-
-1️⃣ **保持沟通**：定期视频通话，分享日常的点滴，让对方参与你的生活。
-
-2️⃣ **制定见面计划**：有明确的见面时间，会让等待更有盼头。
-
-3️⃣ **培养共同爱好**：可以一起看同一部剧、玩游戏，创造共同话题。
-
-4️⃣ **相互信任**：信任是异地恋的基石，给彼此足够的安全感。
-
-5️⃣ **规划未来**：聊聊你们对未来的规划，让彼此知道这份坚持是有方向的。
-
-如果真的觉得太累，也可以重新评估这段关系是否适合继续 🌸 你最近遇到什么困难了吗？"""
+        if self.demo_mode:
+            log.debug('demo_reply', reason='no_api_key')
+            for event in self._stream_demo_response(classification, 'no_api_key'):
+                yield event
+            return
         
-        elif any(word in message_lower for word in ['困惑', '不知道', '迷茫', '纠结', '矛盾', '犹豫']):
-            response = """我能感受到你的迷茫 💭 感情中的困惑是很正常的，说明你在认真思考这段关系。
-
-让我们一起梳理：
-
-1️⃣ **明确你的感受**：你现在最困扰你的是什么？是对对方的感情不确定，还是关系的方向不清晰？
-
-2️⃣ **倾听内心**：问问自己，这段关系让你快乐多还是焦虑多？你期待的是什么？
-
-3️⃣ **沟通很重要**：可以和对方聊聊你的感受和困惑，听听对方的想法。
-
-4️⃣ **给自己时间**：不要急于做决定，可以再观察一段时间。
-
-有时候，把困惑说出来，答案就会慢慢清晰 🌸 你能具体说说你在纠结什么吗？"""
+        prompt = self._build_prompt(user_message, conversation_history, summary, retrieval)
         
-        elif any(word in message_lower for word in ['父母', '家人', '反对', '门当户对', '家庭']):
-            response = """我理解你面对的压力 💙 来自家人的反对确实会让人感到为难。
-
-一些应对建议：
-
-1️⃣ **理解父母的担心**：他们的反对往往出于对你的关心，试着理解他们的顾虑。
-
-2️⃣ **展示你们的感情**：用行动证明你们的感情是认真的，让家人看到对方的优点。
-
-3️⃣ **耐心沟通**：找合适的时机和父母深入交流，表达你的想法和决心。
-
-4️⃣ **寻求支持**：可以请亲戚朋友帮忙说服，或者让对方主动表现。
-
-5️⃣ **理性评估**：同时也要客观看待父母的意见，有些担忧可能确实值得考虑。
-
-感情和家庭都重要，需要找到平衡点 🌸 具体是什么让家人反对呢？"""
+        cache_key = self._cache_key(user_message, prompt)
+        cached = await self._acached_response(cache_key, detected_emotion, prompt)
+        if cached:
+            for event in self._stream_text(cached):
+                yield event
+            return
         
-        elif any(word in message_lower for word in ['第一次', '初恋', '经验', '不懂']):
-            response = """初恋是很美好的经历 💕 没有经验是完全正常的，每个人都是从第一次开始的。
-
-给你一些建议：
-
-1️⃣ **自然相处**：不要过度紧张，保持自己的真实，自然的相处最舒服。
-
-2️⃣ **尊重对方**：注意对方的感受和边界，相互尊重是基础。
-
-3️⃣ **多交流**：有什么想法和感受可以大方说出来，良好的沟通很重要。
-
-4️⃣ **学习成长**：可以多观察、多学习，但不要刻意模仿别人。
-
-5️⃣ **享受过程**：恋爱是美好的体验，放松心情，享受这个过程。
-
-初恋的青涩和美好就在于它的纯真 🌸 有什么具体的困惑吗？"""
+        parts = []
+        usage = None
+        error = None
+        failed_midway = False
+        token = openai.aiosession.set(http_pool.get_session())
+        try:
+            # 调用 DeepSeek API（流式），并发已满时排队
+            async with self._allm_slot():
+                start = time.perf_counter()
+                chunks = self.llm.astream(
+                    model=self.model,
+                    messages=prompt.messages,
+                    stream_options={'include_usage': True},
+                    **self.COMPLETION_PARAMS
+                )
+                
+                async for chunk in chunks:
+                    # 最后一个分片只携带本次请求的 token 用量
+                    if chunk.get('usage'):
+                        usage = chunk['usage']
+                    if not chunk.choices:
+                        continue
+                    content = chunk.choices[0].delta.get('content')
+                    if content:
+                        if not parts:
+                            STAGE_SECONDS.labels('llm_first_token').observe(time.perf_counter() - start)
+                        parts.append(content)
+                        yield 'delta', {'content': content}
+            
+        except Exception as e:
+            if parts:
+                log.warning('llm_stream_interrupted', error=str(e))
+                failed_midway = True
+            else:
+                error = e
+        finally:
+            openai.aiosession.reset(token)
         
-        else:
-            # 默认回复
-            response = f"""你好呀，我是心语 💙
-
-我听到你的声音了。无论你现在面对什么样的感情困扰，请记住：
-
-✨ **你的感受是重要的**：不要忽视自己的情绪，它们在告诉你一些重要的信息。
-
-💭 **沟通是关键**：很多问题都可以通过坦诚的沟通来解决。
-
-🌸 **爱自己很重要**：无论是否在恋爱中，首先要学会爱自己、照顾好自己。
-
-你能更具体地说说你的情况吗？我会根据你的情况给出更具体的建议 🌟"""
+        if error is not None:
+            # 尚未输出任何内容时降级到演示模式
+            for event in self._stream_demo_response(classification, self._fallback_reason(error)):
+                yield event
+            return
+        
+        ai_message = ''.join(parts).strip()
+        if not failed_midway:
+            STAGE_SECONDS.labels('llm_stream').observe(time.perf_counter() - start)
+            await self._astore_response(cache_key, ai_message)
+        self._record_usage(usage)
+        
+        yield 'done', {
+            'message': ai_message,
+            'emotion': detected_emotion,
+            'prompt_tokens': usage['prompt_tokens'] if usage else prompt.prompt_tokens,
+            'tokens_used': usage['total_tokens'] if usage else 0,
+            'topics': prompt.topics
+        }
+    
+    async def areplay(self, user_messages, history=None, retrieval=None):
+        """
+        依次回放一段多轮对话（批量评测用），不读写会话存储
+        
+        Args:
+            user_messages: 待回放的用户消息，按顺序逐轮请求
+            history: 此前已回放部分的对话历史（中断后续跑时传入）
+            retrieval: 此前已回放部分的检索上下文（RetrievalContext），每轮检索后原地更新
+            
+        Yields:
+            dict: 每轮的回复，格式同 aget_response，另含本轮耗时 latency_ms
+        """
+        history = list(history or [])
+        if retrieval is None:
+            retrieval = RetrievalContext()
+        for user_message in user_messages:
+            start = time.perf_counter()
+            response = await self.aget_response(user_message, history, retrieval=retrieval)
+            response['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            
+            history.append({'role': 'user', 'content': user_message})
+            history.append({'role': 'assistant', 'content': response['message']})
+            del history[:-self.HISTORY_MESSAGES]
+            yield response
+    
+    def summarize(self, previous_summary, messages):
+        """
+        把已有摘要与较早的对话压缩为新摘要（供 ConversationSummarizer 在后台调用）
+        
+        Args:
+            previous_summary: 已有摘要，可为空字符串
+            messages: 待折叠的对话消息
+            
+        Returns:
+            str: 新摘要
+        """
+        lines = []
+        if previous_summary:
+            lines.append(f"已有摘要：{previous_summary}")
+        for message in messages:
+            speaker = '用户' if message['role'] == 'user' else '咨询师'
+            lines.append(f"{speaker}：{message['content']}")
         
+        response = self.llm.complete(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": '\n'.join(lines)}
+            ],
+            temperature=0.3,
+            max_tokens=300
+        )
+        return response.choices[0].message.content.strip()
+    
+    def _llm_slot(self):
+        """占用一个模型调用名额；熔断中时直接抛出 CircuitOpenError，不排队"""
+        self.llm.check()
+        return self.limiter.slot() if self.limiter else nullcontext()
+    
+    def _allm_slot(self):
+        """占用一个模型调用名额（异步版本）"""
+        self.llm.check()
+        return self.limiter.aslot() if self.limiter else unlimited()
+    
+    def _fallback_reason(self, error):
+        """输出调用失败的原因，返回降级原因标签；排队失败且不降级时重新抛出"""
+        if isinstance(error, Overloaded):
+            if not self.overload_fallback:
+                raise error
+            log.info('llm_fallback', reason='overloaded')
+            return 'overloaded'
+        if isinstance(error, CircuitOpenError):
+            log.info('llm_fallback', reason='circuit_open')
+            return 'circuit_open'
+        reason = 'timeout' if isinstance(error, LLMTimeout) else 'api_error'
+        log.warning('llm_fallback', reason=reason, error=str(error))
+        return reason
+    
+    def _record_usage(self, usage):
+        """记录一次模型回复及其 token 用量"""
+        REPLIES.labels('llm').inc()
+        if usage:
+            TOKENS.labels('prompt').inc(usage['prompt_tokens'])
+            TOKENS.labels('completion').inc(usage['total_tokens'] - usage['prompt_tokens'])
+    
+    def _stream_demo_response(self, classification, reason):
+        """将演示模式回复切分为小片段流式输出"""
+        return self._stream_text(self._get_demo_response(classification, reason))
+    
+    def _stream_text(self, response):
+        """将已生成好的回复切分为小片段流式输出"""
+        text = response['message']
+        size = self.DEMO_STREAM_CHUNK_SIZE
+        
+        for i in range(0, len(text), size):
+            yield 'delta', {'content': text[i:i + size]}
+        
+        yield 'done', response
+    
+    def _get_demo_response(self, classification, reason):
+        """演示模式的智能回复：按分类得到的意图选择回复模板，reason 为降级原因"""
+        FALLBACKS.labels(reason).inc()
+        REPLIES.labels('demo').inc()
         return {
-            'message': response,
-            'emotion': emotion,
+            'message': DEMO_RESPONSES[classification.intent or 'default'],
+            'emotion': classification.emotion,
             'mode': 'demo'
-        }
\ No newline at end of file
+        }
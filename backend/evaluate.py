@@ -0,0 +1,202 @@
+"""
+批量回放对话（离线评测）
+
+读取 JSONL 格式的多轮对话，以指定并发数回放：不同对话并发进行，同一对话
+的各轮按顺序请求。每轮结果写入一行 JSONL，包含回复、情绪、检索到的知识
+主题、token 用量与耗时。中断后以相同参数再次运行会跳过已完成的轮次，从
+未完成对话的下一轮继续（对话历史与检索上下文由已写入的结果还原）。
+
+输入每行一段对话：
+    {"id": "conv-1", "turns": ["我和男朋友吵架了", "他说我太敏感"]}
+也可以使用 OpenAI 格式的 "messages"，只回放其中 role 为 user 的消息。缺少 id
+时以行号作为 id。
+
+用法：
+    python evaluate.py conversations.jsonl -o results.jsonl [--concurrency 16] [--response-cache]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+from dotenv import load_dotenv
+
+import http_pool
+from counselor import EmotionalCounselor
+from llm_client import create_llm_client
+from prompt_builder import create_prompt_builder
+from rag_system import RetrievalContext
+from response_cache import create_response_cache
+from utils import sanitize_input
+
+
+def load_conversations(path):
+    """读取对话文件，返回 [(id, [用户消息, ...]), ...]"""
+    conversations = []
+    seen = set()
+    with open(path, encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            if 'turns' in data:
+                turns = data['turns']
+            else:
+                turns = [m['content'] for m in data.get('messages', []) if m.get('role') == 'user']
+            conversation_id = str(data.get('id', f'line-{line_number}'))
+            if conversation_id in seen:
+                raise ValueError(f"第 {line_number} 行：对话 id 重复：{conversation_id}")
+            seen.add(conversation_id)
+            conversations.append((conversation_id, [sanitize_input(turn) for turn in turns]))
+    return conversations
+
+
+def load_progress(path):
+    """
+    读取已有的结果文件，返回 {对话 id: [按轮次排列的结果]}
+
+    中断时可能留下写了一半的最后一行，将其截掉以便继续追加。
+    """
+    progress = {}
+    if not os.path.exists(path):
+        return progress
+
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b'\n') + 1
+        if end < len(data):
+            f.truncate(end)
+
+    for line in data[:end].decode('utf-8').splitlines():
+        if line.strip():
+            record = json.loads(line)
+            progress.setdefault(record['id'], []).append(record)
+    for records in progress.values():
+        records.sort(key=lambda record: record['turn'])
+    return progress
+
+
+def restore_history(records):
+    """由已完成轮次的结果还原对话历史"""
+    history = []
+    for record in records:
+        history.append({'role': 'user', 'content': record['message']})
+        history.append({'role': 'assistant', 'content': record['reply']})
+    return history
+
+
+def restore_retrieval(records):
+    """由最后一个已完成轮次的结果还原检索上下文（旧版本的结果中没有时从头开始）"""
+    return RetrievalContext.from_state(records[-1].get('retrieval') if records else None)
+
+
+async def replay_all(counselor, conversations, progress, output, concurrency):
+    """并发回放全部对话，返回本次新完成的轮数"""
+    queue = asyncio.Queue()
+    for conversation in conversations:
+        queue.put_nowait(conversation)
+    completed = 0
+
+    async def replay_conversation(conversation_id, turns, done):
+        nonlocal completed
+        turn = len(done)
+        retrieval = restore_retrieval(done)
+        async for response in counselor.areplay(turns[turn:], restore_history(done), retrieval):
+            record = {
+                'id': conversation_id,
+                'turn': turn,
+                'message': turns[turn],
+                'reply': response['message'],
+                'emotion': response.get('emotion', 'neutral'),
+                'topics': response.get('topics', []),
+                'prompt_tokens': response.get('prompt_tokens', 0),
+                'tokens_used': response.get('tokens_used', 0),
+                'cached': response.get('cached', False),
+                'mode': response.get('mode', 'llm'),
+                'latency_ms': response['latency_ms'],
+                # 本轮检索后的上下文，续跑时由此还原
+                'retrieval': retrieval.to_state()
+            }
+            # 每轮写完立即落盘，中断后可以续跑
+            output.write(json.dumps(record, ensure_ascii=False) + '\n')
+            output.flush()
+            completed += 1
+            turn += 1
+
+    async def worker():
+        while not queue.empty():
+            conversation_id, turns = queue.get_nowait()
+            done = progress.get(conversation_id, [])
+            if len(done) >= len(turns):
+                continue
+            try:
+                await replay_conversation(conversation_id, turns, done)
+            except Exception as e:
+                # 出错的对话保持未完成，续跑时从出错的轮次重试
+                print(f"⚠️ 对话 {conversation_id} 回放出错: {str(e)}")
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    finally:
+        await http_pool.close_session()
+    return completed
+
+
+def summarize_results(path):
+    """汇总结果文件：轮数、降级轮数、token 用量与耗时百分位"""
+    records = [record for records in load_progress(path).values() for record in records]
+    latencies = sorted(record['latency_ms'] for record in records)
+    if not latencies:
+        return {'turns': 0}
+    return {
+        'turns': len(records),
+        'demo_turns': sum(1 for record in records if record['mode'] == 'demo'),
+        'tokens_used': sum(record['tokens_used'] or 0 for record in records),
+        'p50_ms': latencies[len(latencies) // 2],
+        'p95_ms': latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('input', help='对话 JSONL 文件')
+    parser.add_argument('-o', '--output', required=True, help='结果 JSONL 文件（已存在时续跑）')
+    parser.add_argument('--concurrency', type=int, default=16, help='同时回放的对话数')
+    parser.add_argument('--response-cache', action='store_true',
+                        help='使用回复缓存（默认关闭，以免命中缓存影响评测）')
+    args = parser.parse_args()
+
+    load_dotenv()
+    conversations = load_conversations(args.input)
+    progress = load_progress(args.output)
+
+    counselor = EmotionalCounselor(
+        api_key=os.getenv('OPENAI_API_KEY'),
+        model=os.getenv('OPENAI_MODEL', 'deepseek-chat'),
+        api_base=os.getenv('OPENAI_BASE_URL', 'https://api.deepseek.com/v1'),
+        response_cache=create_response_cache() if args.response_cache else None,
+        prompt_builder=create_prompt_builder(),
+        llm_client=create_llm_client()
+    )
+
+    total_turns = sum(len(turns) for _, turns in conversations)
+    done_turns = sum(min(len(progress.get(cid, [])), len(turns)) for cid, turns in conversations)
+    print(f"📋 {len(conversations)} 段对话，共 {total_turns} 轮，已完成 {done_turns} 轮")
+
+    start = time.perf_counter()
+    with open(args.output, 'a', encoding='utf-8') as output:
+        completed = asyncio.run(
+            replay_all(counselor, conversations, progress, output, args.concurrency)
+        )
+    elapsed = time.perf_counter() - start
+
+    print(f"✅ 本次完成 {completed} 轮，用时 {elapsed:.1f} 秒")
+    print(json.dumps(summarize_results(args.output), ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+gunicorn 配置：预加载应用，fork 之前构建好全部索引
+
+启动方式：
+    gunicorn -c gunicorn.conf.py
+
+主进程导入 app 并调用 warmup() 创建咨询师、翻译服务并构建知识库索引，
+工作进程 fork 后以写时复制方式共享这些只读数据，无需各自重建；后台线程
+不会随 fork 复制，在每个工作进程中重新启动。
+
+多个工作进程之间不共享内存中的会话，需配合 SESSION_BACKEND=sqlite 使用。
+"""
+
+import os
+
+wsgi_app = 'app:app'
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 4))
+# 每个工作进程用线程并发处理请求，等待 DeepSeek 返回时不阻塞其他请求
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+# 流式回复可能持续较久
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+preload_app = True
+
+
+def when_ready(server):
+    """主进程加载应用后、fork 工作进程前调用"""
+    import app
+    app.warmup()
+
+
+def post_fork(server, worker):
+    """工作进程中重新启动后台线程（日志写出、摘要、模型健康探测、知识库热加载）"""
+    import app
+    app.start_background_tasks()
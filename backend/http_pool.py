@@ -0,0 +1,38 @@
+"""
+共享的异步 HTTP 连接池
+
+ASGI 服务中所有对外请求（DeepSeek、Google 翻译）复用同一个
+aiohttp.ClientSession，避免每次请求重新建立 TCP/TLS 连接。
+"""
+
+import os
+import aiohttp
+
+# 连接池上限：同时进行中的上游请求数
+POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 1000))
+
+# 单次上游请求的总超时（秒）
+REQUEST_TIMEOUT = float(os.getenv('HTTP_REQUEST_TIMEOUT', 60))
+
+_session = None
+
+
+def get_session():
+    """获取共享的 ClientSession，必须在事件循环中调用"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(limit=POOL_SIZE, ttl_dns_cache=300)
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+            trust_env=True
+        )
+    return _session
+
+
+async def close_session():
+    """关闭共享的 ClientSession（服务退出时调用）"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,243 @@
+"""
+请求去重
+
+- SingleFlight：相同键的调用同时进行时只执行一次，其余调用方等待并共享
+  同一个结果（或异常）
+- IdempotencyStore：按幂等键（请求头 Idempotency-Key）保存已完成请求的结果，
+  客户端超时重试时直接重放，不再调用模型、不再重复写入会话历史；重试到达时
+  原请求仍在进行中，则与之合并
+
+两者都同时支持多线程（Flask）与事件循环（ASGI）中的调用方。结果只保存在
+当前进程内。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from metrics import DEDUPLICATED
+
+
+class IdempotencyConflict(Exception):
+    """同一个幂等键被用于内容不同的请求"""
+
+
+def request_fingerprint(*parts) -> str:
+    """请求内容的摘要，用于判断两个请求是否相同"""
+    data = json.dumps(parts, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'futures')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.futures = []
+
+
+def _resolve(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class SingleFlight:
+    """相同键的并发调用合并为一次"""
+
+    def __init__(self, name: str):
+        """
+        Args:
+            name: 合并时记入指标的类别标签
+        """
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._coalesced = 0
+        self._coalesced_counter = DEDUPLICATED.labels(name)
+
+    def _join(self, key, loop=None):
+        """加入键对应的调用，返回 (调用, 是否由自己执行, 异步等待用的 future)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self._calls += 1
+                return flight, True, None
+            self._coalesced += 1
+            future = None
+            if loop is not None:
+                future = loop.create_future()
+                flight.futures.append((loop, future))
+        self._coalesced_counter.inc()
+        return flight, False, future
+
+    def _finish(self, key, flight, result, error):
+        with self._lock:
+            del self._flights[key]
+            flight.result, flight.error = result, error
+            flight.done.set()
+            futures, flight.futures = flight.futures, []
+        for loop, future in futures:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_resolve, future)
+
+    @staticmethod
+    def _outcome(flight):
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行 fn()；同一个键已有调用在进行时等待它的结果
+
+        Returns:
+            tuple: (结果, 是否与其他调用共享)
+        """
+        flight, leader, _ = self._join(key)
+        if not leader:
+            flight.done.wait()
+            return self._outcome(flight)
+        try:
+            result = fn()
+        except BaseException as e:
+            self._finish(key, flight, None, e)
+            raise
+        self._finish(key, flight, result, None)
+        return result, False
+
+    async def ado(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行 await fn()（异步版本）；同一个键已有调用在进行时等待它的结果
+
+        共享的调用在独立的任务中运行，发起它的请求被取消（客户端断开）时
+        仍会完成，等待它的其他请求照常拿到结果。
+        """
+        loop = asyncio.get_running_loop()
+        flight, leader, future = self._join(key, loop)
+        if not leader:
+            if future is not None:
+                await future
+            return self._outcome(flight)
+
+        def finish(task):
+            if task.cancelled():
+                self._finish(key, flight, None, asyncio.CancelledError())
+            else:
+                self._finish(key, flight, None if task.exception() else task.result(),
+                             task.exception())
+
+        task = asyncio.ensure_future(fn())
+        task.add_done_callback(finish)
+        return await asyncio.shield(task), False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'calls': self._calls, 'coalesced': self._coalesced,
+                    'in_flight': len(self._flights)}
+
+
+class IdempotencyStore:
+    """幂等键 -> 已完成请求的结果（LRU + TTL），以及进行中相同请求的合并"""
+
+    def __init__(self, max_keys: int = 10000, ttl: float = 600, name: str = 'chat'):
+        """
+        Args:
+            max_keys: 最多保存的幂等键数，超出时淘汰最久未使用的
+            ttl: 结果保存多少秒
+            name: 记入指标的类别标签
+        """
+        self.max_keys = max_keys
+        self.ttl = ttl
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self._replayed = 0
+        self._replayed_counter = DEDUPLICATED.labels(f'{name}_replay')
+        self.flights = SingleFlight(name)
+
+    def _lookup(self, key, fingerprint):
+        """返回幂等键保存的结果；键相同但请求内容不同时抛出 IdempotencyConflict"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+            stored_fingerprint, result, expires = entry
+            if expires <= now:
+                del self._results[key]
+                return None
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyConflict("幂等键已用于内容不同的请求")
+            self._results.move_to_end(key)
+            self._replayed += 1
+        self._replayed_counter.inc()
+        return result
+
+    def _save(self, key, fingerprint, result):
+        if self.max_keys <= 0:
+            return
+        with self._lock:
+            # 先完成的请求为准
+            if key in self._results:
+                return
+            self._results[key] = (fingerprint, result, time.monotonic() + self.ttl)
+            while len(self._results) > self.max_keys:
+                self._results.popitem(last=False)
+
+    @staticmethod
+    def _flight_key(key, fingerprint):
+        return ('key', key, fingerprint) if key else ('request', fingerprint)
+
+    def run(self, key: Optional[str], fingerprint: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行请求 fn()
+
+        Args:
+            key: 客户端提供的幂等键，可为 None（此时只合并进行中的相同请求）
+            fingerprint: 请求内容摘要（见 request_fingerprint）
+            fn: 实际处理请求的函数，抛出异常时不保存结果
+
+        Returns:
+            tuple: (结果, 是否为重放或与其他请求共享的结果)
+        """
+        if key:
+            result = self._lookup(key, fingerprint)
+            if result is not None:
+                return result, True
+        result, shared = self.flights.do(self._flight_key(key, fingerprint), fn)
+        if key:
+            self._save(key, fingerprint, result)
+        return result, shared
+
+    async def arun(self, key: Optional[str], fingerprint: str,
+                   fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """执行请求 await fn()（异步版本），参数与返回值同 run()"""
+        if key:
+            result = self._lookup(key, fingerprint)
+            if result is not None:
+                return result, True
+        result, shared = await self.flights.ado(self._flight_key(key, fingerprint), fn)
+        if key:
+            self._save(key, fingerprint, result)
+        return result, shared
+
+    def stats(self) -> Dict:
+        with self._lock:
+            keys = len(self._results)
+            replayed = self._replayed
+        return dict(self.flights.stats(), keys=keys, replayed=replayed)
+
+
+def create_idempotency_store() -> IdempotencyStore:
+    """根据环境变量创建聊天请求的幂等存储（IDEMPOTENCY_MAX_KEYS=0 时只合并、不保存结果）"""
+    return IdempotencyStore(
+        max_keys=int(os.getenv('IDEMPOTENCY_MAX_KEYS', 10000)),
+        ttl=float(os.getenv('IDEMPOTENCY_TTL', 600))
+    )
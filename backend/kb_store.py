@@ -0,0 +1,377 @@
+"""
+SQLite FTS5 知识库
+
+知识库大到不适合整体载入内存（数 GB 的文章与问答）时使用：导入命令把与
+knowledge_base.json 相同结构的主题（keywords / content / examples）写入 SQLite
+数据库，关键词与正文按中文字符二元组切分（与 bm25 检索引擎相同）后建 FTS5
+全文索引。检索时只读取命中的几行，数据库文件通过 mmap 读取，页面由操作系统
+缓存并在各 worker 进程之间共享；进程内只保留一个小的热门查询缓存，内存占用
+不随知识库增大。
+
+导入（可重复执行，同名主题会被更新）：
+    python -m kb_store knowledge_base.json [--db knowledge_base.db] [--replace]
+
+数据量大时建议使用 JSON Lines 文件（.jsonl，每行一个带 topic 字段的主题），
+逐行读取，不必把整个文件载入内存。服务端设置 RAG_ENGINE=fts 后使用该数据库。
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bm25_index import tokenize
+from metrics import stage
+from logger import log
+from prompt_builder import CONTEXT_HEADER, format_block, estimate_tokens
+from rag_system import RetrievalContext
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL UNIQUE,
+    keywords TEXT NOT NULL,
+    content TEXT NOT NULL,
+    examples TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS topics_fts USING fts5(
+    keywords, body, tokenize = 'unicode61 remove_diacritics 0'
+);
+"""
+
+# 单次查询最多使用的检索词数，过长的消息只取前面的部分
+MAX_QUERY_TERMS = 64
+
+
+def _tokens(texts: Iterable[str]) -> str:
+    """切分为空格分隔的检索词，FTS5 的 unicode61 分词器按空格还原为同样的词项"""
+    return ' '.join(token for text in texts for token in tokenize(text))
+
+
+def iter_topics(path: str) -> Iterator[Tuple[str, Dict]]:
+    """
+    读取待导入的主题，产出 (主题, 数据)
+
+    .jsonl 文件逐行读取，每行形如 {"topic": ..., "keywords": [...], "content": ..., "examples": [...]}；
+    其他文件按 knowledge_base.json 的格式（{主题: 数据}）整体读取。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for line in f:
+                if line.strip():
+                    data = json.loads(line)
+                    yield data.pop('topic'), data
+        else:
+            yield from json.load(f).items()
+
+
+def import_topics(db_path: str, topics: Iterable[Tuple[str, Dict]], batch_size: int = 1000,
+                  replace: bool = False) -> Dict:
+    """
+    把主题写入数据库（同名主题覆盖），每 batch_size 个主题提交一次
+
+    Args:
+        db_path: 数据库文件路径，不存在时创建
+        topics: (主题, {'keywords', 'content', 'examples'}) 序列
+        batch_size: 每个事务写入的主题数
+        replace: 导入前清空已有主题
+
+    Returns:
+        dict: 新增、更新的主题数与耗时
+    """
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.executescript(SCHEMA)
+    counts = {'added': 0, 'updated': 0}
+
+    def write(batch):
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for topic, data in batch:
+                keywords = data.get('keywords', [])
+                examples = data.get('examples', [])
+                row = (json.dumps(keywords, ensure_ascii=False), data['content'],
+                       json.dumps(examples, ensure_ascii=False))
+                existing = conn.execute('SELECT id FROM topics WHERE topic = ?', (topic,)).fetchone()
+                if existing is None:
+                    topic_id = conn.execute(
+                        'INSERT INTO topics (topic, keywords, content, examples) VALUES (?, ?, ?, ?)',
+                        (topic,) + row
+                    ).lastrowid
+                    counts['added'] += 1
+                else:
+                    topic_id = existing[0]
+                    conn.execute('UPDATE topics SET keywords = ?, content = ?, examples = ? WHERE id = ?',
+                                 row + (topic_id,))
+                    conn.execute('DELETE FROM topics_fts WHERE rowid = ?', (topic_id,))
+                    counts['updated'] += 1
+                conn.execute(
+                    'INSERT INTO topics_fts (rowid, keywords, body) VALUES (?, ?, ?)',
+                    (topic_id, _tokens(keywords), _tokens([data['content']] + examples))
+                )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    try:
+        if replace:
+            conn.execute('DELETE FROM topics')
+            conn.execute('DELETE FROM topics_fts')
+        batch = []
+        for item in topics:
+            batch.append(item)
+            if len(batch) >= batch_size:
+                write(batch)
+                batch = []
+        if batch:
+            write(batch)
+        # 合并 FTS5 的索引段，之后的查询读取更少的页面
+        conn.execute("INSERT INTO topics_fts (topics_fts) VALUES ('optimize')")
+        total = conn.execute('SELECT COUNT(*) FROM topics').fetchone()[0]
+    finally:
+        conn.close()
+    return dict(counts, topics=total, seconds=round(time.perf_counter() - start, 2))
+
+
+class FTSKnowledgeBase:
+    """
+    基于 SQLite FTS5 的知识检索，接口与 RAGSystem 相同（search / format_context / reload）
+
+    每个线程使用独立的只读连接。其他进程导入新数据后，下一次检索会发现数据库
+    版本变化并清空缓存。
+    """
+
+    # 会话检索上下文最多保留的主题数
+    CONTEXT_TOPICS = 8
+
+    def __init__(self, path: str = 'knowledge_base.db', cache_size: int = 1024,
+                 mmap_size: int = 256 * 1024 * 1024, keyword_weight: float = 2.0,
+                 context_decay: Optional[float] = None, context_turns: Optional[int] = None):
+        """
+        Args:
+            path: 由导入命令生成的数据库文件
+            cache_size: 缓存的查询结果与主题条数（各自的上限，0 表示不缓存）
+            mmap_size: 每个连接 mmap 映射的最大字节数
+            keyword_weight: 关键词列相对正文列的 BM25 权重
+            context_decay: 同 RAGSystem，默认读取环境变量 RAG_CONTEXT_DECAY
+            context_turns: 同 RAGSystem，默认读取环境变量 RAG_CONTEXT_TURNS
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"知识库数据库不存在，请先运行 python -m kb_store 导入: {path}")
+        self.engine = 'fts'
+        self.path = path
+        # 与 KnowledgeBaseWatcher 配合：数据库文件变化后调用 reload() 清空缓存
+        self.knowledge_base_path = path
+        self.cache_size = cache_size
+        self.mmap_size = mmap_size
+        self.keyword_weight = keyword_weight
+        self.context_decay = float(os.getenv('RAG_CONTEXT_DECAY', 0.5)) if context_decay is None \
+            else context_decay
+        self.context_turns = int(os.getenv('RAG_CONTEXT_TURNS', 3)) if context_turns is None \
+            else context_turns
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # (检索词, 条数) -> [(主题, 分数)]；主题 -> (编号, 正文, 示例, 上下文文本块, token 数)
+        self._queries = OrderedDict()
+        self._topics = OrderedDict()
+        self._stats = {'hits': 0, 'misses': 0}
+        log.info('knowledge_base_opened', path=path, topics=self._conn().execute(
+            'SELECT COUNT(*) FROM topics').fetchone()[0])
+
+    def _conn(self):
+        """每个线程使用独立的连接（fork 出的子进程不沿用父进程的连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA query_only=1')
+            conn.execute(f'PRAGMA mmap_size={int(self.mmap_size)}')
+            # 页面主要经 mmap 读取，连接自身的页缓存保持很小
+            conn.execute('PRAGMA cache_size=-2048')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _check_version(self, conn):
+        """其他连接提交了新数据时清空缓存"""
+        version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if getattr(self._local, 'version', version) != version:
+            self._clear_cache()
+        self._local.version = version
+
+    def _clear_cache(self):
+        with self._lock:
+            self._queries.clear()
+            self._topics.clear()
+
+    @staticmethod
+    def _cache_put(cache, key, value, limit):
+        cache[key] = value
+        if len(cache) > limit:
+            cache.popitem(last=False)
+
+    def _match(self, conn, terms: Tuple[str, ...], limit: int) -> List[Tuple[str, float]]:
+        """FTS5 检索，返回 [(主题, 分数)]，按分数从高到低、同分按导入顺序"""
+        key = (terms, limit)
+        with self._lock:
+            ranked = self._queries.get(key)
+            if ranked is not None:
+                self._queries.move_to_end(key)
+                self._stats['hits'] += 1
+                return ranked
+            self._stats['misses'] += 1
+
+        query = ' OR '.join(f'"{term}"' for term in terms)
+        rank = f'bm25(topics_fts, {float(self.keyword_weight)}, 1.0)'
+        rows = conn.execute(
+            f'SELECT t.topic, -{rank} AS score FROM topics_fts JOIN topics t ON t.id = topics_fts.rowid '
+            f'WHERE topics_fts MATCH ? ORDER BY {rank}, t.id LIMIT ?',
+            (query, limit)
+        ).fetchall()
+        ranked = [(topic, score) for topic, score in rows]
+        if self.cache_size > 0:
+            with self._lock:
+                self._cache_put(self._queries, key, ranked, self.cache_size)
+        return ranked
+
+    def _load_topics(self, conn, topics: Iterable[str]) -> Dict[str, tuple]:
+        """读取主题的正文与示例（已删除的主题不在结果中）"""
+        found = {}
+        missing = []
+        with self._lock:
+            for topic in topics:
+                entry = self._topics.get(topic)
+                if entry is None:
+                    missing.append(topic)
+                else:
+                    self._topics.move_to_end(topic)
+                    found[topic] = entry
+        if missing:
+            rows = conn.execute(
+                f"SELECT id, topic, content, examples FROM topics WHERE topic IN "
+                f"({','.join('?' * len(missing))})",
+                missing
+            ).fetchall()
+            loaded = {}
+            for topic_id, topic, content, examples in rows:
+                block = format_block(topic, content)
+                loaded[topic] = (topic_id, content, json.loads(examples), block, estimate_tokens(block))
+            found.update(loaded)
+            if self.cache_size > 0:
+                with self._lock:
+                    for topic, entry in loaded.items():
+                        self._cache_put(self._topics, topic, entry, self.cache_size)
+        return found
+
+    def search(self, query: str, top_k: int = 2, context: Optional[RetrievalContext] = None) -> List[Dict]:
+        """
+        搜索相关知识，参数与返回值同 RAGSystem.search
+
+        Args:
+            query: 用户查询
+            top_k: 返回前 k 个结果
+            context: 会话的检索上下文（原地更新）
+        """
+        conn = self._conn()
+        with stage('rag_search_fts'):
+            self._check_version(conn)
+            terms = tuple(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+            use_context = context is not None and self.context_decay > 0
+            if not terms:
+                matches = []
+            else:
+                matches = self._match(conn, terms, max(top_k, self.CONTEXT_TOPICS) if use_context else top_k)
+
+            if use_context:
+                scores = dict(matches)
+                for topic, prior in context.prior(self.context_decay, self.context_turns):
+                    scores[topic] = scores.get(topic, 0) + prior
+                context.advance(dict(matches), self.context_decay, self.context_turns,
+                                self.CONTEXT_TOPICS)
+                rows = self._load_topics(conn, scores)
+                ranked = heapq.nsmallest(
+                    top_k, ((topic, score) for topic, score in scores.items() if topic in rows),
+                    key=lambda item: (-item[1], rows[item[0]][0])
+                )
+            else:
+                ranked = matches[:top_k]
+                rows = self._load_topics(conn, (topic for topic, _ in ranked))
+
+        results = []
+        for topic, score in ranked:
+            entry = rows.get(topic)
+            if entry is None:
+                continue
+            _, content, examples, block, block_tokens = entry
+            results.append({
+                'topic': topic,
+                'score': score,
+                'content': content,
+                'examples': examples,
+                'block': block,
+                'block_tokens': block_tokens
+            })
+        return results
+
+    def format_context(self, search_results: List[Dict]) -> str:
+        """格式化检索结果为上下文"""
+        if not search_results:
+            return ""
+        return CONTEXT_HEADER + ''.join(
+            result.get('block') or format_block(result['topic'], result['content'])
+            for result in search_results
+        )
+
+    def reload(self, knowledge_base: Optional[Dict] = None) -> Dict:
+        """
+        清空缓存，之后的检索读取数据库的最新内容
+
+        数据由导入命令写入；传入 knowledge_base 时先把这些主题导入数据库。
+        """
+        start = time.perf_counter()
+        if knowledge_base is not None:
+            import_topics(self.path, knowledge_base.items())
+        self._clear_cache()
+        topics = self._conn().execute('SELECT COUNT(*) FROM topics').fetchone()[0]
+        summary = {'topics': topics, 'seconds': round(time.perf_counter() - start, 4)}
+        log.info('knowledge_base_reloaded', **summary)
+        return summary
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, cached_queries=len(self._queries), cached_topics=len(self._topics))
+
+
+def create_fts_knowledge_base() -> FTSKnowledgeBase:
+    """根据环境变量打开 FTS5 知识库（KB_DB_PATH、KB_CACHE_SIZE、KB_MMAP_SIZE）"""
+    return FTSKnowledgeBase(
+        path=os.getenv('KB_DB_PATH', 'knowledge_base.db'),
+        cache_size=int(os.getenv('KB_CACHE_SIZE', 1024)),
+        mmap_size=int(os.getenv('KB_MMAP_SIZE', 256 * 1024 * 1024))
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('source', help='knowledge_base.json 格式的文件，或每行一个主题的 .jsonl 文件')
+    parser.add_argument('--db', default=os.getenv('KB_DB_PATH', 'knowledge_base.db'))
+    parser.add_argument('--batch-size', type=int, default=1000, help='每个事务写入的主题数')
+    parser.add_argument('--replace', action='store_true', help='导入前清空数据库中已有的主题')
+    args = parser.parse_args()
+
+    summary = import_topics(args.db, iter_topics(args.source), args.batch_size, args.replace)
+    print(f"✅ 导入完成：新增 {summary['added']} 个、更新 {summary['updated']} 个主题，"
+          f"共 {summary['topics']} 个，用时 {summary['seconds']} 秒")
+
+
+if __name__ == '__main__':
+    main()
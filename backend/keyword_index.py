@@ -0,0 +1,203 @@
+"""
+Aho–Corasick 关键词自动机
+
+在加载时把所有关键词编译成一个自动机，之后对任意文本只需扫描一遍，
+即可找出其中出现的全部关键词，耗时与关键词数量无关。
+"""
+
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class KeywordAutomaton:
+    """多模式字符串匹配自动机"""
+
+    def __init__(self, keywords: Iterable[str] = ()):
+        """
+        Args:
+            keywords: 关键词列表，重复的关键词只保留一个
+        """
+        # 每个状态的转移表、失败指针、以及在该状态结束的关键词编号
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+        self.keywords: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+        for keyword in keywords:
+            self._add(keyword)
+        self._build()
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def keyword_id(self, keyword: str) -> int:
+        """返回关键词编号，不存在时返回 -1"""
+        return self._ids.get(keyword, -1)
+
+    def _add(self, keyword):
+        """把关键词插入字典树"""
+        if not keyword or keyword in self._ids:
+            return
+        keyword_id = len(self.keywords)
+        self.keywords.append(keyword)
+        self._ids[keyword] = keyword_id
+
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state] = (keyword_id,)
+
+    def _build(self):
+        """按广度优先计算失败指针，并合并输出集合"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                if self._output[self._fail[next_state]]:
+                    self._output[next_state] += self._output[self._fail[next_state]]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """
+        扫描文本，依次产出 (结束位置, 关键词编号)
+
+        结束位置为关键词最后一个字符之后的下标。
+        """
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for position, char in enumerate(text, 1):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                for keyword_id in output[state]:
+                    yield position, keyword_id
+
+    def find_all(self, text: str) -> set:
+        """返回文本中出现过的关键词编号集合"""
+        return {keyword_id for _, keyword_id in self.iter_matches(text)}
+
+
+class TopicKeywordIndex:
+    """
+    关键词到主题的倒排索引
+
+    关键词编译进一个主自动机；增量更新时新出现的关键词放进一个小的增量
+    自动机，增量部分过大时再整体重建。倒排表同样分为共享的主表与记录变更
+    关键词的覆盖层，覆盖层过大时再合并。每次更新都返回新的索引对象，
+    旧对象保持不变，正在进行的查询不受影响。
+    """
+
+    # 增量自动机或覆盖层超过主自动机或主表的这个比例时整体重建
+    COMPACT_RATIO = 0.125
+
+    def __init__(self, topic_keywords: Optional[Dict[str, List[str]]] = None):
+        """
+        Args:
+            topic_keywords: {主题: 关键词列表}
+        """
+        # 关键词 -> {主题: 该关键词在主题中出现的次数}，创建后不再修改
+        self._postings: Dict[str, Dict[str, int]] = {}
+        for topic, keywords in (topic_keywords or {}).items():
+            self._add_topic(self._postings, topic, keywords)
+        # 变更过的关键词 -> 新的 {主题: 次数}，覆盖主表中的同一关键词（空字典表示已删除）
+        self._overlay: Dict[str, Dict[str, int]] = {}
+        self._main = KeywordAutomaton(self._postings.keys())
+        self._delta = KeywordAutomaton()
+
+    @staticmethod
+    def _add_topic(postings, topic, keywords):
+        """把一个主题的关键词写入倒排表（原地修改）"""
+        for keyword in keywords:
+            if not keyword:
+                continue
+            topic_counts = postings.setdefault(keyword, {})
+            topic_counts[topic] = topic_counts.get(topic, 0) + 1
+
+    def _topic_counts(self, keyword: str) -> Dict[str, int]:
+        """关键词当前的 {主题: 次数}"""
+        topic_counts = self._overlay.get(keyword)
+        if topic_counts is None:
+            topic_counts = self._postings.get(keyword, {})
+        return topic_counts
+
+    def updated(self, removed: Dict[str, List[str]], added: Dict[str, List[str]]) -> 'TopicKeywordIndex':
+        """
+        返回应用变更后的新索引，耗时与变更的关键词数量成正比
+
+        Args:
+            removed: 需要移除的 {主题: 旧关键词列表}
+            added: 需要加入的 {主题: 新关键词列表}
+        """
+        index = TopicKeywordIndex.__new__(TopicKeywordIndex)
+        index._postings = self._postings
+        index._overlay = overlay = dict(self._overlay)
+
+        for topic, keywords in removed.items():
+            for keyword in set(keywords):
+                topic_counts = index._topic_counts(keyword)
+                if topic not in topic_counts:
+                    continue
+                topic_counts = dict(topic_counts)
+                del topic_counts[topic]
+                overlay[keyword] = topic_counts
+
+        new_keywords = []
+        for topic, keywords in added.items():
+            counts = {}
+            for keyword in keywords:
+                if keyword:
+                    counts[keyword] = counts.get(keyword, 0) + 1
+            for keyword, count in counts.items():
+                topic_counts = dict(index._topic_counts(keyword))
+                topic_counts[topic] = count
+                overlay[keyword] = topic_counts
+                if self._main.keyword_id(keyword) < 0 and self._delta.keyword_id(keyword) < 0:
+                    new_keywords.append(keyword)
+
+        index._main = self._main
+        index._delta = self._delta
+        rebuild = False
+        if new_keywords:
+            delta_keywords = self._delta.keywords + new_keywords
+            rebuild = len(delta_keywords) > len(self._main) * self.COMPACT_RATIO
+            if not rebuild:
+                index._delta = KeywordAutomaton(delta_keywords)
+        if rebuild or len(overlay) > len(self._postings) * self.COMPACT_RATIO:
+            # 合并覆盖层，去掉已不属于任何主题的关键词
+            postings = {keyword: topic_counts for keyword, topic_counts in self._postings.items()
+                        if keyword not in overlay}
+            postings.update((keyword, topic_counts) for keyword, topic_counts in overlay.items()
+                            if topic_counts)
+            index._postings = postings
+            index._overlay = {}
+        if rebuild:
+            index._main = KeywordAutomaton(index._postings.keys())
+            index._delta = KeywordAutomaton()
+        return index
+
+    def match(self, text: str) -> Dict[str, int]:
+        """扫描一遍文本，返回 {主题: 命中关键词计分}"""
+        scores = {}
+        for automaton in (self._main, self._delta):
+            if not len(automaton):
+                continue
+            for keyword_id in automaton.find_all(text):
+                for topic, weight in self._topic_counts(automaton.keywords[keyword_id]).items():
+                    scores[topic] = scores.get(topic, 0) + weight
+        return scores
@@ -0,0 +1,393 @@
+"""
+带截止时间与熔断器的模型调用层
+
+DeepSeek 变慢或故障时，openai 库默认要等满 600 秒超时才报错，每个用户都要
+等很久才拿到演示模式的回复。LLMClient 为每次调用设置截止时间，并用熔断器
+统计上游故障：连续失败达到阈值后熔断器打开，之后的调用不再访问网络，直接
+抛出 CircuitOpenError，由调用方立即降级到演示模式。冷却期过后只放行一次
+探测（后台探测线程请求 /models，或下一个用户请求），成功则恢复正常。
+
+非流式调用在线程池中发出，调用方最多等到截止时间，不受上游逐字节缓慢返回的
+影响；可选对冲：等待 hedge_delay 秒仍未返回（或第一次调用很快失败）时，
+再发出一次相同的请求，取先成功的结果，用以削减尾延迟。
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Optional
+
+import aiohttp
+import openai
+import requests
+
+from metrics import LLM_CALLS
+from logger import log
+
+
+class LLMTimeout(Exception):
+    """模型调用超过截止时间"""
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，本次调用没有访问网络"""
+
+
+# 视为上游不可用的错误（请求参数、鉴权等错误说明上游仍在正常响应）
+_UPSTREAM_ERRORS = (
+    LLMTimeout,
+    TimeoutError,
+    ConnectionError,
+    openai.error.Timeout,
+    openai.error.TryAgain,
+    openai.error.APIConnectionError,
+    openai.error.ServiceUnavailableError,
+    openai.error.RateLimitError,
+    requests.RequestException,
+    aiohttp.ClientError,
+)
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """错误是否说明上游服务不可用"""
+    if isinstance(error, openai.error.APIError):
+        return error.http_status is None or error.http_status >= 500
+    return isinstance(error, _UPSTREAM_ERRORS)
+
+
+class CircuitBreaker:
+    """连续失败计数熔断器：closed -> open -> half_open -> closed"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0):
+        """
+        Args:
+            failure_threshold: 连续失败达到此次数时打开
+            cooldown: 打开后经过多少秒放行一次探测
+        """
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_at = 0.0
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'rejected': 0}
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self, trial: bool = True) -> bool:
+        """
+        本次调用能否访问上游；冷却期过后每次只放行一个探测
+
+        Args:
+            trial: 为 False 时只检查，放行时不占用探测名额、不改变状态
+        """
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if self._state == self.OPEN and now - self._opened_at >= self.cooldown:
+                if trial:
+                    self._state = self.HALF_OPEN
+                    self._trial_at = now
+                return True
+            # 半开状态下探测迟迟没有结果（如调用方中途放弃）时再放行一个
+            if self._state == self.HALF_OPEN and now - self._trial_at >= self.cooldown:
+                if trial:
+                    self._trial_at = now
+                return True
+            self._stats['rejected'] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            if self._state != self.CLOSED:
+                self._state = self.CLOSED
+                log.info('llm_circuit_closed')
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._open()
+            elif self._state == self.CLOSED:
+                self._failures += 1
+                if self._failures >= self.failure_threshold:
+                    self._open()
+
+    def _open(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._failures = 0
+        self._stats['opened'] += 1
+        log.warning('llm_circuit_opened', cooldown=self.cooldown)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            retry_in = None
+            if self._state == self.OPEN:
+                retry_in = round(max(self.cooldown - (time.monotonic() - self._opened_at), 0.0), 1)
+            return dict(
+                self._stats,
+                state=self._state,
+                consecutive_failures=self._failures,
+                retry_in=retry_in
+            )
+
+
+class LLMClient:
+    """openai.ChatCompletion 的容错封装，参数原样传给 openai"""
+
+    # 非流式调用线程池的线程上限；超过截止时间被放弃的请求仍会占用线程直到自行结束
+    MAX_WORKERS = 256
+
+    def __init__(self, timeout: float = 30.0, idle_timeout: float = 15.0,
+                 connect_timeout: float = 5.0, hedge_delay: float = 0.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        """
+        Args:
+            timeout: 非流式调用的截止时间（秒）
+            idle_timeout: 流式调用中首个分片、以及相邻分片之间的最长等待（秒）
+            connect_timeout: 建立连接的超时（秒）
+            hedge_delay: 非流式调用等待多少秒后发出对冲请求，0 表示不对冲
+            breaker: 熔断器，默认连续失败 5 次打开、冷却 30 秒
+        """
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.hedge_delay = hedge_delay
+        self.breaker = breaker or CircuitBreaker()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._prober = None
+        self._probe_interval = None
+
+    def check(self) -> None:
+        """
+        熔断中时立即抛出 CircuitOpenError，不占用探测名额
+
+        调用方在排队占用并发名额之前调用，熔断期间的请求不必排队等待。
+        """
+        self._acquire(trial=False)
+
+    def _acquire(self, trial=True):
+        if not self.breaker.allow(trial):
+            LLM_CALLS.labels('rejected').inc()
+            raise CircuitOpenError("DeepSeek API 熔断中")
+
+    def _settle(self, error: Optional[BaseException]) -> None:
+        """按调用结果更新熔断器与指标"""
+        if error is None:
+            LLM_CALLS.labels('ok').inc()
+            self.breaker.record_success()
+        elif is_upstream_failure(error):
+            LLM_CALLS.labels('timeout' if isinstance(error, (LLMTimeout, TimeoutError, openai.error.Timeout))
+                             else 'error').inc()
+            self.breaker.record_failure()
+        else:
+            LLM_CALLS.labels('error').inc()
+            self.breaker.record_success()
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS,
+                                                        thread_name_prefix='llm-call')
+        return self._executor
+
+    def complete(self, **params):
+        """非流式调用，超过 timeout 抛出 LLMTimeout"""
+        self._acquire()
+        params['request_timeout'] = (self.connect_timeout, self.timeout)
+        try:
+            # request_timeout 只限制连接与两次读取之间的间隔，上游逐字节缓慢返回时
+            # 总耗时仍可能远超 timeout，因此总是在线程池中调用并只等到截止时间
+            response = self._hedged(params)
+        except Exception as e:
+            self._settle(e)
+            raise
+        self._settle(None)
+        return response
+
+    def _hedged(self, params):
+        """在线程池中发出请求，需要时追加一个对冲请求，返回先成功的结果"""
+        executor = self._get_executor()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        hedge_at = start + self.hedge_delay if self.hedge_delay > 0 else None
+        pending = {executor.submit(openai.ChatCompletion.create, **params)}
+        error = None
+        while pending:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            until = deadline if hedge_at is None else min(hedge_at, deadline)
+            done, pending = wait(pending, timeout=until - now, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+            if hedge_at is not None and (time.monotonic() >= hedge_at
+                                         or (not pending and is_upstream_failure(error))):
+                hedge_at = None
+                LLM_CALLS.labels('hedged').inc()
+                pending.add(executor.submit(openai.ChatCompletion.create, **params))
+        if pending:
+            # 未完成的请求在 request_timeout 到期后自行结束
+            raise LLMTimeout(f"DeepSeek API 超过 {self.timeout:g} 秒未返回")
+        raise error
+
+    def stream(self, **params):
+        """流式调用，逐个产出分片；首个分片或相邻分片间隔超过 idle_timeout 时报错"""
+        self._acquire()
+        error = None
+        try:
+            chunks = openai.ChatCompletion.create(
+                stream=True, request_timeout=(self.connect_timeout, self.idle_timeout), **params
+            )
+            yield from chunks
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            # 调用方中途停止读取时按成功处理
+            self._settle(error)
+
+    async def acomplete(self, **params):
+        """非流式调用（异步版本）"""
+        self._acquire()
+        params['request_timeout'] = (self.connect_timeout, self.timeout)
+        try:
+            response = await self._ahedged(params)
+        except Exception as e:
+            self._settle(e)
+            raise
+        self._settle(None)
+        return response
+
+    async def _ahedged(self, params):
+        loop_time = asyncio.get_running_loop().time
+        start = loop_time()
+        deadline = start + self.timeout
+        hedge_at = start + self.hedge_delay if self.hedge_delay > 0 else None
+        pending = {asyncio.ensure_future(openai.ChatCompletion.acreate(**params))}
+        error = None
+        try:
+            while pending:
+                now = loop_time()
+                if now >= deadline:
+                    break
+                until = deadline if hedge_at is None else min(hedge_at, deadline)
+                done, pending = await asyncio.wait(
+                    pending, timeout=until - now, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        error = e
+                if hedge_at is not None and (loop_time() >= hedge_at
+                                             or (not pending and is_upstream_failure(error))):
+                    hedge_at = None
+                    LLM_CALLS.labels('hedged').inc()
+                    pending.add(asyncio.ensure_future(openai.ChatCompletion.acreate(**params)))
+            if pending:
+                raise LLMTimeout(f"DeepSeek API 超过 {self.timeout:g} 秒未返回")
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def astream(self, **params):
+        """流式调用（异步版本）"""
+        self._acquire()
+        error = None
+        chunks = None
+        try:
+            try:
+                chunks = await asyncio.wait_for(
+                    openai.ChatCompletion.acreate(stream=True, **params), self.idle_timeout
+                )
+                while True:
+                    try:
+                        chunk = await asyncio.wait_for(chunks.__anext__(), self.idle_timeout)
+                    except StopAsyncIteration:
+                        break
+                    yield chunk
+            except asyncio.TimeoutError:
+                raise LLMTimeout(f"DeepSeek API 超过 {self.idle_timeout:g} 秒没有输出")
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if chunks is not None:
+                await chunks.aclose()
+            self._settle(error)
+
+    def probe(self) -> bool:
+        """请求 /models 检查上游是否可用，结果计入熔断器"""
+        try:
+            openai.Model.list(request_timeout=(self.connect_timeout, self.timeout))
+        except Exception as e:
+            log.warning('llm_probe_failed', error=str(e))
+            self._settle(e)
+            return False
+        self._settle(None)
+        return True
+
+    def start_prober(self, interval: Optional[float] = None) -> 'LLMClient':
+        """
+        启动后台探测线程：熔断器打开且冷却期已过时，由它代替用户请求去探测
+
+        fork 之后子进程中没有这个线程，再次调用（interval 可省略，沿用上次的值）会重新启动。
+        """
+        if interval is not None:
+            self._probe_interval = interval
+        if self._probe_interval and not (self._prober and self._prober.is_alive()):
+            self._prober = threading.Thread(
+                target=self._probe_loop, args=(self._probe_interval,), name='llm-prober', daemon=True
+            )
+            self._prober.start()
+        return self
+
+    def _probe_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            if self.breaker.state != CircuitBreaker.CLOSED and self.breaker.allow():
+                self.probe()
+
+    def stats(self) -> Dict:
+        return {
+            'breaker': self.breaker.stats(),
+            'timeout': self.timeout,
+            'idle_timeout': self.idle_timeout,
+            'hedge_delay': self.hedge_delay
+        }
+
+
+def create_llm_client() -> LLMClient:
+    """根据环境变量创建模型调用层，LLM_PROBE_INTERVAL>0 时启动后台探测"""
+    client = LLMClient(
+        timeout=float(os.getenv('LLM_TIMEOUT', 30)),
+        idle_timeout=float(os.getenv('LLM_STREAM_IDLE_TIMEOUT', 15)),
+        connect_timeout=float(os.getenv('LLM_CONNECT_TIMEOUT', 5)),
+        hedge_delay=float(os.getenv('LLM_HEDGE_DELAY', 0)),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', 5)),
+            cooldown=float(os.getenv('LLM_BREAKER_COOLDOWN', 30))
+        )
+    )
+    probe_interval = float(os.getenv('LLM_PROBE_INTERVAL', 5))
+    if probe_interval > 0:
+        client.start_prober(probe_interval)
+    return client
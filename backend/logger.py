@@ -0,0 +1,235 @@
+"""
+结构化日志
+
+每条日志是一行 JSON：时间、级别、事件名、请求 ID 与附加字段。请求路径上
+记录日志只做级别判断、（可选的）采样和一次入队，格式化与写出由后台线程
+批量完成，不会因为 stdout 变慢而阻塞处理请求的线程。队列满时丢弃新日志
+并计数，从不等待。
+
+    from logger import log
+    log.info('knowledge_base_loaded', topics=6)
+    log.warning('llm_error', error=str(e))
+
+请求 ID 由 app.py / asgi.py 在请求开始时设置（沿用请求头 X-Request-ID 或新
+生成），同一请求中记录的日志自动带上该 ID。
+"""
+
+import atexit
+import contextvars
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from metrics import LOG_DROPPED
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+# 一次最多合并写出的日志条数
+WRITE_BATCH = 256
+
+# 放入队列通知写线程退出
+_STOP = object()
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+def get_request_id() -> Optional[str]:
+    return _request_id.get()
+
+
+def set_request_id(request_id: Optional[str]):
+    """设置当前请求（线程或 asyncio 任务）的请求 ID，返回用于 reset_request_id 的令牌"""
+    return _request_id.set(request_id)
+
+
+def reset_request_id(token) -> None:
+    _request_id.reset(token)
+
+
+@contextmanager
+def request_context(request_id: Optional[str]):
+    """with 块内记录的日志带上 request_id（用于请求结束后才运行的流式生成器）"""
+    token = _request_id.set(request_id)
+    try:
+        yield
+    finally:
+        _request_id.reset(token)
+
+
+def parse_sample_rates(value: str) -> Dict[str, float]:
+    """解析 "debug=0.01,info=0.5" 形式的各级别采样率"""
+    rates = {}
+    for item in value.split(','):
+        if item.strip():
+            level, rate = item.split('=')
+            rates[level.strip()] = float(rate)
+    return rates
+
+
+class JsonLogger:
+    """队列 + 后台写线程的 JSON 日志"""
+
+    def __init__(self, level: str = 'info', max_queue: int = 10000,
+                 sample_rates: Optional[Dict[str, float]] = None, stream=None):
+        """
+        Args:
+            level: 最低记录级别（debug / info / warning / error）
+            max_queue: 等待写出的最大条数，超出时丢弃
+            sample_rates: 各级别的采样率（0~1），未列出的级别全部记录
+            stream: 写出目标，默认 sys.stdout
+        """
+        self._queue = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+        self._written = 0
+        self._dropped = 0
+        self.configure(level, max_queue, sample_rates, stream)
+
+    def configure(self, level: str = 'info', max_queue: int = 10000,
+                  sample_rates: Optional[Dict[str, float]] = None, stream=None) -> 'JsonLogger':
+        """调整配置；队列长度变化时先写出已入队的日志、停止写线程，再换用新的队列"""
+        self.level = LEVELS[level]
+        self.sample_rates = {LEVELS[name]: rate for name, rate in (sample_rates or {}).items()
+                             if rate < 1}
+        self.stream = stream
+        if self._queue is None or self._queue.maxsize != max_queue:
+            with self._start_lock:
+                # 写线程阻塞在旧队列上，直接替换队列的话新队列里的日志不会再被写出
+                if self._thread is not None and self._thread.is_alive():
+                    self._queue.put(_STOP)
+                    self._thread.join()
+                self._thread = None
+                self._queue = queue.Queue(max_queue)
+        return self
+
+    def _after_fork(self):
+        # fork 时写线程可能正持有队列的锁，子进程改用新的队列与锁；
+        # 父进程中尚未写出的日志由父进程负责
+        self._queue = queue.Queue(self._queue.maxsize)
+        self._start_lock = threading.Lock()
+        self._dropped_lock = threading.Lock()
+        self._thread = None
+
+    def start(self) -> 'JsonLogger':
+        """启动写线程（fork 后的子进程中第一次记录日志时也会自动启动）"""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+                self._thread.start()
+        return self
+
+    def log(self, level: str, event: str, **fields) -> None:
+        levelno = LEVELS[level]
+        if levelno < self.level:
+            return
+        rate = self.sample_rates.get(levelno)
+        if rate is not None and random.random() >= rate:
+            return
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((time.time(), level, event, _request_id.get(), fields))
+        except queue.Full:
+            with self._dropped_lock:
+                self._dropped += 1
+            LOG_DROPPED.labels(level).inc()
+
+    def debug(self, event: str, **fields) -> None:
+        self.log('debug', event, **fields)
+
+    def info(self, event: str, **fields) -> None:
+        self.log('info', event, **fields)
+
+    def warning(self, event: str, **fields) -> None:
+        self.log('warning', event, **fields)
+
+    def error(self, event: str, **fields) -> None:
+        self.log('error', event, **fields)
+
+    @staticmethod
+    def _format(record) -> str:
+        timestamp, level, event, request_id, fields = record
+        entry = {
+            'ts': datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': level,
+            'event': event
+        }
+        if request_id:
+            entry['request_id'] = request_id
+        entry.update(fields)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+    def _run(self):
+        log_queue = self._queue
+        stopping = False
+        while not stopping:
+            records = [log_queue.get()]
+            while len(records) < WRITE_BATCH:
+                try:
+                    records.append(log_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in records:
+                # 写出这一批后退出
+                stopping = True
+                log_queue.task_done()
+                records = [record for record in records if record is not _STOP]
+            try:
+                if records:
+                    stream = self.stream or sys.stdout
+                    stream.write(''.join(self._format(record) + '\n' for record in records))
+                    stream.flush()
+                    self._written += len(records)
+            except Exception:
+                # 写出失败（如 stdout 已关闭）时丢弃这一批，写线程继续运行
+                with self._dropped_lock:
+                    self._dropped += len(records)
+                for level, count in Counter(record[1] for record in records).items():
+                    LOG_DROPPED.labels(level).inc(count)
+            finally:
+                for _ in records:
+                    log_queue.task_done()
+
+    def flush(self, timeout: float = 1.0) -> None:
+        """等待已入队的日志写出（最多 timeout 秒），用于退出前"""
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            if self._thread is None or not self._thread.is_alive():
+                return
+            time.sleep(0.01)
+
+    def stats(self) -> Dict:
+        return {
+            'level': next(name for name, value in LEVELS.items() if value == self.level),
+            'queued': self._queue.qsize(),
+            'written': self._written,
+            'dropped': self._dropped
+        }
+
+
+log = JsonLogger()
+atexit.register(log.flush)
+os.register_at_fork(after_in_child=log._after_fork)
+
+
+def configure_logging() -> JsonLogger:
+    """按环境变量配置全局日志（LOG_LEVEL、LOG_QUEUE_SIZE、LOG_SAMPLE_RATES）"""
+    return log.configure(
+        level=os.getenv('LOG_LEVEL', 'info').lower(),
+        max_queue=int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+        sample_rates=parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', ''))
+    )
@@ -0,0 +1,363 @@
+"""
+进程内指标：计数器、仪表与直方图，以 Prometheus 文本格式导出
+
+各模块在导入时创建指标，热路径上先用 labels() 取到子指标并缓存，
+之后每次记录只是一次加锁的加法。/api/metrics 调用 render() 输出全部指标。
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+# 默认的耗时分桶（秒），覆盖从微秒级的分类到数十秒的模型调用
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """带标签的指标基类，子指标按标签值缓存"""
+
+    TYPE = ''
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """取得某组标签值对应的子指标"""
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child(key)
+        return child
+
+    def _new_child(self, values):
+        raise NotImplementedError
+
+    def _samples(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.TYPE}']
+        for values, child in self._samples():
+            lines.extend(self._render_child(values, child))
+        return '\n'.join(lines)
+
+    def _render_child(self, values, child):
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    """只增不减的计数器"""
+
+    TYPE = 'counter'
+
+    def _new_child(self, values):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        """无标签计数器加 amount"""
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_number(child.value)}'
+
+
+class _GaugeChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value -= amount
+
+
+class Gauge(_Metric):
+    """可增可减的当前值（如排队数）"""
+
+    TYPE = 'gauge'
+
+    def _new_child(self, values):
+        return _GaugeChild()
+
+    def set(self, value: float) -> None:
+        """设置无标签仪表的值"""
+        self.labels().set(value)
+
+    def _render_child(self, values, child):
+        yield f'{self.name}{_format_labels(self.labelnames, values)} {_format_number(child.value)}'
+
+
+class _Timer:
+    """with 块结束时把耗时记入直方图"""
+
+    __slots__ = ('_child', '_start')
+
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+        return False
+
+
+class _HistogramChild:
+    __slots__ = ('buckets', 'counts', 'sum', 'count', '_lock')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+
+class Histogram(_Metric):
+    """分桶直方图"""
+
+    TYPE = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self, values):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        """无标签直方图记录一次观测值"""
+        self.labels().observe(value)
+
+    def time(self) -> _Timer:
+        return self.labels().time()
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_number(bound)}"'
+            yield f'{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}'
+        labels = _format_labels(self.labelnames, values)
+        yield f'{self.name}_sum{labels} {_format_number(total)}'
+        yield f'{self.name}_count{labels} {count}'
+
+
+# 正在记录阶段明细的请求的记录列表（见 record_stages）
+_request_stages = contextvars.ContextVar('request_stages', default=None)
+
+
+class _StageChild(_HistogramChild):
+    __slots__ = ('stage',)
+
+    def __init__(self, buckets, stage):
+        super().__init__(buckets)
+        self.stage = stage
+
+    def observe(self, value: float) -> None:
+        super().observe(value)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((self.stage, time.perf_counter() - value, value))
+
+
+class StageHistogram(Histogram):
+    """阶段耗时直方图：同时把每次观测记入当前请求的阶段明细（若正在记录）"""
+
+    def _new_child(self, values):
+        return _StageChild(self.buckets, values[0])
+
+
+def record_stages():
+    """
+    开始记录当前请求（线程或 asyncio 任务）中各阶段的耗时
+
+    Returns:
+        tuple: (记录列表，元素为 (阶段, 开始时刻 perf_counter, 秒数), 用于 stop_recording 的令牌)
+    """
+    stages = []
+    return stages, _request_stages.set(stages)
+
+
+def stop_recording(token) -> None:
+    """停止记录（工作线程会被复用，请求结束时必须调用）"""
+    _request_stages.reset(token)
+
+
+class Registry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"指标已存在: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 各处理阶段的耗时
+STAGE_SECONDS = REGISTRY.register(StageHistogram(
+    'counseling_stage_seconds', '各处理阶段耗时（秒）', ['stage']
+))
+
+# 回复来源：llm / cached / demo
+REPLIES = REGISTRY.counter(
+    'counseling_replies_total', '按来源统计的回复数', ['source']
+)
+
+# 降级到演示模式的原因：no_api_key / api_error / timeout / circuit_open / overloaded
+FALLBACKS = REGISTRY.counter(
+    'counseling_fallbacks_total', '降级到演示模式的次数', ['reason']
+)
+
+# 模型 token 用量：prompt / completion
+TOKENS = REGISTRY.counter(
+    'counseling_llm_tokens_total', '模型 token 用量', ['kind']
+)
+
+# HTTP 接口请求数与耗时（流式接口只计到开始返回响应为止）
+REQUESTS = REGISTRY.counter(
+    'counseling_http_requests_total', 'HTTP 接口请求数', ['endpoint', 'status']
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'counseling_http_request_seconds', 'HTTP 接口耗时（秒）', ['endpoint']
+)
+
+# 模型调用结果：ok / error / timeout / rejected（熔断中）/ hedged（发出对冲请求）
+LLM_CALLS = REGISTRY.counter(
+    'counseling_llm_calls_total', '按结果统计的模型调用次数', ['outcome']
+)
+
+# 模型调用的并发与排队：active / queued
+LLM_SLOTS = REGISTRY.gauge(
+    'counseling_llm_slots', '正在进行与排队等待的模型调用数', ['state']
+)
+
+# 准入控制拒绝的请求：queue_full / queue_timeout / session_rate / ip_rate
+ADMISSION_REJECTED = REGISTRY.counter(
+    'counseling_admission_rejected_total', '被准入控制拒绝的请求数', ['reason']
+)
+
+# 翻译结果：translated / cached / skipped / error
+TRANSLATIONS = REGISTRY.counter(
+    'counseling_translations_total', '按结果统计的翻译次数', ['result']
+)
+
+# 未重复执行的请求：chat（合并进行中的相同聊天请求）/ chat_replay（按幂等键重放）/
+# translate（合并进行中的相同翻译）
+DEDUPLICATED = REGISTRY.counter(
+    'counseling_deduplicated_requests_total', '合并或重放而未重复执行的请求数', ['kind']
+)
+
+# 日志队列已满或写出失败而丢弃的日志条数
+LOG_DROPPED = REGISTRY.counter(
+    'counseling_log_dropped_total', '日志队列已满或写出失败而丢弃的日志数', ['level']
+)
+
+
+def observe_request(endpoint: str, status: int, seconds: float) -> None:
+    """记录一次 HTTP 请求"""
+    endpoint = endpoint or 'unknown'
+    REQUESTS.labels(endpoint, status).inc()
+    REQUEST_SECONDS.labels(endpoint).observe(seconds)
+
+
+def stage(name: str) -> _Timer:
+    """记录一个处理阶段的耗时：with stage('rag_search'): ..."""
+    return STAGE_SECONDS.labels(name).time()
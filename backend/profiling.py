@@ -0,0 +1,259 @@
+"""
+线上性能剖析
+
+- SamplingProfiler：在限定时长内按固定间隔采样所有线程的调用栈，输出折叠
+  格式（每行 "帧;帧;帧 次数"），可直接交给 flamegraph.pl、speedscope 等工具
+  绘制火焰图。只在管理接口调用时运行，平时没有任何开销
+- SlowRequestLog：后台线程按间隔采样进行中请求的调用栈（ASGI 请求采样协程
+  的 await 链），请求结束时若超过阈值，把耗时、各阶段明细与采样到的调用栈
+  存入有界环形缓冲，供事后查询；未超过阈值的请求直接丢弃
+"""
+
+import asyncio
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Dict, List, Optional
+
+from metrics import record_stages, stop_recording
+
+# 线程名中的序号（Thread-12、translate_3）归并为同一类
+_THREAD_NUMBER_RE = re.compile(r'[-_]\d+')
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f'{module}.{code.co_name}'
+
+
+def _fold(frames) -> str:
+    """调用栈（从外到内）折叠为一行"""
+    return ';'.join(_frame_label(frame) for frame in frames)
+
+
+def _thread_frames(frame) -> list:
+    """线程当前的调用栈，从外到内"""
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    return frames
+
+
+def _task_frames(task) -> list:
+    """
+    asyncio 任务当前挂起位置的 await 链，从外到内
+
+    await 另一个任务时接着展开该任务；停在普通 Future（如 asyncio.shield）处。
+    """
+    frames = []
+    coro = task.get_coro()
+    while coro is not None:
+        if isinstance(coro, asyncio.Task):
+            coro = coro.get_coro()
+            continue
+        frame = getattr(coro, 'cr_frame', None) or getattr(coro, 'ag_frame', None) \
+            or getattr(coro, 'gi_frame', None)
+        if frame is None:
+            break
+        frames.append(frame)
+        coro = getattr(coro, 'cr_await', None) or getattr(coro, 'ag_await', None) \
+            or getattr(coro, 'gi_yieldfrom', None)
+    return frames
+
+
+def _thread_names() -> Dict[int, str]:
+    return {thread.ident: _THREAD_NUMBER_RE.sub('', thread.name) for thread in threading.enumerate()}
+
+
+def format_folded(stacks: Counter) -> str:
+    """折叠格式文本，按采样次数从多到少排列"""
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class ProfilerBusy(Exception):
+    """已有一次采样正在进行"""
+
+
+class SamplingProfiler:
+    """按需运行的全线程采样剖析器，同一时间只允许一次采样"""
+
+    def __init__(self, max_seconds: float = 60, min_interval: float = 0.001):
+        """
+        Args:
+            max_seconds: 单次采样的最长时间（秒）
+            min_interval: 最短采样间隔（秒）
+        """
+        self.max_seconds = max_seconds
+        self.min_interval = min_interval
+        self._running = threading.Lock()
+
+    def profile(self, seconds: float = 10, interval: float = 0.01) -> Counter:
+        """
+        在当前线程中采样 seconds 秒（阻塞），返回 {折叠调用栈: 采样次数}
+
+        每个调用栈以线程名开头；采样线程自身不计入。
+        """
+        seconds = min(max(seconds, 0), self.max_seconds)
+        interval = max(interval, self.min_interval)
+        if not self._running.acquire(blocking=False):
+            raise ProfilerBusy("已有一次采样正在进行")
+        try:
+            own = threading.get_ident()
+            stacks = Counter()
+            names = _thread_names()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    if ident not in names:
+                        names = _thread_names()
+                    thread = names.get(ident, str(ident))
+                    stacks[f'{thread};{_fold(_thread_frames(frame))}'] += 1
+                time.sleep(interval)
+            return stacks
+        finally:
+            self._running.release()
+
+
+class _Request:
+    __slots__ = ('thread', 'task', 'start', 'stages', 'stacks', 'token')
+
+    def __init__(self, thread, task, start, stages, token):
+        self.thread = thread
+        self.task = task
+        self.start = start
+        self.stages = stages
+        self.stacks = Counter()
+        self.token = token
+
+
+class SlowRequestLog:
+    """慢请求记录：超过阈值的请求的耗时、阶段明细与调用栈采样"""
+
+    def __init__(self, threshold: float, capacity: int = 100, sample_interval: float = 0.02):
+        """
+        Args:
+            threshold: 慢请求阈值（秒）
+            capacity: 最多保留的慢请求条数，超出时丢弃最早的
+            sample_interval: 进行中请求的调用栈采样间隔（秒）
+        """
+        self.threshold = threshold
+        self.sample_interval = sample_interval
+        self._slow = deque(maxlen=capacity)
+        self._active = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._stats = {'requests': 0, 'slow': 0, 'samples': 0}
+
+    def start(self) -> 'SlowRequestLog':
+        """启动采样线程（fork 后的子进程中再次调用会重新启动）"""
+        if self._sampler is None or not self._sampler.is_alive():
+            self._sampler = threading.Thread(target=self._run, name='slow-request-sampler', daemon=True)
+            self._sampler.start()
+        return self
+
+    def begin(self, task=None) -> _Request:
+        """
+        请求开始时调用（在处理请求的线程或 asyncio 任务中）
+
+        Args:
+            task: ASGI 请求所在的 asyncio 任务；为 None 时采样当前线程
+        """
+        stages, token = record_stages()
+        request = _Request(threading.get_ident(), task, time.perf_counter(), stages, token)
+        with self._lock:
+            self._active[id(request)] = request
+        return request
+
+    def end(self, request: _Request, endpoint: str, method: str, status: int) -> None:
+        """请求结束时调用；超过阈值的请求记入环形缓冲"""
+        duration = time.perf_counter() - request.start
+        stop_recording(request.token)
+        with self._lock:
+            self._active.pop(id(request), None)
+            self._stats['requests'] += 1
+            if duration < self.threshold:
+                return
+            self._stats['slow'] += 1
+            stacks = request.stacks.most_common()
+        self._slow.append({
+            'time': time.time() - duration,
+            'endpoint': endpoint or 'unknown',
+            'method': method,
+            'status': status,
+            'duration_ms': round(duration * 1e3, 1),
+            # 各阶段按开始先后排列，offset_ms 为相对请求开始的时刻
+            'stages': [
+                {'stage': stage, 'offset_ms': round((started - request.start) * 1e3, 1),
+                 'duration_ms': round(seconds * 1e3, 1)}
+                for stage, started, seconds in sorted(request.stages, key=lambda item: item[1])
+            ],
+            'sample_interval_ms': self.sample_interval * 1e3,
+            'stacks': [{'stack': stack, 'samples': count} for stack, count in stacks]
+        })
+
+    def _run(self):
+        while True:
+            time.sleep(self.sample_interval)
+            with self._lock:
+                requests = list(self._active.values())
+            if not requests:
+                continue
+            frames = sys._current_frames()
+            samples = []
+            for request in requests:
+                if request.task is not None:
+                    stack = _task_frames(request.task)
+                else:
+                    frame = frames.get(request.thread)
+                    stack = _thread_frames(frame) if frame is not None else None
+                if stack:
+                    samples.append((request, _fold(stack)))
+            del frames
+            with self._lock:
+                for request, stack in samples:
+                    request.stacks[stack] += 1
+                self._stats['samples'] += len(samples)
+
+    def recent(self, limit: Optional[int] = None) -> List[Dict]:
+        """最近的慢请求，最新的在前"""
+        entries = list(self._slow)
+        entries.reverse()
+        return entries[:limit] if limit else entries
+
+    def folded(self) -> Counter:
+        """全部已记录慢请求的调用栈合并为 {折叠调用栈: 采样次数}，可直接绘制火焰图"""
+        stacks = Counter()
+        for entry in list(self._slow):
+            for item in entry['stacks']:
+                stacks[f"{entry['endpoint']};{item['stack']}"] += item['samples']
+        return stacks
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, threshold=self.threshold, recorded=len(self._slow),
+                        capacity=self._slow.maxlen, active=len(self._active))
+
+
+def create_profiler() -> SamplingProfiler:
+    """根据环境变量创建采样剖析器（通过管理接口按需运行）"""
+    return SamplingProfiler(max_seconds=float(os.getenv('PROFILE_MAX_SECONDS', 60)))
+
+
+def create_slow_request_log() -> Optional[SlowRequestLog]:
+    """根据环境变量创建慢请求记录，SLOW_REQUEST_THRESHOLD=0（默认）时关闭"""
+    threshold = float(os.getenv('SLOW_REQUEST_THRESHOLD', 0))
+    if threshold <= 0:
+        return None
+    return SlowRequestLog(
+        threshold=threshold,
+        capacity=int(os.getenv('SLOW_REQUEST_CAPACITY', 100)),
+        sample_interval=float(os.getenv('SLOW_REQUEST_SAMPLE_INTERVAL', 0.02))
+    ).start()
@@ -0,0 +1,212 @@
+"""
+按 token 预算组装对话请求
+
+请求消息的排列：
+    [静态系统提示词] + [对话摘要] + [历史对话] + [本轮检索到的知识] + [用户消息]
+
+系统提示词逐字节保持不变并放在最前面，摘要只在后台重新生成时才变化，检索到
+的知识放在用户消息之前，因此同一会话相邻两轮请求的前缀完全相同，可以命中
+DeepSeek 的上下文硬盘缓存。总长度按本地估算的 token 数控制：超长的用户消息
+被截断，其次放入摘要，知识块按相关度依次放入，历史对话从最近的一轮往前保留，
+直到用完预算。
+"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from prompts import SYSTEM_PROMPT
+
+# 中文字符与全角符号（约 0.6 token / 字），其余非空白字符约 0.3 token / 字
+_WIDE_RE = re.compile('[⺀-鿿가-힯豈-﫿＀-￯]+')
+_SPACE_RE = re.compile(r'\s+')
+WIDE_CHAR_TOKENS = 0.6
+NARROW_CHAR_TOKENS = 0.3
+
+# 每条消息的角色、分隔符等额外开销
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# 知识上下文的标题与结尾说明（与 RAGSystem.format_context 一致）
+CONTEXT_HEADER = "以下是相关的专业知识，请参考：\n\n"
+CONTEXT_FOOTER = "请基于以上专业知识，结合用户的具体情况给出建议。"
+
+# 对话摘要的标题
+SUMMARY_HEADER = "以下是此前对话的摘要：\n"
+
+# 截断用户消息时插入的标记
+TRUNCATION_MARK = "……"
+
+
+def estimate_tokens(text: str) -> int:
+    """本地估算文本的 token 数（按 DeepSeek 分词器的中英文字符比例）"""
+    if not text:
+        return 0
+    wide = sum(map(len, _WIDE_RE.findall(text)))
+    narrow = len(text) - wide - sum(map(len, _SPACE_RE.findall(text)))
+    return int(wide * WIDE_CHAR_TOKENS + narrow * NARROW_CHAR_TOKENS + 0.999)
+
+
+def message_tokens(message: Dict) -> int:
+    """一条消息的估算 token 数（含固定开销）"""
+    return estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+
+
+def format_block(topic: str, content: str) -> str:
+    """一个知识主题在上下文中的文本块"""
+    return f"【{topic}】\n{content}\n\n"
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """截断文本使其不超过 max_tokens，保留开头和结尾"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max(max_tokens - estimate_tokens(TRUNCATION_MARK), 0)
+    keep = int(len(text) * budget / estimate_tokens(text))
+    while keep > 0:
+        head = (keep + 1) // 2
+        tail = keep - head
+        candidate = text[:head] + TRUNCATION_MARK + (text[-tail:] if tail else '')
+        if estimate_tokens(candidate) <= max_tokens:
+            return candidate
+        keep = int(keep * 0.9)
+    return TRUNCATION_MARK
+
+
+class Prompt:
+    """组装好的请求"""
+
+    __slots__ = ('messages', 'prompt_tokens', 'summary', 'history', 'rag_results')
+
+    def __init__(self, messages: List[Dict], prompt_tokens: int, summary: str,
+                 history: List[Dict], rag_results: List[Dict]):
+        self.messages = messages
+        # 本地估算的请求 token 数
+        self.prompt_tokens = prompt_tokens
+        # 实际放入请求的摘要、历史消息与知识
+        self.summary = summary
+        self.history = history
+        self.rag_results = rag_results
+
+    @property
+    def topics(self) -> List[str]:
+        """放入请求的知识主题"""
+        return [result['topic'] for result in self.rag_results]
+
+
+class PromptBuilder:
+    """按 token 预算组装请求消息"""
+
+    def __init__(self, system_prompt: str = SYSTEM_PROMPT, max_prompt_tokens: int = 3000,
+                 max_user_tokens: int = 1000):
+        """
+        Args:
+            system_prompt: 静态系统提示词，始终完整放在最前面
+            max_prompt_tokens: 整个请求的 token 预算
+            max_user_tokens: 用户消息最多占用的 token 数，超出部分被截断
+        """
+        self.system_message = {"role": "system", "content": system_prompt}
+        self.system_tokens = message_tokens(self.system_message)
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_user_tokens = max_user_tokens
+        self._context_tokens = (
+            estimate_tokens(CONTEXT_HEADER + CONTEXT_FOOTER) + MESSAGE_OVERHEAD_TOKENS
+        )
+
+    def build(self, user_message: str, history: List[Dict], rag_results: List[Dict],
+              summary: str = '') -> Prompt:
+        """
+        组装请求消息
+
+        Args:
+            user_message: 本轮用户消息
+            history: 对话历史（按时间顺序，不含已折叠进摘要的消息）
+            rag_results: 检索结果（按相关度排列，可带预先格式化的 block / block_tokens）
+            summary: 此前对话的摘要
+
+        Returns:
+            Prompt: 消息列表、估算 token 数及实际使用的历史与知识
+        """
+        remaining = self.max_prompt_tokens - self.system_tokens
+
+        # 用户消息必须保留，过长时截断
+        user_limit = max(min(self.max_user_tokens, remaining - MESSAGE_OVERHEAD_TOKENS), 1)
+        user_content = truncate_to_tokens(user_message, user_limit)
+        user_tokens = estimate_tokens(user_content) + MESSAGE_OVERHEAD_TOKENS
+        remaining -= user_tokens
+
+        # 摘要放得下时放在系统提示词之后
+        summary_message = None
+        if summary:
+            summary_message = {"role": "system", "content": SUMMARY_HEADER + summary}
+            tokens = message_tokens(summary_message)
+            if tokens <= remaining:
+                remaining -= tokens
+            else:
+                summary_message = None
+
+        # 知识块按相关度依次放入，放不下的跳过
+        blocks = []
+        used_results = []
+        budget = remaining - self._context_tokens
+        for result in rag_results:
+            block, tokens = _result_block(result)
+            if tokens <= budget:
+                blocks.append(block)
+                used_results.append(result)
+                budget -= tokens
+        context_message = None
+        if blocks:
+            context_message = {
+                "role": "system",
+                "content": CONTEXT_HEADER + ''.join(blocks) + CONTEXT_FOOTER
+            }
+            remaining = budget
+
+        # 历史对话从最近的一轮往前保留
+        start = len(history)
+        while start > 0:
+            tokens = message_tokens(history[start - 1])
+            if tokens > remaining:
+                break
+            remaining -= tokens
+            start -= 1
+        # 不以助手回复开头，保持一问一答的结构
+        while start < len(history) and history[start]['role'] == 'assistant':
+            remaining += message_tokens(history[start])
+            start += 1
+        kept_history = history[start:]
+
+        messages = [self.system_message]
+        if summary_message:
+            messages.append(summary_message)
+        messages.extend(kept_history)
+        if context_message:
+            messages.append(context_message)
+        messages.append({"role": "user", "content": user_content})
+
+        return Prompt(
+            messages=messages,
+            prompt_tokens=self.max_prompt_tokens - remaining,
+            summary=summary if summary_message else '',
+            history=kept_history,
+            rag_results=used_results
+        )
+
+
+def _result_block(result: Dict) -> Tuple[str, int]:
+    """检索结果的知识块及其 token 数，优先使用检索时预先计算好的值"""
+    block = result.get('block')
+    if block is None:
+        block = format_block(result['topic'], result['content'])
+        return block, estimate_tokens(block)
+    tokens = result.get('block_tokens')
+    return block, tokens if tokens is not None else estimate_tokens(block)
+
+
+def create_prompt_builder(system_prompt: Optional[str] = None) -> PromptBuilder:
+    """根据环境变量创建请求组装器"""
+    return PromptBuilder(
+        system_prompt=system_prompt or SYSTEM_PROMPT,
+        max_prompt_tokens=int(os.getenv('PROMPT_TOKEN_BUDGET', 3000)),
+        max_user_tokens=int(os.getenv('PROMPT_MAX_USER_TOKENS', 1000))
+    )
@@ -1,64 +1,380 @@
 import json
+import heapq
+import os
 import re
-from typing import List, Dict, Tuple
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+from keyword_index import TopicKeywordIndex
+from bm25_index import BM25Index
+from prompt_builder import CONTEXT_HEADER, format_block, estimate_tokens
+from metrics import stage
+from logger import log
+
+
+class _IndexSnapshot:
+    """某一版本知识库及其索引，创建后不再修改"""
+    
+    __slots__ = ('knowledge_base', 'topics', 'order', 'keyword_index', 'bm25', 'blocks')
+    
+    def __init__(self, knowledge_base, keyword_index=None, bm25=None, topics=None, order=None):
+        self.knowledge_base = knowledge_base
+        # BM25 增量更新后由调用方给出：文档编号对应的主题（已删除的文档留下的空位为 None）
+        # 及主题到编号的映射
+        self.topics = list(knowledge_base.keys()) if topics is None else topics
+        self.order = {topic: i for i, topic in enumerate(self.topics)} if order is None else order
+        self.keyword_index = keyword_index
+        self.bm25 = bm25
+        # {主题: (上下文文本块, token 数)}，首次检索到该主题时生成
+        self.blocks = {}
+    
+    def block(self, topic):
+        """主题的上下文文本块及其 token 数"""
+        cached = self.blocks.get(topic)
+        if cached is None:
+            text = format_block(topic, self.knowledge_base[topic]['content'])
+            cached = self.blocks[topic] = (text, estimate_tokens(text))
+        return cached
+
+
+class RetrievalContext:
+    """
+    会话的检索上下文：最近几轮命中过的主题及其得分
+    
+    每个主题只记下（得分, 最后一次命中的轮次），按轮次差计算衰减后的得分，
+    因此每轮只需更新本轮命中的主题，不必重新检索整段历史。随会话一起保存
+    （见 to_state / from_state），会话过期或被淘汰时一并删除。
+    """
+    
+    __slots__ = ('turn', 'topics')
+    
+    def __init__(self, turn: int = 0, topics: Optional[Dict[str, Tuple[float, int]]] = None):
+        # 已检索的轮数
+        self.turn = turn
+        # {主题: (得分, 最后一次命中的轮次)}
+        self.topics = topics or {}
+    
+    @classmethod
+    def from_state(cls, state) -> 'RetrievalContext':
+        """由会话中保存的状态还原，state 为空时返回新的上下文"""
+        if not state:
+            return cls()
+        turn, entries = state
+        return cls(turn, {topic: (score, last) for topic, score, last in entries})
+    
+    def to_state(self) -> tuple:
+        """可保存在会话中的状态：(轮数, ((主题, 得分, 轮次), ...))，可直接序列化为 JSON"""
+        return self.turn, tuple((topic, score, last) for topic, (score, last) in self.topics.items())
+    
+    def prior(self, decay: float, max_turns: int):
+        """依次产出 (主题, 衰减到下一轮的得分)，超过 max_turns 轮未命中的主题不再计入"""
+        turn = self.turn + 1
+        for topic, (score, last) in self.topics.items():
+            if turn - last <= max_turns:
+                yield topic, score * decay ** (turn - last)
+    
+    def advance(self, matches: Dict[str, float], decay: float, max_turns: int, max_topics: int) -> None:
+        """记入新一轮的命中：只更新命中的主题，再丢弃过期的与得分最低的主题"""
+        turn = self.turn + 1
+        topics = self.topics
+        for topic, score in matches.items():
+            entry = topics.get(topic)
+            if entry is not None:
+                score += entry[0] * decay ** (turn - entry[1])
+            topics[topic] = (score, turn)
+        self.turn = turn
+        
+        for topic in [topic for topic, (_, last) in topics.items() if turn - last >= max_turns]:
+            del topics[topic]
+        if len(topics) > max_topics:
+            kept = heapq.nlargest(max_topics, topics.items(),
+                                  key=lambda item: item[1][0] * decay ** (turn - item[1][1]))
+            self.topics = dict(kept)
+
 
 class RAGSystem:
     """简单的 RAG 检索系统"""
     
-    def __init__(self, knowledge_base_path='knowledge_base.json'):
-        """初始化 RAG 系统"""
-        try:
-            with open(knowledge_base_path, 'r', encoding='utf-8') as f:
-                self.knowledge_base = json.load(f)
-            print(f"✅ 知识库加载成功，包含 {len(self.knowledge_base)} 个主题")
-        except Exception as e:
-            print(f"⚠️ 知识库加载失败: {str(e)}")
-            self.knowledge_base = {}
-    
-    def search(self, query: str, top_k: int = 2) -> List[Dict]:
+    # 可选的检索引擎：关键词匹配 / 中文二元组 BM25（另有 SQLite FTS5，见 kb_store.py）
+    ENGINES = ('keyword', 'bm25')
+    
+    # 会话检索上下文最多保留的主题数
+    CONTEXT_TOPICS = 8
+    
+    def __init__(self, knowledge_base_path='knowledge_base.json', knowledge_base: Optional[Dict] = None,
+                 engine: Optional[str] = None, context_decay: Optional[float] = None,
+                 context_turns: Optional[int] = None):
+        """
+        初始化 RAG 系统
+        
+        Args:
+            knowledge_base_path: 知识库 JSON 文件路径
+            knowledge_base: 直接传入的知识库（提供时忽略文件路径）
+            engine: 检索引擎，'keyword' 或 'bm25'，默认读取环境变量 RAG_ENGINE
+            context_decay: 会话中此前命中的主题每过一轮得分乘以的系数，0 表示只按当前消息
+                检索，默认读取环境变量 RAG_CONTEXT_DECAY
+            context_turns: 此前命中的主题在之后多少轮内参与排序，默认读取环境变量 RAG_CONTEXT_TURNS
+        """
+        self.engine = (engine or os.getenv('RAG_ENGINE', 'keyword')).lower()
+        if self.engine not in self.ENGINES:
+            raise ValueError(f"未知的检索引擎: {self.engine}")
+        self.context_decay = float(os.getenv('RAG_CONTEXT_DECAY', 0.5)) if context_decay is None \
+            else context_decay
+        self.context_turns = int(os.getenv('RAG_CONTEXT_TURNS', 3)) if context_turns is None \
+            else context_turns
+        
+        self.knowledge_base_path = knowledge_base_path
+        self._reload_lock = threading.Lock()
+        
+        if knowledge_base is None:
+            try:
+                knowledge_base = self._load_file()
+                log.info('knowledge_base_loaded', topics=len(knowledge_base))
+            except Exception as e:
+                log.error('knowledge_base_load_failed', error=str(e))
+                knowledge_base = {}
+        
+        self._index = self._build_snapshot(knowledge_base)
+    
+    @property
+    def knowledge_base(self) -> Dict:
+        """当前生效的知识库"""
+        return self._index.knowledge_base
+    
+    def _load_file(self):
+        """读取知识库 JSON 文件"""
+        with open(self.knowledge_base_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def _build_snapshot(self, knowledge_base):
+        """为当前检索引擎完整建立索引"""
+        if self.engine == 'bm25':
+            return _IndexSnapshot(knowledge_base, bm25=BM25Index([
+                self._document_text(data) for data in knowledge_base.values()
+            ]))
+        return _IndexSnapshot(knowledge_base, keyword_index=TopicKeywordIndex({
+            topic: data['keywords'] for topic, data in knowledge_base.items()
+        }))
+    
+    @staticmethod
+    def _document_text(data):
+        """BM25 检索的文档文本：正文与示例问答"""
+        return '\n'.join([data['content']] + data.get('examples', []))
+    
+    def reload(self, knowledge_base: Optional[Dict] = None) -> Dict:
+        """
+        重新加载知识库，只为有变化的主题更新索引
+        
+        新索引建好后整体替换，正在进行的 search 始终使用完整的旧索引或新索引。
+        
+        Args:
+            knowledge_base: 新的知识库，默认重新读取 knowledge_base_path
+            
+        Returns:
+            dict: 新增、删除、修改、未变化的主题数量及耗时
+        """
+        if knowledge_base is None:
+            knowledge_base = self._load_file()
+        
+        with self._reload_lock:
+            start = time.perf_counter()
+            old = self._index
+            old_kb = old.knowledge_base
+            
+            added = [t for t in knowledge_base if t not in old_kb]
+            removed = [t for t in old_kb if t not in knowledge_base]
+            changed = [
+                t for t, data in knowledge_base.items()
+                if t in old_kb and old_kb[t] != data
+            ]
+            
+            if self.engine == 'bm25':
+                snapshot = self._reload_bm25(old, knowledge_base, added, removed, changed)
+            else:
+                snapshot = self._reload_keywords(old, knowledge_base, added, removed, changed)
+            
+            # 引用赋值是原子的，替换后新请求立即使用新索引
+            self._index = snapshot
+            
+            summary = {
+                'topics': len(knowledge_base),
+                'added': len(added),
+                'removed': len(removed),
+                'changed': len(changed),
+                'unchanged': len(knowledge_base) - len(added) - len(changed),
+                'seconds': round(time.perf_counter() - start, 4)
+            }
+        
+        log.info('knowledge_base_reloaded', **summary)
+        return summary
+    
+    def _reload_keywords(self, old, knowledge_base, added, removed, changed):
+        """只更新关键词有变化的主题的倒排表"""
+        old_kb = old.knowledge_base
+        removed_keywords = {t: old_kb[t]['keywords'] for t in removed}
+        added_keywords = {t: knowledge_base[t]['keywords'] for t in added}
+        for t in changed:
+            if old_kb[t]['keywords'] != knowledge_base[t]['keywords']:
+                removed_keywords[t] = old_kb[t]['keywords']
+                added_keywords[t] = knowledge_base[t]['keywords']
+        
+        keyword_index = old.keyword_index
+        if removed_keywords or added_keywords:
+            keyword_index = keyword_index.updated(removed_keywords, added_keywords)
+        return _IndexSnapshot(knowledge_base, keyword_index=keyword_index)
+    
+    def _reload_bm25(self, old, knowledge_base, added, removed, changed):
+        """只为正文或示例有变化的主题更新倒排表，其余文档保持原编号"""
+        old_kb = old.knowledge_base
+        topics = list(old.topics)
+        order = dict(old.order)
+        changes = {}
+        for topic in removed:
+            doc_id = order.pop(topic)
+            changes[doc_id] = None
+            topics[doc_id] = None
+        for topic in changed:
+            old_data, data = old_kb[topic], knowledge_base[topic]
+            if (old_data['content'] != data['content']
+                    or old_data.get('examples', []) != data.get('examples', [])):
+                changes[old.order[topic]] = self._document_text(data)
+        for topic in added:
+            order[topic] = len(topics)
+            changes[len(topics)] = self._document_text(knowledge_base[topic])
+            topics.append(topic)
+        
+        bm25 = old.bm25.updated(changes) if changes else old.bm25
+        if bm25.n_slots < len(topics):
+            # 索引整体重建后去掉了空位，其余文档按原顺序连续编号
+            topics = [topic for topic in topics if topic is not None]
+            order = {topic: i for i, topic in enumerate(topics)}
+        return _IndexSnapshot(knowledge_base, bm25=bm25, topics=topics, order=order)
+    
+    def search(self, query: str, top_k: int = 2, context: Optional[RetrievalContext] = None) -> List[Dict]:
         """
         搜索相关知识
         
         Args:
             query: 用户查询
             top_k: 返回前 k 个结果
+            context: 会话的检索上下文；提供时此前几轮命中的主题按衰减后的得分参与排序，
+                并记入本轮的命中（原地更新）
             
         Returns:
             相关知识列表
         """
+        # 整个查询过程只使用同一个版本的索引
+        index = self._index
+        
+        with stage(f'rag_search_{self.engine}'):
+            if context is not None and self.context_decay > 0:
+                ranked = self._context_search(index, query, top_k, context)
+            elif self.engine == 'bm25':
+                ranked = [(index.topics[doc_id], score) for doc_id, score in index.bm25.search(query, top_k)]
+            else:
+                ranked = self._keyword_search(index, query, top_k)
+        
         results = []
-        query_lower = query.lower()
-        
-        for topic, data in self.knowledge_base.items():
-            score = self._calculate_score(query_lower, data['keywords'])
-            if score > 0:
-                results.append({
-                    'topic': topic,
-                    'score': score,
-                    'content': data['content'],
-                    'examples': data.get('examples', [])
-                })
-        
-        # 按分数排序
-        results.sort(key=lambda x: x['score'], reverse=True)
-        
-        return results[:top_k]
-    
-    def _calculate_score(self, query: str, keywords: List[str]) -> float:
-        """计算查询和关键词的匹配分数"""
-        score = 0
-        for keyword in keywords:
-            if keyword in query:
-                score += 1
-        return score
+        for topic, score in ranked:
+            data = index.knowledge_base[topic]
+            block, block_tokens = index.block(topic)
+            results.append({
+                'topic': topic,
+                'score': score,
+                'content': data['content'],
+                'examples': data.get('examples', []),
+                'block': block,
+                'block_tokens': block_tokens
+            })
+        
+        return results
+    
+    def _keyword_search(self, index: _IndexSnapshot, query: str, top_k: int) -> List[Tuple[str, float]]:
+        """关键词匹配打分：只扫描一遍查询文本，耗时与知识库大小无关"""
+        scores = index.keyword_index.match(query.lower())
+        
+        # 按分数排序，同分时保持知识库中的顺序
+        order = index.order
+        return heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], order[item[0]]))
+    
+    def _context_search(self, index: _IndexSnapshot, query: str, top_k: int,
+                        context: RetrievalContext) -> List[Tuple[str, float]]:
+        """当前消息的命中得分加上会话中此前命中主题衰减后的得分"""
+        if self.engine == 'bm25':
+            matches = {index.topics[doc_id]: score
+                       for doc_id, score in index.bm25.search(query, max(top_k, self.CONTEXT_TOPICS))}
+        else:
+            matches = index.keyword_index.match(query.lower())
+        
+        scores = dict(matches)
+        for topic, prior in context.prior(self.context_decay, self.context_turns):
+            # 重新加载后已删除的主题不再返回
+            if topic in index.order:
+                scores[topic] = scores.get(topic, 0) + prior
+        context.advance(matches, self.context_decay, self.context_turns, self.CONTEXT_TOPICS)
+        
+        order = index.order
+        return heapq.nsmallest(top_k, scores.items(), key=lambda item: (-item[1], order[item[0]]))
     
     def format_context(self, search_results: List[Dict]) -> str:
         """格式化检索结果为上下文"""
         if not search_results:
             return ""
         
-        context = "以下是相关的专业知识，请参考：\n\n"
-        for i, result in enumerate(search_results, 1):
-            context += f"【{result['topic']}】\n{result['content']}\n\n"
-        
-        return context
\ No newline at end of file
+        return CONTEXT_HEADER + ''.join(
+            result.get('block') or format_block(result['topic'], result['content'])
+            for result in search_results
+        )
+
+
+def create_rag_system():
+    """根据环境变量 RAG_ENGINE 创建知识检索：keyword / bm25 载入 knowledge_base.json，fts 使用 SQLite 数据库"""
+    if os.getenv('RAG_ENGINE', 'keyword').lower() == 'fts':
+        from kb_store import create_fts_knowledge_base
+        return create_fts_knowledge_base()
+    return RAGSystem()
+
+
+class KnowledgeBaseWatcher:
+    """轮询知识库文件的修改时间，变化后自动重新加载"""
+    
+    def __init__(self, rag: RAGSystem, interval: float = 5.0):
+        """
+        Args:
+            rag: 需要热加载的 RAG 系统
+            interval: 轮询间隔（秒）
+        """
+        self.rag = rag
+        self.interval = interval
+        self._stop = threading.Event()
+        self._mtime = self._current_mtime()
+        self._thread = None
+    
+    def _current_mtime(self):
+        try:
+            return os.stat(self.rag.knowledge_base_path).st_mtime_ns
+        except OSError:
+            return None
+    
+    def start(self):
+        """启动后台轮询线程（fork 后的子进程中再次调用会重新启动）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='kb-watcher', daemon=True)
+            self._thread.start()
+        return self
+    
+    def stop(self):
+        """停止轮询"""
+        self._stop.set()
+    
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            mtime = self._current_mtime()
+            if mtime is None or mtime == self._mtime:
+                continue
+            try:
+                self.rag.reload()
+                self._mtime = mtime
+            except Exception as e:
+                # 文件可能正在写入，下次轮询再试
+                log.warning('knowledge_base_reload_failed', error=str(e))
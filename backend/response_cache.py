@@ -0,0 +1,233 @@
+"""
+LLM 回复缓存
+
+大量对话以几乎相同的问题开场（如“怎么表白”），这类请求没有或只有很短的
+历史，回复只取决于消息本身、检索到的知识主题和模型参数。缓存以这些内容
+的规范化形式为键，内存层为 LRU + TTL，可选的 SQLite 磁盘层在重启后依然有效。
+"""
+
+import os
+import re
+import asyncio
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# 规范化时去掉的标点与空白（全角字符先经 NFKC 转为半角）
+_PUNCTUATION_RE = re.compile(r'[\s!"#$%&\'()*+,\-./:;<=>?@\[\\\]^_`{|}~。，、；：？！…—·“”‘’《》【】（）～]+')
+
+
+def normalize_message(message: str) -> str:
+    """规范化消息：统一全角半角、小写、去除标点和空白"""
+    message = unicodedata.normalize('NFKC', message).lower()
+    return _PUNCTUATION_RE.sub('', message)
+
+
+class ResponseCache:
+    """回复缓存：内存 LRU + TTL，可选 SQLite 磁盘层"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600,
+                 disk_path: Optional[str] = None, max_history: int = 2,
+                 purge_interval: float = 60):
+        """
+        Args:
+            max_entries: 内存中最多保留的条目数
+            ttl: 条目有效期（秒）
+            disk_path: 磁盘层 SQLite 文件路径，为 None 时只使用内存
+            max_history: 历史消息不超过此条数的请求才使用缓存
+            purge_interval: 写入时清理磁盘层过期条目的最小间隔（秒）
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.max_history = max_history
+        self.purge_interval = purge_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._last_purge = 0.0
+        self._purged = 0
+
+        if disk_path:
+            conn = self._conn()
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE INDEX IF NOT EXISTS idx_responses_created_at ON responses (created_at)'
+            )
+
+    def _conn(self):
+        """每个线程使用独立的磁盘层连接（fork 出的子进程不沿用父进程的连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.disk_path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def make_key(self, message: str, topics: List[str], history: List[Dict],
+                 model: str, params: Dict) -> Optional[str]:
+        """
+        计算缓存键，历史过长的请求不缓存
+
+        Args:
+            message: 用户消息
+            topics: RAG 检索到的知识主题
+            history: 本次请求携带的对话历史
+            model: 模型名称
+            params: 采样参数
+
+        Returns:
+            str | None: 缓存键，不可缓存时为 None
+        """
+        if len(history) > self.max_history:
+            return None
+        payload = json.dumps({
+            'message': normalize_message(message),
+            'topics': topics,
+            'history': [[m['role'], normalize_message(m['content'])] for m in history],
+            'model': model,
+            'params': params
+        }, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        """查找缓存，未命中或已过期返回 None"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self.disk_path:
+            value = self._get_disk(key, now)
+        if value is None:
+            self._count_miss()
+        return value
+
+    async def aget(self, key: str) -> Optional[Dict]:
+        """查找缓存（异步版本），磁盘层在线程中读取，不阻塞事件循环"""
+        now = time.time()
+        value = self._get_memory(key, now)
+        if value is None and self.disk_path:
+            value = await asyncio.to_thread(self._get_disk, key, now)
+        if value is None:
+            self._count_miss()
+        return value
+
+    def _get_memory(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+        return None
+
+    def _get_disk(self, key, now):
+        row = self._conn().execute(
+            'SELECT value, created_at FROM responses WHERE key = ? AND created_at >= ?',
+            (key, now - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        value = json.loads(row[0])
+        with self._lock:
+            self._disk_hits += 1
+            self._put(key, value, row[1])
+        return value
+
+    def _count_miss(self):
+        with self._lock:
+            self._misses += 1
+
+    def set(self, key: str, value: Dict) -> None:
+        """写入缓存（同时写入磁盘层，并定期清理磁盘层中的过期条目）"""
+        now = time.time()
+        purge = self._set_memory(key, value, now)
+        if self.disk_path:
+            self._set_disk(key, value, now, purge)
+
+    async def aset(self, key: str, value: Dict) -> None:
+        """写入缓存（异步版本），磁盘层的写入与清理在线程中进行"""
+        now = time.time()
+        purge = self._set_memory(key, value, now)
+        if self.disk_path:
+            await asyncio.to_thread(self._set_disk, key, value, now, purge)
+
+    def _set_memory(self, key, value, now):
+        """写入内存层，返回本次是否顺带清理磁盘层"""
+        with self._lock:
+            self._put(key, value, now)
+            purge = self.disk_path and now - self._last_purge >= self.purge_interval
+            if purge:
+                self._last_purge = now
+        return purge
+
+    def _set_disk(self, key, value, now, purge):
+        self._conn().execute(
+            'INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)',
+            (key, json.dumps(value, ensure_ascii=False), now)
+        )
+        if purge:
+            self.purge_expired()
+
+    def _put(self, key, value, created_at):
+        """写入内存层并按 LRU 淘汰（调用方需持有锁）"""
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def purge_expired(self) -> int:
+        """删除磁盘层中已过期的条目，返回删除数量"""
+        if not self.disk_path:
+            return 0
+        purged = self._conn().execute(
+            'DELETE FROM responses WHERE created_at < ?', (time.time() - self.ttl,)
+        ).rowcount
+        with self._lock:
+            self._purged += purged
+        return purged
+
+    def stats(self) -> Dict:
+        """命中率等统计信息"""
+        with self._lock:
+            lookups = self._hits + self._disk_hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'disk_purged': self._purged,
+                'hit_rate': round((self._hits + self._disk_hits) / lookups, 4) if lookups else 0.0
+            }
+
+
+def create_response_cache():
+    """根据环境变量创建回复缓存，RESPONSE_CACHE_SIZE=0 时关闭"""
+    max_entries = int(os.getenv('RESPONSE_CACHE_SIZE', 10000))
+    if max_entries <= 0:
+        return None
+    return ResponseCache(
+        max_entries=max_entries,
+        ttl=float(os.getenv('RESPONSE_CACHE_TTL', 3600)),
+        disk_path=os.getenv('RESPONSE_CACHE_PATH') or None,
+        max_history=int(os.getenv('RESPONSE_CACHE_MAX_HISTORY', 2))
+    )
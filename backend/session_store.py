@@ -0,0 +1,556 @@
+"""
+会话存储
+
+提供两种后端：
+- MemorySessionStore: 进程内 LRU + TTL，带内存上限与淘汰统计
+- SQLiteSessionStore: 基于 SQLite（WAL 模式），同一主机上的多个 worker 进程共享
+
+两者都只保存最近 window 条消息，读取时也只返回所需的历史窗口。
+更早的对话可由 ConversationSummarizer 折叠为摘要，与会话一起保存。
+会话的检索上下文（见 rag_system.RetrievalContext）同样随会话保存与淘汰。
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from prompts import DEMO_RESPONSES
+from utils import get_crisis_response
+
+
+class SessionStore:
+    """会话存储接口"""
+
+    def __init__(self, window: int = 20, ttl: float = 86400):
+        """
+        Args:
+            window: 每个会话保留的最大消息条数
+            ttl: 会话闲置多少秒后过期
+        """
+        self.window = window
+        self.ttl = ttl
+
+    def create(self, session_id: str) -> None:
+        """创建空会话（已存在则重置）"""
+        raise NotImplementedError
+
+    def exists(self, session_id: str) -> bool:
+        """会话是否存在且未过期"""
+        raise NotImplementedError
+
+    def get_history(self, session_id: str, limit: Optional[int] = None) -> List[Dict]:
+        """返回最近 limit 条消息（按时间顺序），会话不存在时返回空列表"""
+        raise NotImplementedError
+
+    def get_context(self, session_id: str, limit: Optional[int] = None) -> Tuple[str, List[Dict]]:
+        """返回会话摘要（无摘要时为空字符串）与摘要之后的最近 limit 条消息"""
+        raise NotImplementedError
+
+    def get_unsummarized(self, session_id: str) -> Tuple[str, List[Dict], int]:
+        """返回当前摘要、尚未折叠进摘要的消息，以及最后一条消息的序号"""
+        raise NotImplementedError
+
+    def set_summary(self, session_id: str, summary: str, upto_seq: int) -> bool:
+        """保存覆盖到序号 upto_seq（含）为止的摘要；已有更新的摘要时不写入，返回是否写入"""
+        raise NotImplementedError
+
+    def get_retrieval(self, session_id: str) -> Optional[tuple]:
+        """返回会话的检索上下文状态（RetrievalContext.to_state()），没有时返回 None"""
+        raise NotImplementedError
+
+    def append_turn(self, session_id: str, user_message: str, reply: str,
+                    retrieval: Optional[tuple] = None) -> None:
+        """
+        追加一轮对话并裁剪到窗口大小，会话不存在时自动创建
+
+        retrieval 为本轮检索后的检索上下文状态，为 None 时保留原有状态。
+        """
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> bool:
+        """删除会话，返回会话是否存在"""
+        raise NotImplementedError
+
+    def stats(self) -> Dict:
+        """返回存储统计信息"""
+        raise NotImplementedError
+
+
+# 固定回复（演示模式模板与危机干预回复）在会话中只保存编号，不重复保存全文
+CANNED_REPLIES = tuple(DEMO_RESPONSES.values()) + (get_crisis_response(),)
+_CANNED_IDS = {reply: index for index, reply in enumerate(CANNED_REPLIES)}
+
+
+class _Session:
+    """
+    内存中的单个会话
+
+    最近 window 条消息的内容存放在定长环形数组中（序号为 seq 的消息位于
+    (seq - 1) % window），角色由序号的奇偶决定（用户消息与回复总是成对追加），
+    固定回复以 CANNED_REPLIES 中的编号代替全文。读取时再还原为消息字典。
+    """
+
+    __slots__ = ('contents', 'size', 'touched', 'seq', 'summary', 'summary_seq', 'retrieval')
+
+    def __init__(self):
+        # 未满 window 条时按需增长，之后循环覆盖最旧的消息
+        self.contents = []
+        self.size = 0
+        self.touched = time.monotonic()
+        # 已追加的消息总数（即最后一条消息的序号）
+        self.seq = 0
+        # 覆盖到序号 summary_seq 为止的对话摘要
+        self.summary = ''
+        self.summary_seq = 0
+        # 检索上下文状态：(轮数, ((主题, 得分, 轮次), ...))
+        self.retrieval = None
+
+    def append(self, content, window):
+        """追加一条消息，返回内容占用的字节数变化"""
+        value = _CANNED_IDS.get(content, content)
+        size = _content_size(value)
+        contents = self.contents
+        if len(contents) < window:
+            contents.append(value)
+        else:
+            index = self.seq % window
+            size -= _content_size(contents[index])
+            contents[index] = value
+        self.seq += 1
+        return size
+
+    def recent(self, limit=None, since=0):
+        """序号大于 since 的最近 limit 条消息"""
+        contents = self.contents
+        count = min(self.seq - since, len(contents))
+        if limit is not None:
+            count = min(limit, count)
+        window = len(contents)
+        messages = []
+        for seq in range(self.seq - count + 1, self.seq + 1):
+            value = contents[(seq - 1) % window]
+            messages.append({
+                'role': 'user' if seq % 2 else 'assistant',
+                'content': CANNED_REPLIES[value] if value.__class__ is int else value
+            })
+        return messages
+
+
+def _content_size(value):
+    """估算一条消息内容占用的内存（字节），固定回复的编号不额外占用"""
+    return 0 if value.__class__ is int else sys.getsizeof(value)
+
+
+def _retrieval_size(state):
+    """估算检索上下文状态占用的内存（字节），主题名与知识库共用，不计入"""
+    if state is None:
+        return 0
+    entries = state[1]
+    return sys.getsizeof(state) + sys.getsizeof(entries) + sum(
+        sys.getsizeof(entry) + sys.getsizeof(entry[1]) for entry in entries
+    )
+
+
+class MemorySessionStore(SessionStore):
+    """进程内 LRU + TTL 会话存储"""
+
+    def __init__(self, window: int = 20, ttl: float = 86400,
+                 max_sessions: int = 100000, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Args:
+            window: 每个会话保留的最大消息条数
+            ttl: 会话闲置多少秒后过期
+            max_sessions: 最多保留的会话数
+            max_bytes: 所有会话内容的内存上限（字节，估算值）
+        """
+        super().__init__(window, ttl)
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self._sessions = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._evictions = {'ttl': 0, 'lru': 0, 'memory': 0}
+        self._hits = 0
+        self._misses = 0
+
+    def create(self, session_id):
+        with self._lock:
+            self._remove(session_id)
+            self._sessions[session_id] = _Session()
+            self._evict()
+
+    def exists(self, session_id):
+        with self._lock:
+            return self._lookup(session_id) is not None
+
+    def get_history(self, session_id, limit=None):
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is None:
+                self._misses += 1
+                return []
+            self._hits += 1
+            return session.recent(limit)
+
+    def get_context(self, session_id, limit=None):
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is None:
+                self._misses += 1
+                return '', []
+            self._hits += 1
+            return session.summary, session.recent(limit, since=session.summary_seq)
+
+    def get_unsummarized(self, session_id):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return '', [], 0
+            return session.summary, session.recent(since=session.summary_seq), session.seq
+
+    def set_summary(self, session_id, summary, upto_seq):
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or upto_seq <= session.summary_seq or upto_seq > session.seq:
+                return False
+            delta = sys.getsizeof(summary) - sys.getsizeof(session.summary)
+            session.summary = summary
+            session.summary_seq = upto_seq
+            session.size += delta
+            self._bytes += delta
+            self._evict()
+            return True
+
+    def get_retrieval(self, session_id):
+        with self._lock:
+            session = self._lookup(session_id)
+            return None if session is None else session.retrieval
+
+    def append_turn(self, session_id, user_message, reply, retrieval=None):
+        with self._lock:
+            session = self._lookup(session_id)
+            if session is None:
+                session = _Session()
+                self._sessions[session_id] = session
+
+            size = session.append(user_message, self.window) + session.append(reply, self.window)
+            if retrieval is not None:
+                size += _retrieval_size(retrieval) - _retrieval_size(session.retrieval)
+                session.retrieval = retrieval
+            session.size += size
+            self._bytes += size
+            self._evict()
+
+    def delete(self, session_id):
+        with self._lock:
+            return self._remove(session_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'sessions': len(self._sessions),
+                'bytes': self._bytes,
+                'max_sessions': self.max_sessions,
+                'max_bytes': self.max_bytes,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': dict(self._evictions)
+            }
+
+    def _lookup(self, session_id):
+        """查找会话并刷新 LRU 顺序，过期的会话会被删除（调用方需持有锁）"""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = time.monotonic()
+        if now - session.touched > self.ttl:
+            self._remove(session_id)
+            self._evictions['ttl'] += 1
+            return None
+        session.touched = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _remove(self, session_id):
+        """删除会话并更新内存统计（调用方需持有锁）"""
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self._bytes -= session.size
+        return True
+
+    def _evict(self):
+        """按过期、数量上限、内存上限依次淘汰最久未使用的会话（调用方需持有锁）"""
+        now = time.monotonic()
+        # OrderedDict 按最近访问排序，过期会话总在最前面
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.touched <= self.ttl:
+                break
+            self._remove(session_id)
+            self._evictions['ttl'] += 1
+
+        while len(self._sessions) > self.max_sessions:
+            self._remove(next(iter(self._sessions)))
+            self._evictions['lru'] += 1
+
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            self._remove(next(iter(self._sessions)))
+            self._evictions['memory'] += 1
+
+
+class SQLiteSessionStore(SessionStore):
+    """基于 SQLite（WAL 模式）的会话存储，可被同一主机上的多个进程共享"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        updated_at REAL NOT NULL,
+        summary TEXT NOT NULL DEFAULT '',
+        summary_seq INTEGER NOT NULL DEFAULT 0,
+        retrieval TEXT NOT NULL DEFAULT ''
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_updated_at ON sessions (updated_at);
+    CREATE TABLE IF NOT EXISTS messages (
+        session_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (session_id, seq)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str = 'sessions.db', window: int = 20, ttl: float = 86400,
+                 purge_interval: float = 60):
+        """
+        Args:
+            path: 数据库文件路径
+            window: 每个会话保留的最大消息条数
+            ttl: 会话闲置多少秒后过期
+            purge_interval: 清理过期会话的最小间隔（秒）
+        """
+        super().__init__(window, ttl)
+        self.path = path
+        self.purge_interval = purge_interval
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self._purged = 0
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        # 旧版本创建的数据库没有摘要列
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(sessions)')}
+        if 'summary' not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN summary TEXT NOT NULL DEFAULT ''")
+            conn.execute('ALTER TABLE sessions ADD COLUMN summary_seq INTEGER NOT NULL DEFAULT 0')
+        if 'retrieval' not in columns:
+            conn.execute("ALTER TABLE sessions ADD COLUMN retrieval TEXT NOT NULL DEFAULT ''")
+
+    def _conn(self):
+        """每个线程使用独立的连接（fork 出的子进程不沿用父进程的连接）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def create(self, session_id):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+            conn.execute(
+                'INSERT OR REPLACE INTO sessions (id, updated_at) VALUES (?, ?)',
+                (session_id, time.time())
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def exists(self, session_id):
+        row = self._conn().execute(
+            'SELECT 1 FROM sessions WHERE id = ? AND updated_at >= ?',
+            (session_id, time.time() - self.ttl)
+        ).fetchone()
+        return row is not None
+
+    def get_history(self, session_id, limit=None):
+        limit = self.window if limit is None else min(limit, self.window)
+        rows = self._conn().execute(
+            'SELECT m.role, m.content FROM messages m JOIN sessions s ON s.id = m.session_id '
+            'WHERE m.session_id = ? AND s.updated_at >= ? '
+            'ORDER BY m.seq DESC LIMIT ?',
+            (session_id, time.time() - self.ttl, limit)
+        ).fetchall()
+        return [{'role': role, 'content': content} for role, content in reversed(rows)]
+
+    def get_context(self, session_id, limit=None):
+        limit = self.window if limit is None else min(limit, self.window)
+        conn = self._conn()
+        # 摘要与消息在同一个读事务中读取
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute(
+                'SELECT summary, summary_seq FROM sessions WHERE id = ? AND updated_at >= ?',
+                (session_id, time.time() - self.ttl)
+            ).fetchone()
+            if row is None:
+                return '', []
+            rows = conn.execute(
+                'SELECT role, content FROM messages WHERE session_id = ? AND seq > ? '
+                'ORDER BY seq DESC LIMIT ?',
+                (session_id, row[1], limit)
+            ).fetchall()
+        finally:
+            conn.execute('COMMIT')
+        return row[0], [{'role': role, 'content': content} for role, content in reversed(rows)]
+
+    def get_unsummarized(self, session_id):
+        conn = self._conn()
+        conn.execute('BEGIN')
+        try:
+            row = conn.execute(
+                'SELECT summary, summary_seq FROM sessions WHERE id = ?', (session_id,)
+            ).fetchone()
+            if row is None:
+                return '', [], 0
+            rows = conn.execute(
+                'SELECT seq, role, content FROM messages WHERE session_id = ? AND seq > ? '
+                'ORDER BY seq',
+                (session_id, row[1])
+            ).fetchall()
+        finally:
+            conn.execute('COMMIT')
+        last_seq = rows[-1][0] if rows else row[1]
+        return row[0], [{'role': role, 'content': content} for _, role, content in rows], last_seq
+
+    def set_summary(self, session_id, summary, upto_seq):
+        return self._conn().execute(
+            'UPDATE sessions SET summary = ?, summary_seq = ? WHERE id = ? AND summary_seq < ? '
+            'AND EXISTS (SELECT 1 FROM messages WHERE session_id = ? AND seq >= ?)',
+            (summary, upto_seq, session_id, upto_seq, session_id, upto_seq)
+        ).rowcount > 0
+
+    def get_retrieval(self, session_id):
+        row = self._conn().execute(
+            'SELECT retrieval FROM sessions WHERE id = ? AND updated_at >= ?',
+            (session_id, time.time() - self.ttl)
+        ).fetchone()
+        return json.loads(row[0]) if row and row[0] else None
+
+    def append_turn(self, session_id, user_message, reply, retrieval=None):
+        now = time.time()
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT updated_at FROM sessions WHERE id = ?', (session_id,)
+            ).fetchone()
+            if row is not None and row[0] < now - self.ttl:
+                # 已过期的会话重新开始
+                conn.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+                conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+            # 保留已有的摘要与检索上下文，只更新时间
+            conn.execute(
+                'INSERT INTO sessions (id, updated_at) VALUES (?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET updated_at = excluded.updated_at',
+                (session_id, now)
+            )
+            if retrieval is not None:
+                conn.execute(
+                    'UPDATE sessions SET retrieval = ? WHERE id = ?',
+                    (json.dumps(retrieval, ensure_ascii=False, separators=(',', ':')), session_id)
+                )
+            seq = conn.execute(
+                'SELECT COALESCE(MAX(seq), 0) FROM messages WHERE session_id = ?',
+                (session_id,)
+            ).fetchone()[0]
+            conn.executemany(
+                'INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)',
+                [(session_id, seq + 1, 'user', user_message),
+                 (session_id, seq + 2, 'assistant', reply)]
+            )
+            conn.execute(
+                'DELETE FROM messages WHERE session_id = ? AND seq <= ?',
+                (session_id, seq + 2 - self.window)
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        self._maybe_purge(now)
+
+    def delete(self, session_id):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM messages WHERE session_id = ?', (session_id,))
+            deleted = conn.execute('DELETE FROM sessions WHERE id = ?', (session_id,)).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return deleted > 0
+
+    def stats(self):
+        conn = self._conn()
+        return {
+            'backend': 'sqlite',
+            'path': self.path,
+            'sessions': conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0],
+            'messages': conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0],
+            'evictions': {'ttl': self._purged}
+        }
+
+    def _maybe_purge(self, now):
+        """定期删除过期会话"""
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        cutoff = now - self.ttl
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'DELETE FROM messages WHERE session_id IN '
+                '(SELECT id FROM sessions WHERE updated_at < ?)', (cutoff,)
+            )
+            self._purged += conn.execute(
+                'DELETE FROM sessions WHERE updated_at < ?', (cutoff,)
+            ).rowcount
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+
+def create_session_store():
+    """根据环境变量创建会话存储"""
+    backend = os.getenv('SESSION_BACKEND', 'memory').lower()
+    window = int(os.getenv('SESSION_HISTORY_WINDOW', 20))
+    ttl = float(os.getenv('SESSION_TTL', 86400))
+
+    if backend == 'sqlite':
+        return SQLiteSessionStore(
+            path=os.getenv('SESSION_DB_PATH', 'sessions.db'),
+            window=window,
+            ttl=ttl
+        )
+
+    return MemorySessionStore(
+        window=window,
+        ttl=ttl,
+        max_sessions=int(os.getenv('SESSION_MAX_SESSIONS', 100000)),
+        max_bytes=int(os.getenv('SESSION_MAX_BYTES', 256 * 1024 * 1024))
+    )
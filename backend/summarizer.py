@@ -0,0 +1,123 @@
+"""
+对话摘要
+
+长对话每轮都要重发最近的历史消息，更早的内容则被丢弃。会话中尚未摘要的
+消息达到 trigger 条后，后台线程把较早的消息连同已有摘要一起交给模型压缩成
+新的摘要，与会话一起保存，只保留最近 keep 条原始消息。之后的请求以摘要
+代替这些历史，请求路径上只有一次入队操作，不增加延迟。
+"""
+
+import os
+import queue
+import threading
+from typing import Callable, Dict, List, Optional
+
+from logger import log
+from session_store import SessionStore
+
+# summarize(已有摘要, 待折叠的消息) -> 新摘要
+SummarizeFn = Callable[[str, List[Dict]], str]
+
+
+class ConversationSummarizer:
+    """后台对话摘要线程"""
+
+    def __init__(self, session_store: SessionStore, summarize: SummarizeFn,
+                 trigger: int = 10, keep: int = 4, max_pending: int = 10000):
+        """
+        Args:
+            session_store: 会话存储
+            summarize: 生成摘要的函数，参数为已有摘要与待折叠的消息
+            trigger: 尚未摘要的消息达到此条数时生成摘要
+            keep: 生成摘要后保留的最近原始消息条数（取偶数以保持一问一答）
+            max_pending: 等待摘要的会话数上限，超出时丢弃通知
+        """
+        if keep >= trigger:
+            raise ValueError("keep 必须小于 trigger")
+        self.session_store = session_store
+        self.summarize = summarize
+        self.trigger = trigger
+        self.keep = keep
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {'summarized': 0, 'skipped': 0, 'failed': 0, 'dropped': 0}
+
+    def start(self) -> 'ConversationSummarizer':
+        """启动后台线程（fork 后的子进程中再次调用会重新启动）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='summarizer', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """处理完已入队的会话后停止后台线程"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def notify(self, session_id: str) -> None:
+        """会话追加了新的一轮对话（请求路径上调用，只做入队）"""
+        with self._lock:
+            if session_id in self._pending:
+                return
+            try:
+                self._queue.put_nowait(session_id)
+            except queue.Full:
+                self._stats['dropped'] += 1
+                return
+            self._pending.add(session_id)
+
+    def join(self) -> None:
+        """等待已入队的会话全部处理完"""
+        self._queue.join()
+
+    def summarize_session(self, session_id: str) -> bool:
+        """需要时为会话生成摘要，返回是否写入了新摘要"""
+        summary, messages, last_seq = self.session_store.get_unsummarized(session_id)
+        if len(messages) < self.trigger:
+            return False
+
+        folded = messages[:len(messages) - self.keep]
+        new_summary = self.summarize(summary, folded).strip()
+        if not new_summary:
+            return False
+        return self.session_store.set_summary(session_id, new_summary, last_seq - self.keep)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._stats, pending=len(self._pending))
+
+    def _run(self):
+        while True:
+            session_id = self._queue.get()
+            try:
+                if session_id is None:
+                    return
+                with self._lock:
+                    self._pending.discard(session_id)
+                try:
+                    result = 'summarized' if self.summarize_session(session_id) else 'skipped'
+                except Exception as e:
+                    log.warning('summarize_failed', session_id=session_id, error=str(e))
+                    result = 'failed'
+                with self._lock:
+                    self._stats[result] += 1
+            finally:
+                self._queue.task_done()
+
+
+def create_summarizer(session_store: SessionStore,
+                      summarize: SummarizeFn) -> Optional[ConversationSummarizer]:
+    """根据环境变量创建并启动摘要线程，SUMMARY_TRIGGER_MESSAGES=0 时关闭"""
+    trigger = int(os.getenv('SUMMARY_TRIGGER_MESSAGES', 10))
+    if trigger <= 0:
+        return None
+    return ConversationSummarizer(
+        session_store,
+        summarize,
+        trigger=trigger,
+        keep=int(os.getenv('SUMMARY_KEEP_MESSAGES', 4))
+    ).start()
@@ -0,0 +1,23 @@
+"""
+测试公共设置
+
+在导入任何服务模块之前固定环境变量：使用内存会话存储、关闭限流与回复缓存，
+模型地址指向本机不存在的端口，测试中的模型调用全部由桩函数代替。
+"""
+
+import os
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.update({
+    'OPENAI_API_KEY': 'sk-test',
+    'OPENAI_BASE_URL': 'http://127.0.0.1:9/v1',
+    'SESSION_BACKEND': 'memory',
+    'SESSION_RATE_LIMIT': '0',
+    'IP_RATE_LIMIT': '0',
+    'RESPONSE_CACHE_SIZE': '0',
+    'SUMMARY_TRIGGER_MESSAGES': '0',
+    'LOG_LEVEL': 'error'
+})
@@ -0,0 +1,91 @@
+"""/api/chat/stream：用桩函数代替模型的流式输出，检查 SSE 事件顺序与 done 事件的数据"""
+
+import json
+
+import openai
+import pytest
+from openai.openai_object import OpenAIObject
+
+import app as app_module
+
+
+def _chunk(content=None, usage=None):
+    """与 openai 0.28 流式分片结构相同的对象"""
+    data = {'choices': [] if content is None else [{'index': 0, 'delta': {'content': content}}]}
+    if usage:
+        data['usage'] = usage
+    return OpenAIObject.construct_from(data)
+
+
+def _parse_sse(body):
+    """把 SSE 响应体解析为 [(事件, 数据)]"""
+    events = []
+    for message in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in message.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+@pytest.fixture
+def stream_llm(monkeypatch):
+    """让 openai.ChatCompletion.create 依次产出给定的分片，并记录调用参数"""
+    calls = []
+
+    def install(chunks):
+        def create(**params):
+            calls.append(params)
+            return iter(chunks)
+        monkeypatch.setattr(openai.ChatCompletion, 'create', create)
+        return calls
+    return install
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def test_stream_event_order_and_done_payload(client, stream_llm):
+    usage = {'prompt_tokens': 120, 'completion_tokens': 8, 'total_tokens': 128}
+    calls = stream_llm([_chunk('你好，'), _chunk('我在听。'), _chunk(usage=usage)])
+
+    response = client.post('/api/chat/stream', json={'message': '最近压力好大', 'session_id': 'sse-1'})
+
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = _parse_sse(response.get_data(as_text=True))
+    assert [event for event, _ in events] == ['meta', 'delta', 'delta', 'done']
+    assert [payload['content'] for event, payload in events if event == 'delta'] == ['你好，', '我在听。']
+
+    meta, done = events[0][1], events[-1][1]
+    assert done == {
+        'message': '你好，我在听。',
+        'emotion': meta['emotion'],
+        'session_id': 'sse-1',
+        'cached': False,
+        'prompt_tokens': 120,
+        'tokens_used': 128
+    }
+    assert calls[0]['stream'] is True
+    assert calls[0]['messages'][-1] == {'role': 'user', 'content': '最近压力好大'}
+
+    # 回复完整生成后才写入会话历史
+    _, history = app_module.session_store.get_context('sse-1', limit=10)
+    assert history == [
+        {'role': 'user', 'content': '最近压力好大'},
+        {'role': 'assistant', 'content': '你好，我在听。'}
+    ]
+
+
+def test_stream_without_usage_reports_zero_tokens(client, stream_llm):
+    stream_llm([_chunk('谢谢你告诉我。')])
+
+    response = client.post('/api/chat/stream', json={'message': '我有点难过', 'session_id': 'sse-2'})
+
+    events = _parse_sse(response.get_data(as_text=True))
+    event, done = events[-1]
+    assert event == 'done'
+    assert done['message'] == '谢谢你告诉我。'
+    # 与非流式接口一致：没有用量信息时为 0
+    assert done['tokens_used'] == 0
+    assert done['prompt_tokens'] > 0
@@ -0,0 +1,16 @@
+"""批量语言检测：与逐条检测结果一致，单独的代理对字符不会导致整批失败"""
+
+import app as app_module
+
+
+def test_batch_detect_accepts_lone_surrogates():
+    texts = ['你好\ud800世界', 'hello \udfff', '\ud83d', '我今天很开心', 'I feel fine']
+    client = app_module.app.test_client()
+
+    # 请求体中的 \ud800 等转义经 JSON 解码后是单独的代理对字符
+    response = client.post('/api/translate/detect/batch', json={'texts': texts})
+
+    assert response.status_code == 200
+    service = app_module.get_translation_service()
+    assert response.get_json()['detected_languages'] == [service.detect_language(text) for text in texts]
+    assert response.get_json()['detected_languages'][:2] == ['zh-CN', 'en']
@@ -0,0 +1,163 @@
+"""模型调用容错：熔断器状态切换、总截止时间，以及熔断与取消时的并发名额"""
+
+import asyncio
+import threading
+import time
+from contextlib import suppress
+
+import openai
+import pytest
+from openai.openai_object import OpenAIObject
+
+import http_pool
+from admission import ConcurrencyLimiter
+from counselor import EmotionalCounselor
+from llm_client import CircuitBreaker, CircuitOpenError, LLMClient, LLMTimeout
+
+
+def _reply(content):
+    return OpenAIObject.construct_from({
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}}],
+        'usage': {'prompt_tokens': 1, 'total_tokens': 2}
+    })
+
+
+def test_circuit_breaker_opens_and_half_opens():
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=0.05)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() is False
+
+    time.sleep(0.06)
+    # 只检查时不占用探测名额
+    assert breaker.allow(trial=False) is True
+    assert breaker.state == CircuitBreaker.OPEN
+    # 冷却期过后只放行一个探测
+    assert breaker.allow() is True
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow() is False
+
+    # 探测失败重新打开，成功则关闭
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert breaker.allow() is True
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()['opened'] == 2
+    assert breaker.stats()['rejected'] == 2
+
+
+def test_complete_raises_at_total_deadline(monkeypatch):
+    # 模拟逐字节缓慢返回的上游：request_timeout 拦不住，只能靠总截止时间
+    release = threading.Event()
+    calls = []
+
+    def slow_create(**params):
+        calls.append(params)
+        release.wait(5)
+        return _reply('迟到的回复')
+
+    monkeypatch.setattr(openai.ChatCompletion, 'create', slow_create)
+    llm = LLMClient(timeout=0.1, breaker=CircuitBreaker(failure_threshold=1, cooldown=30))
+    try:
+        start = time.monotonic()
+        with pytest.raises(LLMTimeout):
+            llm.complete(model='deepseek-chat', messages=[])
+        assert time.monotonic() - start < 1
+        assert llm.breaker.state == CircuitBreaker.OPEN
+
+        # 熔断后不再访问上游
+        with pytest.raises(CircuitOpenError):
+            llm.complete(model='deepseek-chat', messages=[])
+        assert len(calls) == 1
+    finally:
+        release.set()
+
+
+def test_acomplete_raises_at_total_deadline(monkeypatch):
+    async def slow_acreate(**params):
+        await asyncio.sleep(5)
+        return _reply('迟到的回复')
+
+    monkeypatch.setattr(openai.ChatCompletion, 'acreate', slow_acreate)
+    llm = LLMClient(timeout=0.1)
+
+    async def run():
+        start = asyncio.get_running_loop().time()
+        with pytest.raises(LLMTimeout):
+            await llm.acomplete(model='deepseek-chat', messages=[])
+        return asyncio.get_running_loop().time() - start
+
+    assert asyncio.run(run()) < 1
+
+
+def test_open_circuit_falls_back_without_queueing():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=4, max_wait=5)
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=30)
+    breaker.record_failure()
+    counselor = EmotionalCounselor(api_key='sk-test', llm_client=LLMClient(breaker=breaker),
+                                   limiter=limiter)
+
+    async def aget_response(message):
+        try:
+            return await counselor.aget_response(message)
+        finally:
+            await http_pool.close_session()
+
+    # 名额被占满时，熔断中的请求应立即降级，而不是排队等到 max_wait
+    limiter.acquire()
+    try:
+        start = time.monotonic()
+        assert counselor.get_response('我最近很焦虑')['mode'] == 'demo'
+        assert asyncio.run(aget_response('我最近很焦虑'))['mode'] == 'demo'
+        assert time.monotonic() - start < 1
+        stats = limiter.stats()
+        assert stats['queued'] == 0
+        assert stats['queue_timeout'] == 0
+        assert stats['admitted'] == 1
+    finally:
+        limiter.release()
+
+
+def test_cancelled_async_waiter_does_not_leak_slot():
+    limiter = ConcurrencyLimiter(max_concurrent=1, max_queue=4, max_wait=5)
+
+    async def call():
+        async with limiter.aslot():
+            await asyncio.sleep(0)
+
+    async def queued(coro):
+        task = asyncio.ensure_future(coro)
+        while limiter.stats()['queued'] == 0:
+            await asyncio.sleep(0)
+        return task
+
+    async def run():
+        await limiter.aacquire()
+
+        # 排队中被取消：从队列中移除
+        task = await queued(call())
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert limiter.stats()['queued'] == 0
+        assert limiter.stats()['active'] == 1
+
+        # 名额已经交给等待者、但它还没来得及运行就被取消：不论取消是否生效
+        # （Python 3.12 之前 wait_for 在结果已就绪时会吞掉取消），名额都要还回去
+        task = await queued(call())
+        limiter.release()
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        assert limiter.stats()['queued'] == 0
+        assert limiter.stats()['active'] == 0
+
+        await asyncio.wait_for(limiter.aacquire(), 1)
+        limiter.release()
+
+    asyncio.run(run())
+    assert limiter.stats()['active'] == 0
@@ -0,0 +1,62 @@
+"""会话存储：两种后端在消息超出窗口、折叠摘要前后读到的内容与普通列表一致"""
+
+import pytest
+
+from session_store import CANNED_REPLIES, MemorySessionStore, SQLiteSessionStore
+
+WINDOW = 6
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return MemorySessionStore(window=WINDOW)
+    return SQLiteSessionStore(path=str(tmp_path / 'sessions.db'), window=WINDOW)
+
+
+def _append_turns(store, messages, start, count):
+    """同时追加到存储与普通列表；每隔一轮使用固定回复"""
+    for i in range(start, start + count):
+        reply = CANNED_REPLIES[i % len(CANNED_REPLIES)] if i % 2 else f'回答{i}'
+        store.append_turn('s1', f'问题{i}', reply)
+        messages += [{'role': 'user', 'content': f'问题{i}'},
+                     {'role': 'assistant', 'content': reply}]
+
+
+def test_history_matches_list_beyond_window(store):
+    messages = []
+    _append_turns(store, messages, 0, 5)
+    kept = messages[-WINDOW:]
+
+    assert store.get_history('s1') == kept
+    for limit in (1, 2, 5, WINDOW, WINDOW + 3):
+        assert store.get_history('s1', limit=limit) == kept[-limit:]
+    assert store.get_context('s1') == ('', kept)
+    assert store.get_unsummarized('s1') == ('', kept, len(messages))
+    assert store.get_history('missing') == []
+    assert store.get_unsummarized('missing') == ('', [], 0)
+
+
+def test_context_after_summary_matches_list(store):
+    messages = []
+    _append_turns(store, messages, 0, 4)
+
+    # 折叠到第 6 条消息为止，之后只返回摘要之后的消息
+    assert store.set_summary('s1', '摘要一', 6) is True
+    assert store.set_summary('s1', '过期的摘要', 4) is False
+    assert store.get_context('s1') == ('摘要一', messages[6:])
+    assert store.get_context('s1', limit=1) == ('摘要一', messages[-1:])
+    assert store.get_unsummarized('s1') == ('摘要一', messages[6:], len(messages))
+    # get_history 不受摘要影响
+    assert store.get_history('s1') == messages[-WINDOW:]
+
+    # 继续追加到超出窗口：未折叠的消息同样受窗口限制
+    _append_turns(store, messages, 4, 4)
+    kept = messages[-WINDOW:]
+    assert store.get_context('s1') == ('摘要一', kept)
+    assert store.get_unsummarized('s1') == ('摘要一', kept, len(messages))
+
+    assert store.set_summary('s1', '摘要二', len(messages)) is True
+    assert store.set_summary('s1', '超出的摘要', len(messages) + 2) is False
+    assert store.get_context('s1') == ('摘要二', [])
+    assert store.get_unsummarized('s1') == ('摘要二', [], len(messages))
@@ -0,0 +1,99 @@
+"""对话摘要：注入假的模型调用层，检查折叠后的摘要与按 token 预算组装的请求"""
+
+from openai.openai_object import OpenAIObject
+
+from counselor import EmotionalCounselor
+from prompt_builder import SUMMARY_HEADER, PromptBuilder, message_tokens
+from prompts import SUMMARY_PROMPT
+from session_store import MemorySessionStore
+from summarizer import ConversationSummarizer
+
+
+class FakeLLMClient:
+    """记录请求参数，按顺序返回预设的摘要"""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.calls = []
+
+    def complete(self, **params):
+        self.calls.append(params)
+        return OpenAIObject.construct_from({
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': self.replies.pop(0)}}]
+        })
+
+
+def _add_turns(store, session_id, start, count):
+    for i in range(start, start + count):
+        store.append_turn(session_id, f'问题{i}', f'回答{i}')
+
+
+def test_summarizer_folds_older_messages_with_fake_client():
+    llm = FakeLLMClient(['  用户和伴侣为家务分工争吵。  ', '争吵后双方约定每周轮流做饭。'])
+    counselor = EmotionalCounselor(api_key='sk-test', llm_client=llm)
+    store = MemorySessionStore(window=20)
+    summarizer = ConversationSummarizer(store, counselor.summarize, trigger=6, keep=2)
+
+    # 未达到 trigger 条时不生成摘要
+    _add_turns(store, 's1', 0, 2)
+    assert summarizer.summarize_session('s1') is False
+    assert llm.calls == []
+
+    _add_turns(store, 's1', 2, 1)
+    summarizer.start()
+    try:
+        summarizer.notify('s1')
+        summarizer.join()
+
+        summary, history = store.get_context('s1')
+        assert summary == '用户和伴侣为家务分工争吵。'
+        assert history == [{'role': 'user', 'content': '问题2'}, {'role': 'assistant', 'content': '回答2'}]
+        request = llm.calls[0]
+        assert request['messages'][0] == {'role': 'system', 'content': SUMMARY_PROMPT}
+        assert request['messages'][1]['content'] == '\n'.join(
+            f'用户：问题{i}\n咨询师：回答{i}' for i in range(2)
+        )
+
+        # 再次折叠时已有摘要一并交给模型
+        _add_turns(store, 's1', 3, 2)
+        summarizer.notify('s1')
+        summarizer.join()
+        summary, history = store.get_context('s1')
+        assert summary == '争吵后双方约定每周轮流做饭。'
+        assert [m['content'] for m in history] == ['问题4', '回答4']
+        assert llm.calls[1]['messages'][1]['content'].startswith('已有摘要：用户和伴侣为家务分工争吵。\n用户：问题2')
+        assert summarizer.stats()['summarized'] == 2
+    finally:
+        summarizer.stop()
+
+
+def test_prompt_builder_trims_history_to_token_budget():
+    builder = PromptBuilder(system_prompt='你是恋爱情绪咨询师。', max_prompt_tokens=120)
+    history = []
+    for i in range(10):
+        history.append({'role': 'user', 'content': f'第{i}轮：我们又因为小事吵架了'})
+        history.append({'role': 'assistant', 'content': f'第{i}轮：听起来你很委屈'})
+    summary = '用户与伴侣经常因为家务争吵。'
+
+    prompt = builder.build('今天他又忘了洗碗', history, [], summary=summary)
+
+    assert prompt.prompt_tokens <= builder.max_prompt_tokens
+    assert prompt.messages[0] == builder.system_message
+    assert prompt.messages[1] == {'role': 'system', 'content': SUMMARY_HEADER + summary}
+    assert prompt.messages[-1] == {'role': 'user', 'content': '今天他又忘了洗碗'}
+    # 历史从最近的一轮往前保留，且不以助手回复开头
+    kept = prompt.history
+    assert 0 < len(kept) < len(history)
+    assert kept == history[-len(kept):]
+    assert kept[0]['role'] == 'user'
+    assert prompt.messages[2:-1] == kept
+    # 再多保留一轮就会超出预算
+    overflow = sum(message_tokens(m) for m in history[-len(kept) - 2:-len(kept)])
+    assert prompt.prompt_tokens + overflow > builder.max_prompt_tokens
+
+    # 预算放不下摘要时只保留系统提示词与用户消息
+    tight = PromptBuilder(system_prompt='你是恋爱情绪咨询师。', max_prompt_tokens=30)
+    prompt = tight.build('今天他又忘了洗碗', history, [], summary=summary * 5)
+    assert prompt.summary == ''
+    assert prompt.history == []
+    assert [m['role'] for m in prompt.messages] == ['system', 'user']
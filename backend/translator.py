@@ -3,23 +3,138 @@ Translation utility module for Chinese-English translation
 Supports automatic language detection and bidirectional translation
 """
 
+from bs4 import BeautifulSoup
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from deep_translator import GoogleTranslator
+from idempotency import SingleFlight
+from logger import log
+from metrics import TRANSLATIONS, stage
+import asyncio
+import http_pool
+import numpy as np
 import re
+import threading
 
-# Unicode range for CJK Unified Ideographs (Chinese characters)
-CJK_START = '\u4e00'
-CJK_END = '\u9fff'
+# Chinese characters: CJK Unified Ideographs, Extension A and Compatibility Ideographs
+CJK_RANGES = ((0x3400, 0x4dbf), (0x4e00, 0x9fff), (0xf900, 0xfaff))
+
+# Punctuation shared by both languages (general punctuation, CJK symbols and
+# full-width punctuation); like whitespace, it is left out of the ratio
+NEUTRAL_RANGES = (
+    (0x2010, 0x206f), (0x3000, 0x303f), (0xff01, 0xff0f),
+    (0xff1a, 0xff20), (0xff3b, 0xff40), (0xff5b, 0xff65)
+)
+
+
+def _char_class(ranges):
+    return ''.join(f'{chr(start)}-{chr(end)}' for start, end in ranges)
+
+
+CJK_RE = re.compile(f'[{_char_class(CJK_RANGES)}]+')
+NEUTRAL_RE = re.compile(f'[\\s{_char_class(NEUTRAL_RANGES)}]+')
+
+# Long texts are classified from evenly spaced windows instead of a full scan
+DETECT_SAMPLE_WINDOWS = 8
+DETECT_WINDOW_CHARS = 256
+
+# A sentence ends at terminal punctuation (with any closing quotes/brackets), a
+# period followed by whitespace, or a line break; the whitespace after it stays
+# with the sentence so the translation keeps the reply's layout
+SENTENCE_END_RE = re.compile(r'(?:[。！？!?；;…]+[”’"」』）)]*|\.+(?=\s)|\n)\s*')
+
+# Sentences without any letter (emoji, list numbers, separators) are kept as is
+LETTER_RE = re.compile(r'[^\W\d_]')
 
 # Threshold for determining if text is primarily Chinese
 # If Chinese characters make up more than this percentage, text is classified as Chinese
 CHINESE_THRESHOLD = 0.3
 
+class TranslationCache:
+    """Thread-safe LRU cache of translations keyed by (source, target, text)"""
+    
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        """Return the cached translation or None"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        """Store a translation, evicting the least recently used entry if full"""
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
 class TranslationService:
     """Service for translating text between Chinese and English"""
     
-    def __init__(self):
+    def __init__(self, cache_size=5000, max_workers=8, base_url=None):
+        """
+        Args:
+            cache_size: Maximum number of cached translations
+            max_workers: Maximum concurrent upstream requests in batch translation
+            base_url: Google Translate endpoint override (e.g. a local stand-in for testing)
+        """
+        self.base_url = base_url
         self.translator = GoogleTranslator()
         self.supported_languages = ['zh-CN', 'en']
+        self.cache = TranslationCache(cache_size)
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        # GoogleTranslator keeps per-request state, so instances are reused per thread
+        self._local = threading.local()
+        # Concurrent requests for the same (source, target, text) share one upstream call
+        self._flights = SingleFlight('translate')
+    
+    def _get_translator(self, source_lang, target_lang):
+        """Return this thread's translator instance for a language pair"""
+        translators = getattr(self._local, 'translators', None)
+        if translators is None:
+            translators = self._local.translators = {}
+        translator = translators.get((source_lang, target_lang))
+        if translator is None:
+            translator = GoogleTranslator(source=source_lang, target=target_lang)
+            if self.base_url:
+                translator._base_url = self.base_url
+            translators[(source_lang, target_lang)] = translator
+        return translator
+    
+    def _get_executor(self):
+        """Lazily create the bounded thread pool used for batch translation"""
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='translate'
+                    )
+        return self._executor
     
     def detect_language(self, text):
         """
@@ -32,16 +147,11 @@ class TranslationService:
             str: Language code ('zh-CN' or 'en')
         """
         try:
-            # Remove whitespace for better detection
-            text = text.strip()
+            sample = _sample_text(text)
             
-            if not text:
-                return 'en'
-            
-            # Simple heuristic: check for Chinese characters
-            # Count Chinese characters using defined Unicode range
-            chinese_chars = sum(1 for char in text if CJK_START <= char <= CJK_END)
-            total_chars = len(text.replace(' ', ''))
+            # Count characters in runs rather than one by one
+            chinese_chars = sum(map(len, CJK_RE.findall(sample)))
+            total_chars = len(sample) - sum(map(len, NEUTRAL_RE.findall(sample)))
             
             # If Chinese characters exceed threshold, consider it Chinese
             if total_chars > 0 and (chinese_chars / total_chars) > CHINESE_THRESHOLD:
@@ -50,10 +160,46 @@ class TranslationService:
                 return 'en'
                 
         except Exception as e:
-            print(f"Language detection error: {str(e)}")
+            log.warning('language_detection_failed', error=str(e))
             # Default to English if detection fails
             return 'en'
     
+    def detect_languages(self, texts):
+        """
+        Detect the language of many texts
+        
+        All texts are classified together with NumPy: the (sampled) texts
+        are joined into one code point array, every code point is looked up
+        in a class table and the counts are taken per text from prefix sums.
+        Results match detect_language.
+        
+        Args:
+            texts: List of texts to detect
+            
+        Returns:
+            list: Language codes, in input order
+        """
+        if not texts:
+            return []
+        
+        samples = [_sample_text(text) for text in texts]
+        codes = np.frombuffer(''.join(samples).encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+        # Code points outside the BMP are neither Chinese nor neutral
+        classes = _char_classes()[np.minimum(codes, 0xffff)]
+        
+        ends = np.cumsum([len(sample) for sample in samples])
+        starts = ends - np.array([len(sample) for sample in samples])
+        chinese = np.concatenate(([0], np.cumsum(classes == _CHINESE)))
+        neutral = np.concatenate(([0], np.cumsum(classes == _NEUTRAL)))
+        
+        chinese_chars = chinese[ends] - chinese[starts]
+        total_chars = (ends - starts) - (neutral[ends] - neutral[starts])
+        ratio = np.divide(chinese_chars, total_chars, out=np.zeros(len(samples)),
+                          where=total_chars > 0)
+        is_chinese = ratio > CHINESE_THRESHOLD
+        
+        return ['zh-CN' if flag else 'en' for flag in is_chinese.tolist()]
+    
     def translate(self, text, target_lang=None, source_lang=None):
         """
         Translate text to target language
@@ -74,6 +220,7 @@ class TranslationService:
         try:
             # Validate input
             if not text or not text.strip():
+                TRANSLATIONS.labels('error').inc()
                 return {
                     'translated_text': text,
                     'source_lang': 'unknown',
@@ -82,38 +229,98 @@ class TranslationService:
                     'error': 'Empty text provided'
                 }
             
-            # Detect source language if not provided
-            if not source_lang:
-                source_lang = self.detect_language(text)
+            source_lang, target_lang = self._resolve_languages(text, target_lang, source_lang)
             
-            # Auto-determine target language if not provided
-            if not target_lang:
-                target_lang = 'en' if source_lang == 'zh-CN' else 'zh-CN'
+            # Skip translation if source and target are the same
+            if source_lang == target_lang:
+                return self._skipped_result(text, source_lang, target_lang)
             
-            # Normalize language codes for deep-translator
-            if target_lang.lower() in ['zh-cn', 'zh_cn', 'chinese']:
-                target_lang = 'zh-CN'
-            elif target_lang.lower() in ['en', 'english']:
-                target_lang = 'en'
+            key = (source_lang, target_lang, text)
+            translated_text = self.cache.get(key)
+            if translated_text is not None:
+                return self._cached_result(text, translated_text, source_lang, target_lang)
             
-            if source_lang.lower() in ['zh-cn', 'zh_cn', 'chinese']:
-                source_lang = 'zh-CN'
-            elif source_lang.lower() in ['en', 'english']:
-                source_lang = 'en'
+            # Perform translation using deep-translator
+            def fetch():
+                translator = self._get_translator(source_lang, target_lang)
+                with stage('translate_upstream'):
+                    translated = translator.translate(text)
+                self.cache.set(key, translated)
+                TRANSLATIONS.labels('translated').inc()
+                return translated
             
-            # Skip translation if source and target are the same
-            if source_lang == target_lang:
+            translated_text, _ = self._flights.do(key, fetch)
+            
+            return {
+                'translated_text': translated_text,
+                'source_lang': source_lang,
+                'target_lang': target_lang,
+                'original_text': text
+            }
+            
+        except Exception as e:
+            log.warning('translation_failed', error=str(e))
+            TRANSLATIONS.labels('error').inc()
+            return {
+                'translated_text': text,
+                'source_lang': source_lang or 'unknown',
+                'target_lang': target_lang or 'en',
+                'original_text': text,
+                'error': str(e)
+            }
+    
+    async def atranslate(self, text, target_lang=None, source_lang=None):
+        """
+        Translate text to target language without blocking a worker thread
+        
+        Same contract as translate(), but the request to Google Translate is
+        made on the shared aiohttp connection pool.
+        """
+        try:
+            # Validate input
+            if not text or not text.strip():
+                TRANSLATIONS.labels('error').inc()
                 return {
                     'translated_text': text,
-                    'source_lang': source_lang,
-                    'target_lang': target_lang,
+                    'source_lang': 'unknown',
+                    'target_lang': target_lang or 'en',
                     'original_text': text,
-                    'skipped': True
+                    'error': 'Empty text provided'
                 }
             
-            # Perform translation using deep-translator
-            translator = GoogleTranslator(source=source_lang, target=target_lang)
-            translated_text = translator.translate(text)
+            source_lang, target_lang = self._resolve_languages(text, target_lang, source_lang)
+            
+            # Skip translation if source and target are the same
+            if source_lang == target_lang:
+                return self._skipped_result(text, source_lang, target_lang)
+            
+            key = (source_lang, target_lang, text)
+            translated_text = self.cache.get(key)
+            if translated_text is not None:
+                return self._cached_result(text, translated_text, source_lang, target_lang)
+            
+            async def fetch():
+                # Reuse deep-translator's endpoint and language mapping
+                translator = self._get_translator(source_lang, target_lang)
+                params = {
+                    'tl': translator._target,
+                    'sl': translator._source,
+                    translator.payload_key: text.strip()
+                }
+                
+                session = http_pool.get_session()
+                with stage('translate_upstream'):
+                    async with session.get(translator._base_url, params=params) as response:
+                        if response.status != 200:
+                            raise RuntimeError(f"Google Translate returned HTTP {response.status}")
+                        page = await response.text()
+                
+                translated = _extract_translation(page, translator)
+                self.cache.set(key, translated)
+                TRANSLATIONS.labels('translated').inc()
+                return translated
+            
+            translated_text, _ = await self._flights.ado(key, fetch)
             
             return {
                 'translated_text': translated_text,
@@ -123,7 +330,8 @@ class TranslationService:
             }
             
         except Exception as e:
-            print(f"Translation error: {str(e)}")
+            log.warning('translation_failed', error=str(e))
+            TRANSLATIONS.labels('error').inc()
             return {
                 'translated_text': text,
                 'source_lang': source_lang or 'unknown',
@@ -132,19 +340,360 @@ class TranslationService:
                 'error': str(e)
             }
     
-    def batch_translate(self, texts, target_lang=None):
+    def _resolve_languages(self, text, target_lang, source_lang):
+        """Detect/normalize the (source, target) language pair"""
+        # Detect source language if not provided
+        if not source_lang:
+            source_lang = self.detect_language(text)
+        
+        # Auto-determine target language if not provided
+        if not target_lang:
+            target_lang = 'en' if source_lang == 'zh-CN' else 'zh-CN'
+        
+        # Normalize language codes for deep-translator
+        return _normalize_lang(source_lang), _normalize_lang(target_lang)
+    
+    @staticmethod
+    def _skipped_result(text, source_lang, target_lang):
+        """Result returned when no translation is needed"""
+        TRANSLATIONS.labels('skipped').inc()
+        return {
+            'translated_text': text,
+            'source_lang': source_lang,
+            'target_lang': target_lang,
+            'original_text': text,
+            'skipped': True
+        }
+    
+    @staticmethod
+    def _cached_result(text, translated_text, source_lang, target_lang):
+        """Result returned for a cache hit"""
+        TRANSLATIONS.labels('cached').inc()
+        return {
+            'translated_text': translated_text,
+            'source_lang': source_lang,
+            'target_lang': target_lang,
+            'original_text': text,
+            'cached': True
+        }
+    
+    def batch_translate(self, texts, target_lang=None, source_lang=None):
         """
         Translate multiple texts
         
+        Duplicate texts are translated once, and cache misses are sent
+        upstream in parallel with at most max_workers requests in flight.
+        
         Args:
             texts: List of texts to translate
             target_lang: Target language code
+            source_lang: Source language code (optional)
             
         Returns:
-            list: List of translation results
+            list: List of translation results, in input order
         """
-        results = []
-        for text in texts:
-            result = self.translate(text, target_lang=target_lang)
-            results.append(result)
-        return results
+        unique_texts = list(dict.fromkeys(texts))
+        
+        def translate_one(text):
+            return self.translate(text, target_lang=target_lang, source_lang=source_lang)
+        
+        if len(unique_texts) <= 1:
+            translated = list(map(translate_one, unique_texts))
+        else:
+            translated = list(self._get_executor().map(translate_one, unique_texts))
+        
+        by_text = dict(zip(unique_texts, translated))
+        return [dict(by_text[text]) for text in texts]
+    
+    async def abatch_translate(self, texts, target_lang=None, source_lang=None):
+        """Async variant of batch_translate using the shared connection pool"""
+        unique_texts = list(dict.fromkeys(texts))
+        semaphore = asyncio.Semaphore(self.max_workers)
+        
+        async def translate_one(text):
+            async with semaphore:
+                return await self.atranslate(text, target_lang=target_lang, source_lang=source_lang)
+        
+        translated = await asyncio.gather(*(translate_one(text) for text in unique_texts))
+        
+        by_text = dict(zip(unique_texts, translated))
+        return [dict(by_text[text]) for text in texts]
+    
+    def translate_sentences(self, text, target_lang=None, source_lang=None):
+        """
+        Translate a reply sentence by sentence
+        
+        The language pair is resolved once for the whole text, then the
+        sentences are translated in parallel through batch_translate. Each
+        sentence is cached separately, so phrases that recur across replies
+        (greetings, hotline notices) are served from the cache.
+        
+        Returns:
+            dict: Same fields as translate(), plus the number of sentences
+                  sent for translation and how many of them were cached
+        """
+        reply = _ReplyTranslation(self, target_lang, source_lang)
+        reply.resolve(text)
+        segments = split_sentences(text)
+        sources = [reply.prepare(segment) for segment in segments]
+        translated = iter(self.batch_translate(
+            [source for source in sources if source],
+            target_lang=reply.target_lang, source_lang=reply.source_lang
+        ))
+        for segment, source in zip(segments, sources):
+            reply.add(segment, next(translated) if source else None)
+        return reply.result(text)
+    
+    async def atranslate_sentences(self, text, target_lang=None, source_lang=None):
+        """Async variant of translate_sentences using the shared connection pool"""
+        reply = _ReplyTranslation(self, target_lang, source_lang)
+        reply.resolve(text)
+        segments = split_sentences(text)
+        sources = [reply.prepare(segment) for segment in segments]
+        translated = iter(await self.abatch_translate(
+            [source for source in sources if source],
+            target_lang=reply.target_lang, source_lang=reply.source_lang
+        ))
+        for segment, source in zip(segments, sources):
+            reply.add(segment, next(translated) if source else None)
+        return reply.result(text)
+    
+    def translate_stream(self, events, target_lang=None, source_lang=None):
+        """
+        Translate a streamed reply while it is being generated
+        
+        Passes through the (event, payload) pairs of a reply stream. Every
+        sentence is sent for translation as soon as it is complete, and its
+        translation is emitted as a ('translation', {'content': ...}) event,
+        in sentence order, once it is back. The final 'done' payload gets a
+        'translation' field with the same result as translate_sentences().
+        """
+        reply = _ReplyTranslation(self, target_lang, source_lang)
+        buffer = _SentenceBuffer()
+        pending = deque()
+        
+        def submit(segments):
+            for segment in segments:
+                source = reply.prepare(segment)
+                future = self._get_executor().submit(
+                    self.translate, source, reply.target_lang, reply.source_lang
+                ) if source else None
+                pending.append((segment, future))
+        
+        def ready(wait):
+            while pending and (wait or pending[0][1] is None or pending[0][1].done()):
+                segment, future = pending.popleft()
+                part = reply.add(segment, future.result() if future else None)
+                if not reply.skipped:
+                    yield 'translation', {'content': part}
+        
+        try:
+            for event, payload in events:
+                if event == 'delta':
+                    submit(buffer.feed(payload['content']))
+                elif event == 'done':
+                    submit(buffer.flush())
+                    yield from ready(wait=True)
+                    payload = dict(payload, translation=reply.result(payload['message']))
+                yield event, payload
+                if event == 'delta':
+                    yield from ready(wait=False)
+        finally:
+            for _, future in pending:
+                if future:
+                    future.cancel()
+    
+    async def atranslate_stream(self, events, target_lang=None, source_lang=None):
+        """Async variant of translate_stream for async reply streams"""
+        reply = _ReplyTranslation(self, target_lang, source_lang)
+        buffer = _SentenceBuffer()
+        pending = deque()
+        semaphore = asyncio.Semaphore(self.max_workers)
+        
+        async def translate_one(source):
+            async with semaphore:
+                return await self.atranslate(source, reply.target_lang, reply.source_lang)
+        
+        def submit(segments):
+            for segment in segments:
+                source = reply.prepare(segment)
+                task = asyncio.ensure_future(translate_one(source)) if source else None
+                pending.append((segment, task))
+        
+        async def ready(wait):
+            parts = []
+            while pending and (wait or pending[0][1] is None or pending[0][1].done()):
+                segment, task = pending.popleft()
+                part = reply.add(segment, await task if task else None)
+                if not reply.skipped:
+                    parts.append(part)
+            return parts
+        
+        try:
+            async for event, payload in events:
+                if event == 'delta':
+                    submit(buffer.feed(payload['content']))
+                elif event == 'done':
+                    submit(buffer.flush())
+                    for part in await ready(wait=True):
+                        yield 'translation', {'content': part}
+                    payload = dict(payload, translation=reply.result(payload['message']))
+                yield event, payload
+                if event == 'delta':
+                    for part in await ready(wait=False):
+                        yield 'translation', {'content': part}
+        finally:
+            for _, task in pending:
+                if task:
+                    task.cancel()
+
+
+class _ReplyTranslation:
+    """Language pair and translated sentences of one reply, in order"""
+    
+    def __init__(self, service, target_lang, source_lang):
+        self.service = service
+        self.target_lang = target_lang
+        self.source_lang = source_lang
+        self.resolved = False
+        self.parts = []
+        self.results = []
+    
+    @property
+    def skipped(self):
+        """True once the reply is known to be in the target language already"""
+        return self.resolved and self.source_lang == self.target_lang
+    
+    def resolve(self, text):
+        """Fix the language pair, detecting the source language from text"""
+        if not self.resolved:
+            self.source_lang, self.target_lang = self.service._resolve_languages(
+                text, self.target_lang, self.source_lang
+            )
+            self.resolved = True
+    
+    def prepare(self, segment):
+        """Return the text to send for translation, or None to keep the segment as is"""
+        source = segment.strip()
+        if not LETTER_RE.search(source):
+            return None
+        # A streamed reply is classified by its first sentence
+        self.resolve(source)
+        return None if self.skipped else source
+    
+    def add(self, segment, result):
+        """Record the next segment's translation result (None = kept) and return its text"""
+        if result is None:
+            part = segment
+        else:
+            self.results.append(result)
+            stripped = segment.lstrip()
+            part = (segment[:len(segment) - len(stripped)] + result['translated_text']
+                    + stripped[len(stripped.rstrip()):])
+        self.parts.append(part)
+        return part
+    
+    def result(self, text):
+        """Translation of the whole reply, shaped like TranslationService.translate()"""
+        self.resolve(text)
+        result = {
+            'translated_text': ''.join(self.parts).strip(),
+            'source_lang': self.source_lang,
+            'target_lang': self.target_lang,
+            'original_text': text,
+            'sentences': len(self.results),
+            'cached_sentences': sum(1 for item in self.results if item.get('cached'))
+        }
+        if self.skipped:
+            result['skipped'] = True
+        errors = [item['error'] for item in self.results if 'error' in item]
+        if errors:
+            result['error'] = errors[0]
+        return result
+
+
+class _SentenceBuffer:
+    """Collects streamed text and hands out sentences once they are complete"""
+    
+    def __init__(self):
+        self._text = ''
+    
+    def feed(self, delta):
+        """Add streamed text and return the sentences it completed"""
+        self._text += delta
+        segments = []
+        start = 0
+        for match in SENTENCE_END_RE.finditer(self._text):
+            # Closing quotes or more whitespace may still follow in the next delta
+            if match.end() == len(self._text):
+                break
+            segments.append(self._text[start:match.end()])
+            start = match.end()
+        self._text = self._text[start:]
+        return segments
+    
+    def flush(self):
+        """Return whatever is left at the end of the stream"""
+        rest, self._text = self._text, ''
+        return [rest] if rest else []
+
+
+def split_sentences(text):
+    """Split text into sentences; joining them gives back the original text"""
+    segments = []
+    start = 0
+    for match in SENTENCE_END_RE.finditer(text):
+        segments.append(text[start:match.end()])
+        start = match.end()
+    if start < len(text):
+        segments.append(text[start:])
+    return segments
+
+
+_OTHER, _CHINESE, _NEUTRAL = 0, 1, 2
+_class_table = None
+
+
+def _char_classes():
+    """Lazily built table mapping each BMP code point to its detection class"""
+    global _class_table
+    if _class_table is None:
+        table = np.full(0x10000, _OTHER, dtype=np.uint8)
+        for start, end in CJK_RANGES:
+            table[start:end + 1] = _CHINESE
+        for start, end in NEUTRAL_RANGES:
+            table[start:end + 1] = _NEUTRAL
+        table[[c for c in range(0x10000) if chr(c).isspace()]] = _NEUTRAL
+        table[0xffff] = _OTHER
+        _class_table = table
+    return _class_table
+
+
+def _sample_text(text):
+    """Return the text itself, or evenly spaced windows of it when it is long"""
+    window = DETECT_WINDOW_CHARS
+    windows = DETECT_SAMPLE_WINDOWS
+    if len(text) <= window * windows:
+        return text
+    step = (len(text) - window) // (windows - 1)
+    return ''.join(text[i * step:i * step + window] for i in range(windows))
+
+
+def _normalize_lang(lang):
+    """Normalize a language code to the form deep-translator expects"""
+    if lang.lower() in ['zh-cn', 'zh_cn', 'chinese']:
+        return 'zh-CN'
+    if lang.lower() in ['en', 'english']:
+        return 'en'
+    return lang
+
+
+def _extract_translation(page, translator):
+    """Pull the translated text out of a Google Translate mobile page"""
+    soup = BeautifulSoup(page, 'html.parser')
+    element = soup.find(translator._element_tag, translator._element_query)
+    if not element:
+        element = soup.find(translator._element_tag, translator._alt_element_query)
+        if not element:
+            raise ValueError('No translation found in response')
+    return element.get_text(strip=True)
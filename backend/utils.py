@@ -1,5 +1,31 @@
 import re
+import os
+import hmac
 import html
+import threading
+from functools import wraps
+from classifier import default_classifier
+
+def lazy(factory):
+    """
+    把无参工厂函数变成线程安全的惰性单例：第一次调用时创建，之后返回同一个对象
+
+    并发的第一次调用只会执行一次工厂函数（双重检查加锁）；被装饰的函数多一个
+    initialized() 方法，用于判断是否已经创建。
+    """
+    lock = threading.Lock()
+    created = []
+
+    @wraps(factory)
+    def get():
+        if not created:
+            with lock:
+                if not created:
+                    created.append(factory())
+        return created[0]
+
+    get.initialized = lambda: bool(created)
+    return get
 
 def validate_message(data):
     """验证消息格式"""
@@ -27,15 +53,18 @@ def sanitize_input(text):
     
     return text
 
+def check_admin_token(token):
+    """校验管理接口令牌（未配置 ADMIN_TOKEN 时管理接口关闭）"""
+    expected = os.getenv('ADMIN_TOKEN')
+    if not expected or not token:
+        return False
+    # compare_digest 只接受 ASCII 字符串，按 UTF-8 字节比较以免非 ASCII 的令牌引发 TypeError
+    return hmac.compare_digest(token.encode('utf-8', 'surrogatepass'),
+                               expected.encode('utf-8', 'surrogatepass'))
+
 def detect_crisis(message):
     """检测危机关键词"""
-    from prompts import CRISIS_KEYWORDS
-    
-    message_lower = message.lower()
-    for keyword in CRISIS_KEYWORDS:
-        if keyword in message_lower:
-            return True
-    return False
+    return default_classifier.classify(message).crisis
 
 def get_crisis_response():
     """返回危机干预回复"""
@@ -51,26 +51,98 @@ function App() {
     setIsLoading(true);
 
     try {
-      const response = await axios.post('/api/chat', {
-        message: inputMessage,
-        session_id: sessionId,
+      const response = await fetch('/api/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          message: inputMessage,
+          session_id: sessionId,
+          // The server translates the reply sentence by sentence while streaming it
+          ...(translationEnabled && { target_lang: targetLanguage }),
+        }),
       });
 
-      const assistantMessage = {
-        role: 'assistant',
-        content: response.data.message,
-        emotion: response.data.emotion,
-      };
+      if (!response.ok || !response.body) {
+        throw new Error(`HTTP ${response.status}`);
+      }
 
+      // 先插入空的助手消息，随增量内容逐步填充
+      let assistantIndex = -1;
       setMessages((prev) => {
-        const newMessages = [...prev, assistantMessage];
-        // Translate new messages if translation is enabled
-        if (translationEnabled) {
-          const newIndex = newMessages.length - 1;
-          translateMessage(assistantMessage.content, newIndex);
-        }
-        return newMessages;
+        assistantIndex = prev.length;
+        return [...prev, { role: 'assistant', content: '' }];
       });
+      setIsLoading(false);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finalMessage = null;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // SSE 事件以空行分隔
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+
+        for (const raw of events) {
+          const eventMatch = raw.match(/^event: (.*)$/m);
+          const dataMatch = raw.match(/^data: (.*)$/m);
+          if (!eventMatch || !dataMatch) continue;
+
+          const event = eventMatch[1];
+          const payload = JSON.parse(dataMatch[1]);
+
+          if (event === 'delta') {
+            setMessages((prev) =>
+              prev.map((msg, i) =>
+                i === assistantIndex
+                  ? { ...msg, content: msg.content + payload.content }
+                  : msg
+              )
+            );
+          } else if (event === 'translation') {
+            setTranslatedMessages((prev) => ({
+              ...prev,
+              [assistantIndex]: {
+                ...prev[assistantIndex],
+                translatedText: (prev[assistantIndex]?.translatedText || '') + payload.content,
+              },
+            }));
+          } else if (event === 'done') {
+            finalMessage = payload;
+          } else if (event === 'error') {
+            throw new Error(payload.error);
+          }
+        }
+      }
+
+      if (finalMessage) {
+        const assistantMessage = {
+          role: 'assistant',
+          content: finalMessage.message,
+          emotion: finalMessage.emotion,
+        };
+
+        setMessages((prev) =>
+          prev.map((msg, i) => (i === assistantIndex ? assistantMessage : msg))
+        );
+        const translation = finalMessage.translation;
+        if (translation) {
+          setTranslatedMessages((prev) => ({
+            ...prev,
+            [assistantIndex]: {
+              translatedText: translation.translated_text,
+              sourceLang: translation.source_lang,
+              targetLang: translation.target_lang,
+              skipped: translation.skipped,
+            },
+          }));
+        }
+      }
     } catch (error) {
       console.error('Error sending message:', error);
       setMessages((prev) => [
@@ -123,24 +195,47 @@ function App() {
     }
   };
 
+  // Translate many messages with a single request; the server deduplicates
+  // texts, serves repeats from its cache and translates the rest in parallel
+  const translateMessages = async (entries) => {
+    const batchSize = 100; // Server-side limit per batch request
+
+    for (let i = 0; i < entries.length; i += batchSize) {
+      const batch = entries.slice(i, i + batchSize);
+      try {
+        const response = await axios.post('/api/translate/batch', {
+          texts: batch.map(({ text }) => text),
+          target_lang: targetLanguage === 'auto' ? null : targetLanguage,
+        });
+
+        const updates = {};
+        response.data.results.forEach((result, j) => {
+          if (result.translated_text) {
+            updates[batch[j].index] = {
+              translatedText: result.translated_text,
+              sourceLang: result.source_lang,
+              targetLang: result.target_lang,
+              skipped: result.skipped,
+            };
+          }
+        });
+        setTranslatedMessages((prev) => ({ ...prev, ...updates }));
+      } catch (error) {
+        console.error('Error translating messages:', error);
+      }
+    }
+  };
+
   const handleToggleTranslation = () => {
     setTranslationEnabled(!translationEnabled);
     if (!translationEnabled) {
-      // When enabling translation, translate messages in batches to avoid rate limiting
-      // Translate in batches of 3 messages at a time with 500ms delay between batches
-      const batchSize = 3;
-      const delay = 500;
-      
-      for (let i = 0; i < messages.length; i += batchSize) {
-        const batch = messages.slice(i, i + batchSize);
-        setTimeout(() => {
-          batch.forEach((msg, batchIndex) => {
-            const actualIndex = i + batchIndex;
-            if (!translatedMessages[actualIndex]) {
-              translateMessage(msg.content, actualIndex);
-            }
-          });
-        }, (i / batchSize) * delay);
+      // When enabling translation, translate all untranslated messages in one batch
+      const pending = messages
+        .map((msg, index) => ({ text: msg.content, index }))
+        .filter(({ text, index }) => text.trim() && !translatedMessages[index]);
+
+      if (pending.length > 0) {
+        translateMessages(pending);
       }
     }
   };
@@ -243,15 +338,17 @@ function App() {
                         >
                           {translation.translatedText}
                         </p>
-                        <p
-                          className={`text-xs mt-1 ${
-                            message.role === 'user'
-                              ? 'text-blue-200'
-                              : 'text-gray-400'
-                          }`}
-                        >
-                          {translation.sourceLang} → {translation.targetLang}
-                        </p>
+                        {translation.sourceLang && (
+                          <p
+                            className={`text-xs mt-1 ${
+                              message.role === 'user'
+                                ? 'text-blue-200'
+                                : 'text-gray-400'
+                            }`}
+                          >
+                            {translation.sourceLang} → {translation.targetLang}
+                          </p>
+                        )}
                       </div>
                     )}
                   </div>